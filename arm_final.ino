@@ -12,6 +12,7 @@ Servo servo2;
 Servo servoup;  
 boolean stringComplete = false;
 String inputString;  // 用来暂存接收到的原始JSON字符串
+const int MAX_BATCH_POINTS = 8;  // 批量帧每帧最多点数 (与 servo_protocol.py 的 DEFAULT_MAX_POINTS 一致)
 
 // 与原代码基本一致的变量声明
 double rotate1;
@@ -74,79 +75,35 @@ void setup() {
 }
 
 void loop() {
-  // 当stringComplete为true，表示已接收到完整JSON数据并以'R'结束
+  // 当stringComplete为true，表示已接收到完整命令并以'R'结束
   if (stringComplete == true) {
-    // 使用ArduinoJson解析
-    StaticJsonDocument<200> doc;  // 若有需要可改大，比如 500
-    DeserializationError error = deserializeJson(doc, inputString);
-
-    if (!error) {
-      // 解析成功
-      rotate1 = doc["x"];
-      rotate2 = doc["y"];
-      updown = doc["updown"];
-      
-      // 将坐标转换为机械臂的空间坐标体系
-      selx=(rotate1/50.0)+baslenmid;
-      sely=(rotate2/50.0)+topstart;
-
-      anglecalc();  // 与原函数保持一致
-      S1Totangle=S1Totangle-initialangle;
-      S2Totangle=180-(S2Totangle-initialangle);
-
-      // 与原逻辑保持一致：检查角度范围，控制舵机移动
-      if(S1Totangle>=0 && S1Totangle<=180 && S2Totangle>=0 && S2Totangle<=180) {
-        s1diff=servo1Langle-S1Totangle;
-        s2diff=servo2Langle-S2Totangle;
-
-        if(abs(s1diff)>abs(s2diff)) {
-          s1step=s1diff/abs(s1diff);
-          s2step=s2diff/abs(s1diff);
-          for (pos = 0; pos <= abs(s1diff); pos += 1) { 
-            servo1Langle=servo1Langle-s1step;
-            servo2Langle=servo2Langle-s2step;
-            servo1.write(servo1Langle); 
-            servo2.write(servo2Langle);
-            delay(msdelay);                       
-          }   
-          servo1.write(S1Totangle); 
-          servo2.write(S2Totangle);                
-        } else if(abs(s2diff)>0) {
-          s1step=s1diff/abs(s2diff);
-          s2step=s2diff/abs(s2diff);            
-          for (pos = 0; pos <= abs(s2diff); pos += 1) { 
-            servo1Langle=servo1Langle-s1step;
-            servo2Langle=servo2Langle-s2step;
-            servo1.write(servo1Langle); 
-            servo2.write(servo2Langle);  
-            delay(msdelay);                       
-          }                      
-          servo1.write(S1Totangle); 
-          servo2.write(S2Totangle); 
-        }
-
-        servo1Langle=S1Totangle;
-        servo2Langle=S2Totangle;
-
-        // 控制笔的上下 (或多档位)
-        if (updown != penpos) {
-          penpos = updown;
-          penupdown();
-        }
+    if (inputString == "?") {
+      // 协议探测：回复本固件支持批量帧及每帧最多点数
+      Serial.print("B");
+      Serial.println(MAX_BATCH_POINTS);
+    } else if (inputString.startsWith("P")) {
+      // 批量帧：全部点执行完后只回复一个 "N"，帧错误回复 "E"
+      if (handleBatchFrame()) {
+        Serial.println("N");
       } else {
-        // 如果角度超出范围，考虑抬笔或其他安全处理
-        if (penpos == 1) {
-          penpos = 0;      
-          penupdown();
-        }
+        Serial.println("E");
       }
+    } else {
+      // 使用ArduinoJson解析
+      StaticJsonDocument<200> doc;  // 若有需要可改大，比如 500
+      DeserializationError error = deserializeJson(doc, inputString);
 
-      // ★★★ 解析成功后，打印换行版 "N" ★★★
-      Serial.println("N");  
+      if (!error) {
+        // 解析成功
+        moveArm(doc["x"], doc["y"], doc["updown"]);
 
-    } else {
-      // ★★★ 解析失败时，打印整行错误信息 ★★★
-      Serial.println("JSON parse error");
+        // ★★★ 解析成功后，打印换行版 "N" ★★★
+        Serial.println("N");  
+
+      } else {
+        // ★★★ 解析失败时，打印整行错误信息 ★★★
+        Serial.println("JSON parse error");
+      }
     }
 
     // 清空输入缓存
@@ -158,6 +115,112 @@ void loop() {
   blinkLeds();
 }
 
+// ========== 移动到 (x, y) 并设置笔的档位 (原 loop 中的逻辑) ==========
+void moveArm(double x, double y, int ud) {
+  rotate1 = x;
+  rotate2 = y;
+  updown = ud;
+
+  // 将坐标转换为机械臂的空间坐标体系
+  selx=(rotate1/50.0)+baslenmid;
+  sely=(rotate2/50.0)+topstart;
+
+  anglecalc();  // 与原函数保持一致
+  S1Totangle=S1Totangle-initialangle;
+  S2Totangle=180-(S2Totangle-initialangle);
+
+  // 与原逻辑保持一致：检查角度范围，控制舵机移动
+  if(S1Totangle>=0 && S1Totangle<=180 && S2Totangle>=0 && S2Totangle<=180) {
+    s1diff=servo1Langle-S1Totangle;
+    s2diff=servo2Langle-S2Totangle;
+
+    if(abs(s1diff)>abs(s2diff)) {
+      s1step=s1diff/abs(s1diff);
+      s2step=s2diff/abs(s1diff);
+      for (pos = 0; pos <= abs(s1diff); pos += 1) { 
+        servo1Langle=servo1Langle-s1step;
+        servo2Langle=servo2Langle-s2step;
+        servo1.write(servo1Langle); 
+        servo2.write(servo2Langle);
+        delay(msdelay);                       
+      }   
+      servo1.write(S1Totangle); 
+      servo2.write(S2Totangle);                
+    } else if(abs(s2diff)>0) {
+      s1step=s1diff/abs(s2diff);
+      s2step=s2diff/abs(s2diff);            
+      for (pos = 0; pos <= abs(s2diff); pos += 1) { 
+        servo1Langle=servo1Langle-s1step;
+        servo2Langle=servo2Langle-s2step;
+        servo1.write(servo1Langle); 
+        servo2.write(servo2Langle);  
+        delay(msdelay);                       
+      }                      
+      servo1.write(S1Totangle); 
+      servo2.write(S2Totangle); 
+    }
+
+    servo1Langle=S1Totangle;
+    servo2Langle=S2Totangle;
+
+    // 控制笔的上下 (或多档位)
+    if (updown != penpos) {
+      penpos = updown;
+      penupdown();
+    }
+  } else {
+    // 如果角度超出范围，考虑抬笔或其他安全处理
+    if (penpos == 1) {
+      penpos = 0;      
+      penupdown();
+    }
+  }
+}
+
+// ========== 批量帧: P<x>,<y>,<updown>;...*<校验>  坐标为 0.1 单位的整数 ==========
+bool handleBatchFrame() {
+  int star = inputString.lastIndexOf('*');
+  if (star < 2 || star + 3 != (int)inputString.length()) {
+    return false;
+  }
+
+  // 校验: 载荷所有字符的异或，两位十六进制
+  byte sum = 0;
+  for (int i = 1; i < star; i++) {
+    sum ^= (byte)inputString.charAt(i);
+  }
+  byte expected = (byte)strtol(inputString.substring(star + 1).c_str(), NULL, 16);
+  if (sum != expected) {
+    return false;
+  }
+
+  // 先完整解析再执行，避免半帧被画出
+  long values[MAX_BATCH_POINTS * 3];
+  int count = 0;
+  int start = 1;
+  while (start < star) {
+    int sep = inputString.indexOf(';', start);
+    if (sep == -1 || sep > star) {
+      sep = star;
+    }
+    int c1 = inputString.indexOf(',', start);
+    int c2 = inputString.indexOf(',', c1 + 1);
+    if (count >= MAX_BATCH_POINTS || c1 == -1 || c2 == -1 || c2 >= sep) {
+      return false;
+    }
+    values[count * 3]     = inputString.substring(start, c1).toInt();
+    values[count * 3 + 1] = inputString.substring(c1 + 1, c2).toInt();
+    values[count * 3 + 2] = inputString.substring(c2 + 1, sep).toInt();
+    count++;
+    start = sep + 1;
+  }
+
+  for (int i = 0; i < count; i++) {
+    moveArm(values[i * 3] / 10.0, values[i * 3 + 1] / 10.0, (int)values[i * 3 + 2]);
+  }
+  return count > 0;
+}
+
 // ========== 多档位笔上下函数 ==========
 void penupdown() {
   // 在这里添加调试输出
@@ -228,7 +291,8 @@ float findangle(float radians) {
 }
 
 void serialEvent() {
-  while (Serial.available()) {
+  // 读到 'R' 即停止：后续已排队的命令留在串口缓冲区，等本条执行完(打印 "N")后再读取
+  while (Serial.available() && !stringComplete) {
     char inChar = (char)Serial.read();   
     if (inChar == 'R') {
       stringComplete = true;
@@ -0,0 +1,276 @@
+import json
+import math
+import struct
+import sys
+import time
+
+import servo_protocol
+
+# ========== HOST-SIDE MODEL OF arm_final.ino ==========
+# REPRODUCES THE FIRMWARE'S INVERSE KINEMATICS (anglecalc), THE PER-DEGREE SERVO STEPPING,
+# penupdown() AND THE LOOP TIMING (blinkLeds() BLOCKS FOR 8 x 500 MS BETWEEN TWO SERIAL READS),
+# SO DRAWING TIME CAN BE PREDICTED AND SCHEDULING / SIMPLIFICATION TUNED WITHOUT THE ARM.
+
+# ----- GEOMETRY (SAME NAMES AND VALUES AS arm_final.ino) -----
+BASELEN = 4.5
+ARM1LEN = 3.0
+ARM2LEN = 6.0
+BASLENMID = BASELEN / 2
+TOPSTART = 3
+INITIALANGLE = 60
+COORD_SCALE = 50.0            # selx = x / 50 + baslenmid
+
+# ----- TIMING -----
+MSDELAY = 0.002               # delay(msdelay) PER SERVO STEP
+LOOP_BLINK_S = 8 * 0.5        # blinkLeds() AT THE END OF EVERY loop()
+SERIAL_BITS_PER_BYTE = 10     # 8N1
+
+# ----- INITIAL STATE (setup()) -----
+SERVO1_START = 120.0
+SERVO2_START = 60.0
+PEN_SERVO_START = 10
+PEN_ANGLES = {0: 5, 1: 50, 2: 45, 3: 40}   # penupdown(), UNKNOWN VALUES LIFT THE PEN
+PEN_DEBUG_LINE = "[DEBUG] penupdown called, penpos = {}\r\n"
+
+
+def _float32(value):
+    """THE AVR HAS NO DOUBLE, float AND double ARE BOTH 32 BIT"""
+    return struct.unpack("f", struct.pack("f", value))[0]
+
+
+def _findangle(opp, adj, hyp):
+    try:
+        scal = math.acos((opp ** 2 + adj ** 2 - hyp ** 2) / (2.0 * opp * adj))
+    except (ValueError, ZeroDivisionError):
+        return float("nan")  # acos() OUTSIDE [-1, 1] IS NAN ON THE ARDUINO AS WELL
+    return scal * (180 / 3.14159)
+
+
+def servo_angles(x, y):
+    """
+    FIRMWARE anglecalc() + OFFSETS FOR ONE TARGET POINT.
+    RETURNS (S1, S2); A NAN OR A VALUE OUTSIDE [0, 180] MEANS THE FIRMWARE WILL NOT MOVE.
+    """
+    selx = _float32(x / COORD_SCALE + BASLENMID)
+    sely = _float32(y / COORD_SCALE + TOPSTART)
+    arm3lens1 = math.sqrt(selx ** 2 + sely ** 2)
+    arm3lens2 = math.sqrt((selx - BASELEN) ** 2 + sely ** 2)
+    s1 = _findangle(ARM1LEN, arm3lens1, ARM2LEN) + _findangle(BASELEN, arm3lens1, arm3lens2)
+    s2 = _findangle(ARM1LEN, arm3lens2, ARM2LEN) + _findangle(BASELEN, arm3lens2, arm3lens1)
+    s1 = round(s1 * 100) / 100.0 if not math.isnan(s1) else s1
+    s2 = round(s2 * 100) / 100.0 if not math.isnan(s2) else s2
+    return s1 - INITIALANGLE, 180 - (s2 - INITIALANGLE)
+
+
+def is_reachable(s1, s2):
+    return 0 <= s1 <= 180 and 0 <= s2 <= 180
+
+
+class ArmModel:
+    """SERVO AND PEN STATE OF ONE ARM, execute() RETURNS WHAT ONE moveArm() CALL DOES AND HOW LONG IT TAKES"""
+
+    def __init__(self):
+        self.servo1 = SERVO1_START
+        self.servo2 = SERVO2_START
+        self.penpos = 0
+        self.pen_angle = PEN_SERVO_START
+
+    def _pen(self):
+        """penupdown(): STEP THE PEN SERVO ONE DEGREE PER msdelay, RETURN (SECONDS, DEBUG BYTES PRINTED)"""
+        target = PEN_ANGLES.get(self.penpos, 5)
+        steps = abs(target - self.pen_angle) + 1
+        self.pen_angle = target
+        return steps * MSDELAY, len(PEN_DEBUG_LINE.format(self.penpos))
+
+    def execute(self, x, y, updown):
+        s1, s2 = servo_angles(x, y)
+        result = {"x": x, "y": y, "updown": updown, "reachable": is_reachable(s1, s2),
+                  "move_s": 0.0, "pen_s": 0.0, "debug_bytes": 0}
+
+        if result["reachable"]:
+            diff = max(abs(self.servo1 - s1), abs(self.servo2 - s2))
+            if diff > 0:
+                # for (pos = 0; pos <= abs(diff); pos += 1) { ...; delay(msdelay); }
+                result["move_s"] = (math.floor(diff) + 1) * MSDELAY
+            self.servo1, self.servo2 = s1, s2
+            if updown != self.penpos:
+                self.penpos = updown
+                result["pen_s"], result["debug_bytes"] = self._pen()
+        elif self.penpos == 1:
+            # FIRMWARE ONLY LIFTS THE PEN FOR DEPTH 1 WHEN A POINT IS OUT OF RANGE
+            self.penpos = 0
+            result["pen_s"], result["debug_bytes"] = self._pen()
+        return result
+
+
+def wire_time(num_bytes, baud_rate=9600):
+    return num_bytes * SERIAL_BITS_PER_BYTE / baud_rate
+
+
+class FirmwareClock:
+    """
+    WHEN DOES THE FIRMWARE SEE A COMMAND? serialEvent() ONLY RUNS BETWEEN TWO loop() CALLS,
+    AND EVERY loop() ENDS WITH blinkLeds(), SO COMMANDS ARE PICKED UP ON A 4 S GRID WHILE IDLE.
+    """
+
+    def __init__(self, blink_s=LOOP_BLINK_S):
+        self.blink_s = blink_s
+        self.next_check = blink_s   # FIRST serialEvent() AFTER setup() AND ONE loop()
+
+    def start_time(self, arrival):
+        if arrival <= self.next_check:
+            return self.next_check
+        if self.blink_s <= 0:
+            return arrival
+        loops = math.ceil((arrival - self.next_check) / self.blink_s)
+        return self.next_check + loops * self.blink_s
+
+    def finish(self, busy_until):
+        self.next_check = busy_until + self.blink_s
+
+
+def simulate(points, protocol=servo_protocol.PROTOCOL_JSON, baud_rate=9600,
+             max_points=servo_protocol.DEFAULT_MAX_POINTS, blink_s=LOOP_BLINK_S):
+    """
+    PREDICT A STOP-AND-WAIT DRAWING (HOST SENDS THE NEXT COMMAND WHEN THE PREVIOUS "N" ARRIVES).
+    RETURNS {"commands": [...], "total_s": .., "unreachable": [POINT INDICES]}
+    """
+    arm = ArmModel()
+    clock = FirmwareClock(blink_s)
+    commands = servo_protocol.encode_commands(points, protocol, max_points)
+    per_command = []
+    unreachable = []
+    now = 0.0
+    point_index = 0
+
+    for cmd in commands:
+        batch = servo_protocol.decode_batch(cmd) if protocol == servo_protocol.PROTOCOL_BATCH else \
+            [json.loads(cmd[:-1])]
+        arrival = now + wire_time(len(cmd), baud_rate)
+        start = clock.start_time(arrival)
+        busy = 0.0
+        debug_bytes = 0
+        for p in batch:
+            step = arm.execute(p["x"], p["y"], p["updown"])
+            busy += step["move_s"] + step["pen_s"]
+            debug_bytes += step["debug_bytes"]
+            if not step["reachable"]:
+                unreachable.append(point_index)
+            point_index += 1
+        done = start + busy
+        clock.finish(done)
+        ack_at = done + wire_time(debug_bytes + len("N\r\n"), baud_rate)
+        per_command.append({
+            "command": cmd,
+            "points": len(batch),
+            "wait_s": round(start - arrival, 4),
+            "busy_s": round(busy, 4),
+            "latency_s": round(ack_at - now, 4)
+        })
+        now = ack_at
+
+    return {"commands": per_command, "total_s": now, "unreachable": unreachable}
+
+
+class VirtualServoDevice:
+    """
+    SERIAL-PORT STAND-IN FOR THE SERVO ARDUINO, BACKED BY ArmModel.
+    SUPPORTS write() / readline() / in_waiting / close(), SO IT CAN BE PASSED TO send_points_to_servo().
+    time_scale=0 ANSWERS IMMEDIATELY AND ONLY ADVANCES THE VIRTUAL CLOCK (self.now),
+    time_scale=1 SLEEPS IN REAL TIME LIKE THE HARDWARE (0.1 = TEN TIMES FASTER).
+    readline() ON AN EMPTY PORT BLOCKS FOR timeout SECONDS LIKE serial.Serial (SCALED, OR IN FULL WITH time_scale=0:
+    NOTHING WILL ARRIVE, SO A CALLER WAITING FOR A REPLY MUST NOT SPIN).
+    """
+
+    def __init__(self, baud_rate=9600, supports_batch=True, time_scale=0.0, blink_s=LOOP_BLINK_S, timeout=1.0):
+        self.baud_rate = baud_rate
+        self.timeout = timeout
+        self.supports_batch = supports_batch
+        self.time_scale = time_scale
+        self.arm = ArmModel()
+        self.clock = FirmwareClock(blink_s)
+        self.now = 0.0
+        self.pending = b""
+        self.lines = []       # (VIRTUAL TIME AVAILABLE, BYTES)
+        self.is_open = True
+        self.drawn = []       # EVERY EXECUTED POINT, FOR INSPECTION IN TESTS
+
+    def _reply(self, at, text):
+        self.lines.append((at, (text + "\r\n").encode()))
+
+    def _handle(self, cmd, arrival):
+        start = self.clock.start_time(arrival)
+        if cmd == "?":
+            self.clock.finish(start)
+            self._reply(start, f"B{servo_protocol.DEFAULT_MAX_POINTS}" if self.supports_batch else "JSON parse error")
+            return
+        try:
+            if cmd.startswith("P") and self.supports_batch:
+                batch = servo_protocol.decode_batch(cmd)
+            else:
+                batch = [json.loads(cmd)]
+        except ValueError:
+            self.clock.finish(start)
+            self._reply(start, servo_protocol.BATCH_ERROR if cmd.startswith("P") else "JSON parse error")
+            return
+        t = start
+        for p in batch:
+            step = self.arm.execute(float(p.get("x", 0)), float(p.get("y", 0)), int(p.get("updown", 0)))
+            t += step["move_s"] + step["pen_s"]
+            if step["debug_bytes"]:
+                self._reply(t, PEN_DEBUG_LINE.format(self.arm.penpos).strip())
+            self.drawn.append(step)
+        self.clock.finish(t)
+        self._reply(t, "N")
+
+    def write(self, data):
+        self.pending += data
+        arrival = self.now + wire_time(len(data), self.baud_rate)
+        while b"R" in self.pending:
+            raw, self.pending = self.pending.split(b"R", 1)
+            self._handle(raw.decode(errors="ignore"), arrival)
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        return sum(len(line) for at, line in self.lines if at <= self.now)
+
+    def readline(self):
+        if not self.lines:
+            self.now += self.timeout
+            time.sleep(self.timeout * (self.time_scale if self.time_scale > 0 else 1.0))
+            return b""
+        at, line = self.lines.pop(0)
+        at += wire_time(len(line), self.baud_rate)
+        if at > self.now:
+            if self.time_scale > 0:
+                time.sleep((at - self.now) * self.time_scale)
+            self.now = at
+        return line
+
+    def reset_input_buffer(self):
+        self.lines = []
+
+    def close(self):
+        self.is_open = False
+
+
+def main():
+    """PRINT THE PREDICTED DRAWING TIME OF EVERY FILE GIVEN ON THE COMMAND LINE"""
+    if len(sys.argv) < 2:
+        print("USAGE: python arm_model.py converted_output_1.json [...]")
+        return
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8") as f:
+            points = json.load(f)
+        for protocol in (servo_protocol.PROTOCOL_JSON, servo_protocol.PROTOCOL_BATCH):
+            report = simulate(points, protocol)
+            busy = sum(c["busy_s"] for c in report["commands"])
+            print(f"[MODEL] {path} ({protocol}): {len(points)} POINTS, {len(report['commands'])} COMMANDS, "
+                  f"PREDICTED {report['total_s']:.1f}S (ARM BUSY {busy:.1f}S)")
+        if report["unreachable"]:
+            print(f"[MODEL] WARNING: {len(report['unreachable'])} UNREACHABLE POINTS, INDICES {report['unreachable']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import random
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# ========== BATCH REPROCESSING OF ARCHIVED SESSIONS ==========
+# RE-RUNS filterV1 -> filterV2 -> command_optimizer -> send_to_web FOR EVERY SESSION FILE (time_axis_contours.json
+# OF ONE CAPTURE) IN A FOLDER, ONE SESSION PER WORKER PROCESS, E.G. AFTER CHANGING rdp_epsilon, scaling_factors OR
+# THE BEND PARAMETERS. THE STAGES ARE THE NORMAL MODULES: THE WORKER POINTS THEIR PATH CONSTANTS AT THE SESSION'S
+# OWN OUTPUT FOLDER AND CALLS THEM AS main.py WOULD, SO THE RESULT IS WHAT THE LIVE PIPELINE WOULD HAVE PRODUCED.
+#
+#   <out>/<session name>/filter_input/filtered_time_axis_contours.json
+#   <out>/<session name>/arduino_input/converted_output_N.json
+#   <out>/<session name>/web/<timestamp>/...                      (send_to_web.py UPLOAD FOLDER LAYOUT)
+#   <out>/<session name>/reprocess.log                            (EVERYTHING THE STAGES PRINTED)
+#
+#   python batch_reprocess.py archive/ --out reprocessed/ --set filterV2.rdp_epsilon=2.5
+#
+# THE SESSION DATABASE IS NOT TOUCHED (IT DESCRIBES WHAT WAS ACTUALLY CAPTURED AND DRAWN), AND send_to_web.py'S
+# RANDOM scaling_factor IS SEEDED WITH THE SESSION NAME SO REPEATED BATCHES ARE COMPARABLE.
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT_DIR = os.path.join(base_dir, "reprocessed")
+LOG_NAME = "reprocess.log"
+
+STAGES = ("filter", "convert", "optimise", "web")
+STAGE_MODULES = {"filter": "filterV1", "convert": "filterV2", "optimise": "command_optimizer", "web": "send_to_web"}
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def parse_overrides(pairs):
+    """["filterV2.rdp_epsilon=2.5", ...] -> [("filterV2", "rdp_epsilon", 2.5), ...], VALUES ARE JSON (ELSE STRINGS)"""
+    overrides = []
+    for pair in pairs:
+        target, sep, raw = pair.partition("=")
+        module, dot, name = target.partition(".")
+        if not sep or not dot or module not in STAGE_MODULES.values():
+            raise ValueError(f"--set {pair}: EXPECTED <{'|'.join(STAGE_MODULES.values())}>.<NAME>=<VALUE>")
+        if not hasattr(importlib.import_module(module), name):
+            raise ValueError(f"--set {pair}: {module}.py HAS NO SETTING {name}")
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            value = raw
+        overrides.append((module, name, value))
+    return overrides
+
+
+def configure_stages(session_path, out_dir, overrides):
+    """POINT THE STAGE MODULES OF THIS WORKER AT ONE SESSION, RETURN THEM BY STAGE NAME"""
+    import session_store
+    session_store.STORE_ENABLED = False
+    modules = {stage: importlib.import_module(name) for stage, name in STAGE_MODULES.items()}
+    filter_dir = os.path.join(out_dir, "filter_input")
+    arduino_dir = os.path.join(out_dir, "arduino_input")
+    os.makedirs(filter_dir, exist_ok=True)
+    os.makedirs(arduino_dir, exist_ok=True)
+    filtered = os.path.join(filter_dir, "filtered_time_axis_contours.json")
+
+    f1 = modules["filter"]
+    f1.input_path = session_path
+    f1.output_directory = filter_dir
+    f1.output_path = filtered
+    f1.checkpoint_path = os.path.join(filter_dir, "filtered_time_axis_contours.checkpoint.json")
+
+    f2 = modules["convert"]
+    f2.input_path = filtered
+    f2.output_dir = arduino_dir
+    f2.output_prefix = os.path.join(arduino_dir, "converted_output_")
+
+    modules["optimise"].JSON_DIR_PATH = arduino_dir
+
+    web = modules["web"]
+    web.INPUT_JSON_PATH = filtered
+    web.ARDUINO_OUTPUT_FOLDER = arduino_dir
+    web.WEB_UPLOADS_FOLDER = os.path.join(out_dir, "web")
+    # ALWAYS A FULL EXPORT: BendCache DRAWS ITS RANDOM scaling_factor A DIFFERENT NUMBER OF TIMES DEPENDING ON
+    # WHETHER A CACHE EXISTS, SO REUSING --out WOULD CHANGE THE SEEDED BEND RADIUS
+    web.INCREMENTAL_EXPORT = False
+    web.BEND_CACHE_PATH = filtered + ".bendcache.npz"
+
+    for module, name, value in overrides:
+        setattr(importlib.import_module(module), name, value)
+    return modules
+
+
+def run_session(job):
+    """
+    REPROCESS ONE SESSION FILE. RUNS IN A WORKER PROCESS, RETURNS A STATS DICT
+    (A FAILING SESSION IS REPORTED IN "error", THE TRACEBACK IS IN ITS LOG, THE BATCH GOES ON).
+    """
+    session_path, out_dir, stages, overrides = job
+    name = os.path.splitext(os.path.basename(session_path))[0]
+    stats = {"name": name, "bytes": os.path.getsize(session_path), "persons": 0, "stage_s": {}}
+    started = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, LOG_NAME), "w", encoding="utf-8") as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        stage = "setup"
+        try:
+            modules = configure_stages(session_path, out_dir, overrides)
+            random.seed(name)
+            for stage in stages:
+                stage_started = time.perf_counter()
+                print(f"[BATCH] ===== {stage.upper()} ({STAGE_MODULES[stage]}.py) =====")
+                if stage == "filter":
+                    modules["filter"].run_full()    # main() PARSES THE COMMAND LINE AND WRITES THE DATABASE
+                else:
+                    modules[stage].main()
+                stats["stage_s"][stage] = time.perf_counter() - stage_started
+        except SystemExit as e:
+            # A STAGE THAT CALLS exit() HAS NOTHING TO WORK ON, E.G. AN EMPTY SESSION
+            if e.code not in (None, 0):
+                stats["error"] = f"{stage} EXITED WITH {e.code}"
+        except Exception as e:
+            traceback.print_exc()
+            stats["error"] = f"{stage}: {type(e).__name__}: {e}"
+    arduino_dir = os.path.join(out_dir, "arduino_input")
+    if os.path.isdir(arduino_dir):
+        stats["persons"] = sum(f.endswith(".json") for f in os.listdir(arduino_dir))
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def find_sessions(inputs):
+    """SESSION FILES: .json FILES GIVEN DIRECTLY OR FOUND IN THE GIVEN FOLDERS (NOT RECURSIVE)"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += [os.path.join(item, f) for f in sorted(os.listdir(item)) if f.endswith(".json")]
+        else:
+            paths.append(item)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="REPROCESS ARCHIVED SESSION FILES ON ALL CORES")
+    parser.add_argument("inputs", nargs="+", help="SESSION FILES OR FOLDERS OF SESSION FILES")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT_DIR, help="ONE SUB-FOLDER PER SESSION IS CREATED HERE")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"COMMA-SEPARATED, IN PIPELINE ORDER (DEFAULT {','.join(STAGES)})")
+    parser.add_argument("--set", action="append", default=[], metavar="MODULE.NAME=VALUE",
+                        help="OVERRIDE A STAGE SETTING, E.G. filterV2.rdp_epsilon=2.5 (REPEATABLE)")
+    args = parser.parse_args()
+
+    stages = [s for s in STAGES if s in args.stages.split(",")]
+    unknown = set(args.stages.split(",")) - set(STAGES)
+    if unknown or not stages:
+        parser.error(f"UNKNOWN STAGES {sorted(unknown)}, CHOOSE FROM {','.join(STAGES)}")
+    try:
+        overrides = parse_overrides(args.set)
+    except ValueError as e:
+        parser.error(str(e))
+
+    sessions = find_sessions(args.inputs)
+    if not sessions:
+        print("[BATCH] NO SESSION FILES FOUND")
+        sys.exit(1)
+    names = [os.path.splitext(os.path.basename(p))[0] for p in sessions]
+    if len(set(names)) != len(names):
+        parser.error("SESSION FILE NAMES MUST BE UNIQUE, THEY NAME THE OUTPUT FOLDERS")
+    jobs = [(os.path.abspath(p), os.path.join(args.out, n), stages, overrides) for p, n in zip(sessions, names)]
+
+    workers = max(1, min(args.workers, len(jobs)))
+    print(f"[BATCH] {len(jobs)} SESSIONS, STAGES {' -> '.join(stages)}, {workers} WORKERS -> {args.out}")
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_session, job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            stats = future.result()
+            results.append(stats)
+            status = f"FAILED ({stats['error']})" if "error" in stats else f"{stats['persons']} PERSONS"
+            elapsed = time.perf_counter() - started
+            eta = elapsed / done * (len(jobs) - done)
+            print(f"[BATCH] {done}/{len(jobs)} {stats['name']}: {status} IN {stats['seconds']:.1f}S "
+                  f"(ELAPSED {elapsed:.0f}S, ETA {eta:.0f}S)")
+
+    elapsed = time.perf_counter() - started
+    ok = [r for r in results if "error" not in r]
+    persons = sum(r["persons"] for r in ok)
+    megabytes = sum(r["bytes"] for r in results) / 1e6
+    busy = sum(r["seconds"] for r in results)
+    print("[BATCH] ===== SUMMARY =====")
+    print(f"[BATCH] {len(ok)}/{len(results)} SESSIONS OK, {persons} PERSONS, {megabytes:.1f} MB OF SESSION FILES")
+    print(f"[BATCH] ELAPSED {elapsed:.1f}S: {len(results) / elapsed:.2f} SESSIONS/S, {persons / elapsed:.1f} PERSONS/S, "
+          f"{megabytes / elapsed:.2f} MB/S, {busy / elapsed:.1f}x PARALLELISM (SESSION TIME / ELAPSED)")
+    for stage in stages:
+        total = sum(r["stage_s"].get(stage, 0.0) for r in results)
+        print(f"[BATCH]   {stage:<9} {total:8.1f}S WORKER TIME")
+    for r in results:
+        if "error" in r:
+            print(f"[BATCH] FAILED: {r['name']}: {r['error']} (SEE {os.path.join(args.out, r['name'], LOG_NAME)})")
+    if len(ok) != len(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
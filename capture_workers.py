@@ -0,0 +1,330 @@
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# ========== MULTI-PROCESS CAPTURE: SEGMENTATION AND FACE MESH ON SEPARATE CORES ==========
+# THE CAPTURE LOOP COPIES EVERY RGB FRAME INTO A RING OF SLOTS IN multiprocessing.shared_memory, SO FRAMES ARE
+# NEVER PICKLED. TWO WORKER PROCESSES ONLY RECEIVE (FRAME ID, SLOT) AND RUN IN PARALLEL:
+#   segmentation  SelfieSegmentation, WRITES THE 0/255 MASK INTO THE MASK RING SLOT WITH THE SAME INDEX
+#   face_mesh     FaceMesh, SENDS THE LANDMARKS BACK THROUGH THE RESULT QUEUE (468 x 3 FLOATS)
+# THE PARENT JOINS BOTH RESULTS BY FRAME ID, SO THE LATENCY OF A FRAME IS max(SEGMENTATION, FACE MESH) INSTEAD
+# OF THEIR SUM. A SLOT IS ONLY REUSED AFTER BOTH WORKERS ARE DONE WITH IT; WHEN ALL SLOTS ARE BUSY THE NEW FRAME
+# IS DROPPED, SO THE LOOP KEEPS UP WITH THE CAMERA STREAM AND ALWAYS WORKS ON RECENT FRAMES.
+# WORKERS ARE STARTED WITH "spawn" ON EVERY PLATFORM (MEDIAPIPE IS NOT FORK SAFE), SO THE SCRIPT THAT CREATES
+# A ParallelCapture MUST KEEP ITS WORK UNDER if __name__ == "__main__":
+
+RING_SLOTS = 2                  # FRAMES IN FLIGHT: ONE IN THE MODELS, ONE WAITING (MORE SLOTS ONLY ADD QUEUEING DELAY)
+SEGMENTATION_THRESHOLD = 0.5
+WORKER_START_TIMEOUT = 60.0     # MEDIAPIPE LOADS ITS MODELS WHEN THE WORKER STARTS
+WORKER_STOP_TIMEOUT = 5.0
+
+# MOTION GATE (SEE MotionGate)
+MOTION_THUMBNAIL_SIZE = (32, 18)    # (WIDTH, HEIGHT) OF THE GRAYSCALE THUMBNAIL
+MOTION_THRESHOLD = 3.0              # MEAN ABSOLUTE GRAY LEVEL DIFFERENCE (0..255) THAT COUNTS AS MOTION
+MOTION_MAX_REUSE = 30               # FORCE A REFRESH AFTER THIS MANY REUSED FRAMES (~1 S AT 30 FPS)
+
+
+# ----- MODELS (CREATED INSIDE THE WORKER PROCESS) -----
+
+def segmentation_model():
+    """RETURN A FUNCTION RGB FRAME -> BOOLEAN PERSON MASK (SAME AS THE SEQUENTIAL LOOP IN liner_to_rhino.py)"""
+    import mediapipe as mp
+    model = mp.solutions.selfie_segmentation.SelfieSegmentation(model_selection=1)
+
+    def run(rgb):
+        return model.process(rgb).segmentation_mask > SEGMENTATION_THRESHOLD
+    return run
+
+
+def face_mesh_model():
+    """RETURN A FUNCTION RGB FRAME -> (468, 3) LANDMARK ARRAY, OR None WHEN NO FACE WAS FOUND"""
+    import mediapipe as mp
+    model = mp.solutions.face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1)
+
+    def run(rgb):
+        results = model.process(rgb)
+        if not results.multi_face_landmarks:
+            return None
+        landmarks = results.multi_face_landmarks[0].landmark
+        return np.array([(lm.x, lm.y, lm.z) for lm in landmarks], dtype=np.float32)
+    return run
+
+
+# THE SEGMENTATION WORKER WRITES INTO THE MASK RING, ALL OTHER WORKERS RETURN THEIR RESULT THROUGH THE QUEUE.
+# THE FACTORIES MUST BE MODULE-LEVEL FUNCTIONS SO THEY CAN BE PICKLED FOR spawn.
+DEFAULT_MODELS = {
+    "segmentation": segmentation_model,
+    "face_mesh": face_mesh_model
+}
+MASK_MODEL = "segmentation"
+
+
+def _worker(name, factory, frames_name, masks_name, frame_shape, slots, tasks, results):
+    frames_shm = shared_memory.SharedMemory(name=frames_name)
+    masks_shm = shared_memory.SharedMemory(name=masks_name)
+    try:
+        frames = np.ndarray((slots,) + frame_shape, dtype=np.uint8, buffer=frames_shm.buf)
+        masks = np.ndarray((slots,) + frame_shape[:2], dtype=np.uint8, buffer=masks_shm.buf)
+        model = factory()
+        results.put((name, None, None, None, 0.0))   # READY
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            frame_id, slot = task
+            start = time.perf_counter()
+            try:
+                output = model(frames[slot])
+                error = None
+            except Exception as e:
+                output, error = None, f"{type(e).__name__}: {e}"
+            if name == MASK_MODEL and output is not None:
+                np.multiply(output, 255, out=masks[slot], casting="unsafe")
+                output = True
+            results.put((name, frame_id, output, error, time.perf_counter() - start))
+        del frames, masks
+    finally:
+        frames_shm.close()
+        masks_shm.close()
+
+
+class CaptureResult:
+    """ONE FRAME WITH ALL MODEL OUTPUTS. mask IS A 0/255 uint8 COPY (None IF SEGMENTATION FAILED)"""
+
+    def __init__(self, frame_id, payload, mask, outputs, latency, model_times):
+        self.frame_id = frame_id
+        self.payload = payload          # WHATEVER WAS PASSED TO submit(), E.G. THE ORIGINAL BGR FRAME
+        self.mask = mask
+        self.outputs = outputs          # MODEL NAME -> RESULT (face_mesh: LANDMARKS OR None)
+        self.latency = latency          # SECONDS FROM submit() UNTIL THE LAST MODEL FINISHED
+        self.model_times = model_times  # MODEL NAME -> SECONDS SPENT IN THE MODEL
+
+    @property
+    def landmarks(self):
+        return self.outputs.get("face_mesh")
+
+
+class ParallelCapture:
+    """
+    RING OF SHARED-MEMORY FRAME SLOTS + ONE WORKER PROCESS PER MODEL.
+      submit(rgb, payload)  COPY A FRAME INTO A FREE SLOT AND HAND IT TO ALL WORKERS (None = DROPPED, RING FULL)
+      collect(timeout)      RETURN THE FRAMES FOR WHICH ALL MODELS HAVE FINISHED, OLDEST FIRST
+    USE AS A CONTEXT MANAGER OR CALL start() / stop().
+    """
+
+    def __init__(self, frame_shape, slots=RING_SLOTS, models=None):
+        self.frame_shape = tuple(frame_shape)
+        self.slots = slots
+        self.models = dict(models or DEFAULT_MODELS)
+        if MASK_MODEL not in self.models:
+            raise ValueError(f"A '{MASK_MODEL}' MODEL IS REQUIRED")
+        self.stats = {"submitted": 0, "dropped": 0, "completed": 0, "errors": 0,
+                      "latency_s": 0.0, "model_s": {name: 0.0 for name in self.models}}
+        self._ctx = multiprocessing.get_context("spawn")
+        self._frames_shm = self._masks_shm = None
+        self._workers = {}          # NAME -> (PROCESS, TASK QUEUE)
+        self._results = None
+        self._free = list(range(slots))
+        self._pending = {}          # FRAME ID -> DICT(slot, payload, submitted, outputs, times)
+        self._next_id = 0
+
+    # ----- LIFECYCLE -----
+
+    def start(self):
+        height, width = self.frame_shape[:2]
+        frame_bytes = int(np.prod(self.frame_shape))
+        self._frames_shm = shared_memory.SharedMemory(create=True, size=self.slots * frame_bytes)
+        self._masks_shm = shared_memory.SharedMemory(create=True, size=self.slots * height * width)
+        self._frames = np.ndarray((self.slots,) + self.frame_shape, dtype=np.uint8, buffer=self._frames_shm.buf)
+        self._masks = np.ndarray((self.slots, height, width), dtype=np.uint8, buffer=self._masks_shm.buf)
+        self._results = self._ctx.Queue()
+        for name, factory in self.models.items():
+            tasks = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_worker,
+                args=(name, factory, self._frames_shm.name, self._masks_shm.name,
+                      self.frame_shape, self.slots, tasks, self._results),
+                name=f"capture-{name}",
+                daemon=True
+            )
+            process.start()
+            self._workers[name] = (process, tasks)
+
+        # WAIT UNTIL EVERY WORKER HAS LOADED ITS MODEL
+        ready = set()
+        deadline = time.monotonic() + WORKER_START_TIMEOUT
+        while ready != set(self.models):
+            try:
+                name, frame_id, _, _, _ = self._results.get(timeout=0.5)
+            except queue.Empty:
+                self._check_workers()
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("[CAPTURE] WORKERS DID NOT START IN TIME")
+                continue
+            if frame_id is None:
+                ready.add(name)
+        print(f"[CAPTURE] {len(self.models)} WORKER PROCESSES READY ({', '.join(self.models)}), "
+              f"{self.slots} FRAME SLOTS OF {self.frame_shape}")
+        return self
+
+    def stop(self):
+        for process, tasks in self._workers.values():
+            if process.is_alive():
+                tasks.put(None)
+        for process, _ in self._workers.values():
+            process.join(WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        self._workers = {}
+        self._frames = self._masks = None
+        for shm in (self._frames_shm, self._masks_shm):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self._frames_shm = self._masks_shm = None
+        if self.stats["completed"]:
+            done = self.stats["completed"]
+            model_ms = ", ".join(f"{name} {t / done * 1000:.0f} MS" for name, t in self.stats["model_s"].items())
+            print(f"[CAPTURE] {done} FRAMES, AVG LATENCY {self.stats['latency_s'] / done * 1000:.0f} MS "
+                  f"({model_ms}), {self.stats['dropped']} DROPPED, {self.stats['errors']} MODEL ERRORS")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _check_workers(self):
+        for name, (process, _) in self._workers.items():
+            if not process.is_alive():
+                raise RuntimeError(f"[CAPTURE] WORKER '{name}' EXITED WITH CODE {process.exitcode}")
+
+    # ----- FRAMES -----
+
+    def submit(self, rgb, payload=None):
+        """PUBLISH ONE RGB FRAME, RETURN ITS FRAME ID, OR None IF EVERY SLOT IS STILL IN USE"""
+        if rgb.shape != self.frame_shape:
+            raise ValueError(f"FRAME SHAPE {rgb.shape} DOES NOT MATCH THE RING ({self.frame_shape})")
+        if not self._free:
+            self.stats["dropped"] += 1
+            return None
+        slot = self._free.pop()
+        self._frames[slot] = rgb
+        frame_id = self._next_id
+        self._next_id += 1
+        self._pending[frame_id] = {"slot": slot, "payload": payload, "submitted": time.perf_counter(),
+                                   "outputs": {}, "times": {}}
+        for _, tasks in self._workers.values():
+            tasks.put((frame_id, slot))
+        self.stats["submitted"] += 1
+        return frame_id
+
+    def collect(self, timeout=0.0):
+        """
+        RETURN THE CaptureResults OF ALL FRAMES THAT ARE NOW COMPLETE (OLDEST FIRST).
+        timeout > 0 WAITS THAT LONG FOR THE FIRST WORKER RESULT IF NOTHING IS READY YET.
+        """
+        finished = []
+        block = timeout > 0
+        while True:
+            try:
+                name, frame_id, output, error, seconds = self._results.get(block, timeout if block else None)
+            except queue.Empty:
+                break
+            block = False
+            entry = self._pending.get(frame_id)
+            if entry is None:
+                continue
+            if error is not None:
+                print(f"[CAPTURE] {name} FAILED ON FRAME {frame_id}: {error}")
+                self.stats["errors"] += 1
+            entry["outputs"][name] = output
+            entry["times"][name] = seconds
+            if len(entry["outputs"]) == len(self.models):
+                finished.append(self._complete(frame_id))
+        if not finished:
+            self._check_workers()
+        return sorted(finished, key=lambda result: result.frame_id)
+
+    def _complete(self, frame_id):
+        entry = self._pending.pop(frame_id)
+        slot = entry["slot"]
+        outputs = entry["outputs"]
+        mask = self._masks[slot].copy() if outputs.get(MASK_MODEL) is not None else None
+        self._free.append(slot)
+        latency = time.perf_counter() - entry["submitted"]
+        self.stats["completed"] += 1
+        self.stats["latency_s"] += latency
+        for name, seconds in entry["times"].items():
+            self.stats["model_s"][name] += seconds
+        outputs = {name: value for name, value in outputs.items() if name != MASK_MODEL}
+        return CaptureResult(frame_id, entry["payload"], mask, outputs, latency, entry["times"])
+
+
+# ========== MOTION GATE ==========
+# BETWEEN TWO TURNTABLE STEPS THE SCENE BARELY CHANGES. THE GATE COMPARES A TINY GRAYSCALE THUMBNAIL OF EVERY FRAME
+# WITH THE THUMBNAIL OF THE LAST FRAME THAT WENT THROUGH THE MODELS; BELOW THE THRESHOLD THE CAPTURE LOOP REUSES THE
+# PREVIOUS MASK INSTEAD OF RUNNING SEGMENTATION AGAIN. A FRAME WITH MOTION IS PROCESSED IMMEDIATELY (NO EXTRA DELAY),
+# AND AFTER max_reuse STATIC FRAMES ONE IS PROCESSED ANYWAY, SO SLOW DRIFT (LIGHT, AUTO EXPOSURE) IS PICKED UP.
+
+def thumbnail(rgb, size=MOTION_THUMBNAIL_SIZE):
+    """(HEIGHT, WIDTH) float32 GRAYSCALE THUMBNAIL: SAMPLE A 4x FINER GRID OF PIXELS, THEN AVERAGE 4x4 BLOCKS"""
+    width, height = size
+    rows = np.linspace(0, rgb.shape[0] - 1, height * 4).astype(np.intp)
+    cols = np.linspace(0, rgb.shape[1] - 1, width * 4).astype(np.intp)
+    sample = rgb[rows[:, None], cols].astype(np.float32)
+    gray = sample @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return gray.reshape(height, 4, width, 4).mean(axis=(1, 3))
+
+
+class MotionGate:
+    """
+    is_static(rgb)  True = THE SCENE DID NOT CHANGE SINCE THE LAST PROCESSED FRAME, REUSE ITS RESULT
+    processed()     CALL AFTER THE FRAME FOR WHICH is_static() RETURNED False WAS ACTUALLY PROCESSED
+                    (IT BECOMES THE NEW REFERENCE AND IS COUNTED; A FRAME DROPPED BY A FULL RING IS NEITHER)
+    """
+
+    def __init__(self, threshold=MOTION_THRESHOLD, max_reuse=MOTION_MAX_REUSE, size=MOTION_THUMBNAIL_SIZE):
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self.size = size
+        self.stats = {"reused": 0, "processed": 0, "forced": 0}
+        self.last_difference = None
+        self._reference = None
+        self._candidate = None
+        self._candidate_forced = False
+        self._reused = 0
+
+    def is_static(self, rgb):
+        thumb = thumbnail(rgb, self.size)
+        forced = False
+        if self._reference is not None:
+            self.last_difference = float(np.abs(thumb - self._reference).mean())
+            if self.last_difference <= self.threshold:
+                if self._reused < self.max_reuse:
+                    self._reused += 1
+                    self.stats["reused"] += 1
+                    return True
+                forced = True
+        self._candidate = thumb
+        self._candidate_forced = forced
+        return False
+
+    def processed(self):
+        if self._candidate is not None:
+            self._reference = self._candidate
+            self._candidate = None
+            self._reused = 0
+            self.stats["processed"] += 1
+            self.stats["forced"] += self._candidate_forced
+
+    def report(self):
+        total = self.stats["reused"] + self.stats["processed"]
+        if total:
+            print(f"[MOTION] {self.stats['reused']} OF {total} FRAMES REUSED THE PREVIOUS MASK "
+                  f"({self.stats['reused'] / total:.0%} SKIPPED), {self.stats['processed']} PROCESSED "
+                  f"({self.stats['forced']} FORCED REFRESHES, THRESHOLD {self.threshold})")
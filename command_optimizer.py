@@ -0,0 +1,168 @@
+import json
+import math
+import os
+import time
+
+import arm_model
+import session_store
+
+# ========== SERVO COMMAND-STREAM OPTIMISER (RUNS BETWEEN filterV2.py AND send_to_arduino.py) ==========
+# A COMMAND {"x", "y", "updown"} MEANS: MOVE TO (x, y) WITH THE CURRENT PEN STATE, THEN SET THE PEN TO updown.
+# SO THE PEN STATE WHILE MOVING INTO A POINT IS THE updown OF THE PREVIOUS COMMAND.
+# WITH THE DEFAULT SETTINGS THE PASSES BELOW ONLY REMOVE COMMANDS WHOSE REMOVAL LEAVES THE SAME MARKS ON PAPER:
+#   1) PEN-UP TRAVEL WAYPOINTS (ARRIVE PEN UP, STAY PEN UP, MORE COMMANDS FOLLOW), E.G. THE "50, 50" AFTER A NOSE LINE
+#   2) REPEATED POINTS THAT ONLY CHANGE updown, MERGED INTO ONE PEN TRANSITION. POINTS CLOSER THAN MIN_MOVE BUT NOT
+#      EQUAL ARE ONLY MERGED ONTO THE ONE WHERE THE PEN TOUCHES THE PAPER, SO A PEN-DOWN POINT IS NEVER MOVED
+#      (A PEN DAB - DOWN AND UP AGAIN ON ONE SPOT - IS A DOT ON PAPER AND IS KEPT)
+#   3) COLLINEAR MID-STROKE POINTS WITHOUT A PEN CHANGE. RAISING COLLINEAR_TOLERANCE ALSO DROPS NEAR-COLLINEAR
+#      POINTS, WHICH SAVES MORE COMMANDS BUT MOVES PEN-DOWN PATHS BY UP TO THE TOLERANCE
+
+# INPUT FOLDER, SAME AS filterV2.py OUTPUT / send_to_arduino.py INPUT
+base_dir = os.path.dirname(os.path.abspath(__file__))
+JSON_DIR_PATH = os.path.join(base_dir, "arduino_input")
+
+MIN_MOVE = 0.1                # MOVES SHORTER THAN THIS ARE TREATED AS "SAME SPOT" (COORDINATES ARE ROUNDED TO 0.1)
+SAME_SPOT_EPSILON = 1e-9      # SO TWO ROUNDED POINTS 0.1 APART ARE NOT "SAME SPOT" BECAUSE OF FLOAT ERROR
+COLLINEAR_TOLERANCE = 1e-6    # MAX DISTANCE OF A DROPPED POINT FROM THE STRAIGHT SEGMENT THAT REPLACES IT (E.G. 0.2: LOSSY)
+
+
+def _dist(a, b):
+    return math.hypot(a["x"] - b["x"], a["y"] - b["y"])
+
+
+def _segment_distance(p, a, b):
+    """DISTANCE FROM p TO SEGMENT a-b, None IF p DOES NOT PROJECT ONTO THE SEGMENT (WOULD BE A BACKTRACK)"""
+    dx, dy = b["x"] - a["x"], b["y"] - a["y"]
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        return _dist(p, a)
+    t = ((p["x"] - a["x"]) * dx + (p["y"] - a["y"]) * dy) / length2
+    if t < 0 or t > 1:
+        return None
+    return math.hypot(p["x"] - (a["x"] + t * dx), p["y"] - (a["y"] + t * dy))
+
+
+def _drop_pen_up_travel(points, initial_updown):
+    out = []
+    state = initial_updown
+    for i, p in enumerate(points):
+        if state == 0 and p["updown"] == 0 and i + 1 < len(points):
+            continue
+        out.append(p)
+        state = p["updown"]
+    return out
+
+
+def _merge_same_spot(points, initial_updown, min_move):
+    out = []
+    for p in points:
+        distance = _dist(out[-1], p) if out else None
+        if out and distance < min_move - SAME_SPOT_EPSILON:
+            prev = out[-1]
+            prev_state = out[-2]["updown"] if len(out) > 1 else initial_updown
+            # prev ONLY MATTERS IF IT PRESSES THE PEN AT A DIFFERENT DEPTH THAN BOTH ITS NEIGHBOURS
+            if prev["updown"] == 0 or prev["updown"] == prev_state or prev["updown"] == p["updown"]:
+                prev_touches = prev_state > 0 or prev["updown"] > 0     # THE PEN IS ON THE PAPER AT prev
+                p_touches = prev["updown"] > 0 or p["updown"] > 0
+                # THE MERGED POINT STAYS WHERE THE PEN TOUCHES THE PAPER; IF IT TOUCHES AT BOTH (E.G. A RUN OF SHORT
+                # PEN-DOWN STEPS) ONLY EXACT REPEATS ARE MERGED, SO A STROKE IS NEVER SHORTENED OR MOVED
+                if distance <= SAME_SPOT_EPSILON or not p_touches:
+                    out[-1] = {**p, "x": prev["x"], "y": prev["y"]}
+                    continue
+                if not prev_touches:
+                    out[-1] = p
+                    continue
+        out.append(p)
+    return out
+
+
+def _drop_collinear(points, tolerance):
+    if len(points) < 3:
+        return points[:]
+    out = [points[0]]
+    dropped = []             # POINTS REMOVED SINCE out[-1], THEY MUST STAY CLOSE TO THE NEW SEGMENT
+    for i in range(1, len(points) - 1):
+        p, nxt = points[i], points[i + 1]
+        arriving = out[-1]["updown"]
+        if p["updown"] == arriving:
+            candidates = dropped + [p]
+            distances = [_segment_distance(c, out[-1], nxt) for c in candidates]
+            if all(d is not None and d <= tolerance for d in distances):
+                dropped.append(p)
+                continue
+        out.append(p)
+        dropped = []
+    out.append(points[-1])
+    return out
+
+
+def optimise_commands(points, initial_updown=0, min_move=MIN_MOVE, tolerance=COLLINEAR_TOLERANCE):
+    """
+    RETURN (OPTIMISED POINTS, STATS). initial_updown IS THE PEN STATE BEFORE THE FIRST COMMAND
+    (0: EVERY DRAWING IS STARTED WITH THE PEN UP).
+    """
+    current = list(points)
+    while True:
+        before = len(current)
+        current = _drop_pen_up_travel(current, initial_updown)
+        current = _merge_same_spot(current, initial_updown, min_move)
+        current = _drop_collinear(current, tolerance)
+        if len(current) == before:
+            break
+    stats = {"before": len(points), "after": len(current), "saved": len(points) - len(current)}
+    return current, stats
+
+
+def pen_down_segments(points, initial_updown=0):
+    """LIST OF ((x0, y0), (x1, y1), DEPTH) DRAWN BY THE STREAM, ZERO-LENGTH SEGMENTS ARE DOTS"""
+    segments = []
+    state = initial_updown
+    prev = None
+    for p in points:
+        pos = (p["x"], p["y"])
+        if prev is not None and state > 0:
+            segments.append((prev, pos, state))
+        if p["updown"] > 0 and state != p["updown"]:
+            segments.append((pos, pos, p["updown"]))
+        state = p["updown"]
+        prev = pos
+    return segments
+
+
+def optimise_file(path):
+    """OPTIMISE ONE converted_output_N.json IN PLACE, RETURN (ORIGINAL COMMANDS, OPTIMISED COMMANDS, STATS)"""
+    with open(path, "r", encoding="utf-8") as f:
+        points = json.load(f)
+    optimised, stats = optimise_commands(points)
+    stats["predicted_before_s"] = arm_model.simulate(points)["total_s"] if points else 0.0
+    stats["predicted_after_s"] = arm_model.simulate(optimised)["total_s"] if optimised else 0.0
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(optimised, f, ensure_ascii=False, indent=2)
+    return points, optimised, stats
+
+
+def main():
+    json_files = sorted(f for f in os.listdir(JSON_DIR_PATH) if f.endswith(".json"))
+    total_before = total_after = 0
+    time_before = time_after = 0.0
+    store = session_store.open_store()
+    for jf in json_files:
+        started = time.time()
+        points, optimised, stats = optimise_file(os.path.join(JSON_DIR_PATH, jf))
+        session_id = store.drawing_session(jf, points) if store else None
+        if session_id is not None and store.update_drawing(session_id, jf, optimised):
+            store.add_timing(session_id, "optimise", time.time() - started, started, detail=jf)
+        total_before += stats["before"]
+        total_after += stats["after"]
+        time_before += stats["predicted_before_s"]
+        time_after += stats["predicted_after_s"]
+        print(f"[OPTIMISE] {jf}: {stats['before']} -> {stats['after']} COMMANDS ({stats['saved']} SAVED), "
+              f"PREDICTED {stats['predicted_before_s']:.0f}S -> {stats['predicted_after_s']:.0f}S")
+    print(f"[OPTIMISE] TOTAL: {total_before} -> {total_after} COMMANDS ({total_before - total_after} SAVED), "
+          f"PREDICTED {time_before:.0f}S -> {time_after:.0f}S")
+    if store:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
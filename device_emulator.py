@@ -0,0 +1,238 @@
+import abc
+import argparse
+import os
+import random
+import select
+import threading
+import time
+
+import arm_model
+
+# ========== PSEUDO-TERMINAL EMULATORS OF THE TWO ARDUINOS ==========
+# ServoEmulator SPEAKS THE arm_final.ino PROTOCOL ('R'-TERMINATED JSON OR BATCH FRAMES, "N" / "E" /
+# "JSON parse error" REPLIES, PEN DEBUG LINES) WITH THE TIMING OF arm_model.py.
+# MotorEmulator SPEAKS THE motor.ino PROTOCOL ("AB <SECONDS>" -> "Done", "C" -> 6 x C_STEP/CONTINUE -> "Done").
+# BOTH ARE EXPOSED AS A PTY (E.G. /dev/pts/5), SO send_to_arduino.py AND liner_to_rhino.py CAN BE RUN
+# UNCHANGED ON A LINUX BOX BY POINTING THEIR *_SERIAL_PORT AT emulator.port. pty IS NOT AVAILABLE ON WINDOWS.
+
+# ----- TIMING -----
+TIME_SCALE = 1.0              # 1 = REAL FIRMWARE TIMING, 0.1 = TEN TIMES FASTER, 0 = ANSWER IMMEDIATELY
+MOTOR_C_STEP_S = 0.03 + 1.5   # DELAY_60_DEG + THE 1.5 S PHOTO PAUSE BEFORE EVERY "C_STEP"
+MOTOR_C_STEPS = 6
+MOTOR_C_RETURN_S = 6 * 0.03   # ONE-SHOT REVERSE 360 DEGREES
+
+
+class Faults:
+    """
+    FAULT INJECTION, APPLIED PER COMMAND (ALL RATES ARE PROBABILITIES 0..1):
+      corrupt_rate     FLIP ONE BYTE OF THE INCOMING COMMAND (THE FIRMWARE THEN REPORTS A PARSE ERROR)
+      drop_reply_rate  SWALLOW THE "N" / "Done" OF A COMMAND (THE HOST RUNS INTO ITS TIMEOUT)
+      extra_latency_s  ADDED TO EVERY REPLY
+      disconnect_after CLOSE THE PTY AFTER THIS MANY COMMANDS, LIKE A PULLED USB CABLE (None = NEVER)
+    """
+
+    def __init__(self, corrupt_rate=0.0, drop_reply_rate=0.0, extra_latency_s=0.0, disconnect_after=None, seed=None):
+        self.corrupt_rate = corrupt_rate
+        self.drop_reply_rate = drop_reply_rate
+        self.extra_latency_s = extra_latency_s
+        self.disconnect_after = disconnect_after
+        self.random = random.Random(seed)
+
+    def corrupt(self, data):
+        if not data or self.random.random() >= self.corrupt_rate:
+            return data
+        i = self.random.randrange(len(data))
+        return data[:i] + b"#" + data[i + 1:]
+
+    def drop(self):
+        return self.random.random() < self.drop_reply_rate
+
+
+class PtyDevice(abc.ABC):
+    """
+    BASE CLASS: OWNS THE PTY PAIR AND A WORKER THREAD THAT RUNS self._serve() (IMPLEMENTED BY EACH FIRMWARE).
+    USE AS A CONTEXT MANAGER OR CALL start() / stop(); THE HOST OPENS self.port WITH pyserial.
+    """
+
+    def __init__(self, time_scale=TIME_SCALE, faults=None):
+        self.time_scale = time_scale
+        self.faults = faults or Faults()
+        self.commands = 0
+        self.received = []    # EVERY COMMAND AS RECEIVED, FOR INSPECTION IN LOAD TESTS
+        self.port = None
+        self._master = self._slave = None
+        self._buffer = b""
+        self._stop = threading.Event()
+        self._thread = None
+        self._t0 = None
+
+    # ----- LIFECYCLE -----
+
+    def start(self):
+        import pty
+        import tty
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._t0 = time.monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _run(self):
+        try:
+            self._serve()
+        except (OSError, EOFError):
+            pass
+
+    # ----- I/O HELPERS -----
+
+    def _sleep(self, seconds):
+        if self.time_scale > 0 and seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def _read_until(self, terminator):
+        """BLOCK UNTIL terminator ARRIVES, RETURN THE BYTES BEFORE IT (RAISES EOFError WHEN STOPPED)"""
+        while terminator not in self._buffer:
+            if self._stop.is_set():
+                raise EOFError
+            ready, _, _ = select.select([self._master], [], [], 0.1)
+            if ready:
+                self._buffer += os.read(self._master, 1024)
+        raw, self._buffer = self._buffer.split(terminator, 1)
+        return raw
+
+    def _next_command(self, terminator):
+        raw = self.faults.corrupt(self._read_until(terminator))
+        self.commands += 1
+        self.received.append(raw.decode(errors="ignore"))
+        return raw
+
+    def _reply(self, text, droppable=True):
+        if droppable and self.faults.drop():
+            return
+        self._sleep(self.faults.extra_latency_s)
+        os.write(self._master, (text + "\r\n").encode())
+
+    def _check_disconnect(self):
+        limit = self.faults.disconnect_after
+        if limit is not None and self.commands >= limit:
+            os.close(self._master)
+            self._master = None
+            raise EOFError
+
+    @abc.abstractmethod
+    def _serve(self):
+        """THE FIRMWARE LOOP: READ COMMANDS WITH _next_command(), ANSWER WITH _reply(), UNTIL EOFError"""
+
+
+class ServoEmulator(PtyDevice):
+    """arm_final.ino: THE ARM IS SIMULATED BY arm_model.VirtualServoDevice, REPLIES ARE RELEASED IN (SCALED) REAL TIME"""
+
+    def __init__(self, baud_rate=9600, supports_batch=True, time_scale=TIME_SCALE,
+                 blink_s=arm_model.LOOP_BLINK_S, faults=None):
+        super().__init__(time_scale, faults)
+        self.device = arm_model.VirtualServoDevice(baud_rate, supports_batch, time_scale=0.0, blink_s=blink_s)
+
+    @property
+    def drawn(self):
+        return self.device.drawn
+
+    def _serve(self):
+        while True:
+            raw = self._next_command(b"R")
+            device = self.device
+            if self.time_scale > 0:
+                # THE FIRMWARE KEEPS LOOPING WHILE THE HOST IS IDLE
+                device.now = max(device.now, (time.monotonic() - self._t0) / self.time_scale)
+            device.write(raw + b"R")
+            while device.lines:
+                at, line = device.lines[0]
+                self._sleep(at + arm_model.wire_time(len(line), device.baud_rate) - device.now)
+                device.readline()
+                text = line.decode().strip()
+                self._reply(text, droppable=text == "N")
+            self._check_disconnect()
+
+
+class MotorEmulator(PtyDevice):
+    """motor.ino: ONE COMMAND PER LINE, "AB <SECONDS>" ROLLS THE PAPER, "C" TURNS THE CAMERA PLATE IN 6 STEPS"""
+
+    def __init__(self, time_scale=TIME_SCALE, faults=None):
+        super().__init__(time_scale, faults)
+
+    def _serve(self):
+        while True:
+            line = self._next_command(b"\n").decode(errors="ignore").strip()
+            if not line:
+                continue
+            cmd, _, param = line.partition(" ")
+            cmd = cmd.upper()
+            if cmd == "AB":
+                try:
+                    seconds = float(param)
+                except ValueError:
+                    seconds = 0.0   # String.toFloat() RETURNS 0 FOR GARBAGE
+                if seconds > 0:
+                    self._sleep(seconds + seconds / 2)   # A, B, D FORWARD, THEN A BACK FOR HALF THE TIME
+            elif cmd == "C":
+                for _ in range(MOTOR_C_STEPS):
+                    self._sleep(MOTOR_C_STEP_S)
+                    self._reply("C_STEP", droppable=False)
+                    while self._read_until(b"\n").decode(errors="ignore").strip().upper() != "CONTINUE":
+                        pass
+                self._sleep(MOTOR_C_RETURN_S)
+            self._reply("Done")
+            self._check_disconnect()
+
+
+def main():
+    """START BOTH EMULATORS AND PRINT THEIR PORTS, UNTIL CTRL+C"""
+    parser = argparse.ArgumentParser(description="PTY EMULATORS OF THE SERVO AND MOTOR ARDUINOS")
+    parser.add_argument("--time-scale", type=float, default=TIME_SCALE)
+    parser.add_argument("--json-only", action="store_true", help="EMULATE THE OLD FIRMWARE WITHOUT BATCH FRAMES")
+    parser.add_argument("--corrupt-rate", type=float, default=0.0)
+    parser.add_argument("--drop-reply-rate", type=float, default=0.0)
+    parser.add_argument("--extra-latency", type=float, default=0.0)
+    parser.add_argument("--disconnect-after", type=int, default=None,
+                        help="CLOSE EACH PTY AFTER THIS MANY COMMANDS, LIKE A PULLED USB CABLE")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    def faults():
+        return Faults(args.corrupt_rate, args.drop_reply_rate, args.extra_latency, args.disconnect_after,
+                      seed=args.seed)
+
+    with ServoEmulator(supports_batch=not args.json_only, time_scale=args.time_scale, faults=faults()) as servo, \
+            MotorEmulator(time_scale=args.time_scale, faults=faults()) as motor:
+        print(f"[EMULATOR] SERVO ARDUINO ON {servo.port}  (SET SERVO_SERIAL_PORT IN send_to_arduino.py)")
+        print(f"[EMULATOR] MOTOR ARDUINO ON {motor.port}  (SET MOTOR_SERIAL_PORT IN send_to_arduino.py / liner_to_rhino.py)")
+        try:
+            while True:
+                time.sleep(5)
+                print(f"[EMULATOR] SERVO: {servo.commands} COMMANDS, {len(servo.drawn)} POINTS DRAWN; "
+                      f"MOTOR: {motor.commands} COMMANDS")
+        except KeyboardInterrupt:
+            print("[EMULATOR] STOPPED")
+
+
+if __name__ == "__main__":
+    main()
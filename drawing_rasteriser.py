@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import session_store
+
+# ========== PREVIEW RASTERISER FOR DRAWING COMMAND FILES ==========
+# RENDERS WHAT send_to_arduino.py WOULD DRAW FROM A converted_output_N.json (OR A DRAWING STORED IN sessions.sqlite3)
+# TO A GREYSCALE PNG IN MILLISECONDS, WITHOUT THE ARM. SAME PEN SEMANTICS AS command_optimizer.pen_down_segments():
+# A COMMAND MOVES TO (x, y) WITH THE PREVIOUS COMMAND'S updown, THEN SETS THE PEN TO ITS OWN updown.
+# THE WHOLE STREAM IS HANDLED AS ARRAYS: SEGMENTS ARE SAMPLED AT <= 1 PIXEL STEPS AND STAMPED WITH ONE FANCY-INDEXED
+# WRITE PER PEN DEPTH, NO PER-POINT PYTHON LOOP.
+#
+#   python drawing_rasteriser.py                          RENDER arduino_input/*.json TO preview/
+#   python drawing_rasteriser.py --db                     RENDER EVERY DRAWING ARCHIVED IN sessions.sqlite3
+#   python drawing_rasteriser.py old/ --compare new/      ALSO WRITE A DIFF IMAGE PER FILE PRESENT IN BOTH FOLDERS
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+JSON_DIR_PATH = os.path.join(base_dir, "arduino_input")
+PREVIEW_DIR = os.path.join(base_dir, "preview")
+
+# PAPER WINDOW IN ARM COORDINATES (x_min, y_min, x_max, y_max). filterV2.py PLACES A PERSON IN ROUGHLY
+# x -100..150, y 30..280 AND THE END-OF-DRAWING MARK AT (-250, 50). A FIXED WINDOW KEEPS IMAGES COMPARABLE.
+PAPER_BOUNDS = (-260.0, 20.0, 160.0, 290.0)
+PIXELS_PER_UNIT = 2.0
+FIT_MARGIN = 5.0                          # --fit: MARGIN AROUND THE DRAWN SEGMENTS (ARM UNITS)
+
+BACKGROUND = 255
+PEN_INK = {1: 150, 2: 80, 3: 0}           # GREY LEVEL PER updown DEPTH, DEEPER PRESSES DRAW DARKER
+PEN_WIDTH_PX = {1: 1, 2: 2, 3: 3}         # STROKE WIDTH PER DEPTH (SQUARE BRUSH)
+UNKNOWN_DEPTH_INK = 0
+TRAVEL_INK = 225                          # --travel: PEN-UP MOVES, ONE PIXEL WIDE
+
+DIFF_COLOURS = {"both": (0, 0, 0), "before": (220, 40, 40), "after": (40, 90, 220)}
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+CHUNK_SIZE = 16                           # DRAWINGS PER TASK SENT TO A WORKER PROCESS
+
+
+# ----- COMMAND STREAM -> SEGMENT ARRAYS -----
+
+def command_array(commands):
+    """[{"x", "y", "updown"}, ...] (OR AN ARRAY ALREADY IN session_store.COMMAND_DTYPE) AS A STRUCTURED ARRAY"""
+    if isinstance(commands, np.ndarray):
+        return commands
+    packed = np.zeros(len(commands), dtype=session_store.COMMAND_DTYPE)
+    if commands:
+        packed["x"] = [c["x"] for c in commands]
+        packed["y"] = [c["y"] for c in commands]
+        packed["updown"] = [c["updown"] for c in commands]
+    return packed
+
+
+def segment_arrays(commands, initial_updown=0):
+    """
+    (X0, Y0, X1, Y1, DEPTH) ARRAYS OF THE MARKS THE STREAM LEAVES: DEPTH > 0 ARE PEN-DOWN SEGMENTS AND DOTS
+    (A DOT IS A ZERO-LENGTH SEGMENT WHERE THE PEN GOES DOWN), DEPTH == 0 ARE PEN-UP TRAVEL MOVES.
+    """
+    cmds = command_array(commands)
+    x = cmds["x"].astype(np.float64)
+    y = cmds["y"].astype(np.float64)
+    updown = cmds["updown"].astype(np.int64)
+    if len(cmds) == 0:
+        empty = np.zeros(0)
+        return empty, empty, empty, empty, np.zeros(0, dtype=np.int64)
+    state = np.concatenate(([initial_updown], updown[:-1]))     # PEN STATE WHILE MOVING INTO COMMAND i
+    moves = np.arange(1, len(cmds))
+    dots = np.flatnonzero((updown > 0) & (updown != state))
+    x0 = np.concatenate((x[moves - 1], x[dots]))
+    y0 = np.concatenate((y[moves - 1], y[dots]))
+    x1 = np.concatenate((x[moves], x[dots]))
+    y1 = np.concatenate((y[moves], y[dots]))
+    depth = np.concatenate((state[moves], updown[dots]))
+    return x0, y0, x1, y1, depth
+
+
+def fit_bounds(segments, margin=FIT_MARGIN):
+    """THE SMALLEST WINDOW AROUND THE PEN-DOWN SEGMENTS, PAPER_BOUNDS IF NOTHING IS DRAWN"""
+    x0, y0, x1, y1, depth = segments
+    down = depth > 0
+    if not down.any():
+        return PAPER_BOUNDS
+    xs = np.concatenate((x0[down], x1[down]))
+    ys = np.concatenate((y0[down], y1[down]))
+    return (xs.min() - margin, ys.min() - margin, xs.max() + margin, ys.max() + margin)
+
+
+# ----- RASTERISATION -----
+
+def _sample_segments(c0, r0, c1, r1):
+    """PIXEL POSITIONS ALONG EVERY SEGMENT AT <= 1 PIXEL STEPS, ALL SEGMENTS AT ONCE"""
+    steps = np.ceil(np.hypot(c1 - c0, r1 - r0)).astype(np.int64) + 1
+    total = int(steps.sum())
+    owner = np.repeat(np.arange(len(steps)), steps)
+    first = np.repeat(np.cumsum(steps) - steps, steps)
+    t = (np.arange(total) - first) / np.maximum(steps - 1, 1)[owner]
+    cols = np.rint(c0[owner] + t * (c1 - c0)[owner]).astype(np.int64)
+    rows = np.rint(r0[owner] + t * (r1 - r0)[owner]).astype(np.int64)
+    return cols, rows
+
+
+def _stamp(image, cols, rows, ink, width):
+    """DARKEN A width x width BRUSH AROUND EVERY SAMPLE (OVERLAPPING STROKES KEEP THE DARKER INK)"""
+    height, image_width = image.shape
+    offsets = np.arange(width) - (width - 1) // 2
+    dc, dr = (o.ravel() for o in np.meshgrid(offsets, offsets))
+    cols = (cols[:, None] + dc[None, :]).ravel()
+    rows = (rows[:, None] + dr[None, :]).ravel()
+    inside = (cols >= 0) & (cols < image_width) & (rows >= 0) & (rows < height)
+    cols, rows = cols[inside], rows[inside]
+    image[rows, cols] = np.minimum(image[rows, cols], ink)
+
+
+def rasterise(commands, bounds=PAPER_BOUNDS, pixels_per_unit=PIXELS_PER_UNIT, show_travel=False, fit=False):
+    """RENDER ONE COMMAND STREAM TO A uint8 GREYSCALE IMAGE (ROW 0 IS THE FAR EDGE OF THE PAPER, max y)"""
+    segments = segment_arrays(commands)
+    if fit:
+        bounds = fit_bounds(segments)
+    x_min, y_min, x_max, y_max = bounds
+    width = max(int(np.ceil((x_max - x_min) * pixels_per_unit)) + 1, 1)
+    height = max(int(np.ceil((y_max - y_min) * pixels_per_unit)) + 1, 1)
+    image = np.full((height, width), BACKGROUND, dtype=np.uint8)
+
+    x0, y0, x1, y1, depth = segments
+    c0, c1 = (x0 - x_min) * pixels_per_unit, (x1 - x_min) * pixels_per_unit
+    r0, r1 = (y_max - y0) * pixels_per_unit, (y_max - y1) * pixels_per_unit
+    layers = [(0, TRAVEL_INK, 1)] if show_travel else []
+    layers += [(d, PEN_INK.get(d, UNKNOWN_DEPTH_INK), PEN_WIDTH_PX.get(d, 1)) for d in np.unique(depth) if d > 0]
+    for d, ink, brush in layers:
+        mask = depth == d
+        if mask.any():
+            cols, rows = _sample_segments(c0[mask], r0[mask], c1[mask], r1[mask])
+            _stamp(image, cols, rows, ink, brush)
+    return image
+
+
+def diff_image(before, after):
+    """
+    RGB COMPARISON OF TWO RENDERS OF THE SAME SIZE: INK IN BOTH IS BLACK, ONLY IN before RED, ONLY IN after BLUE.
+    RETURNS (IMAGE, NUMBER OF PIXELS INKED IN ONLY ONE OF THEM).
+    """
+    a = before < BACKGROUND
+    b = after < BACKGROUND
+    image = np.full(before.shape + (3,), BACKGROUND, dtype=np.uint8)
+    image[a & b] = DIFF_COLOURS["both"]
+    image[a & ~b] = DIFF_COLOURS["before"]
+    image[b & ~a] = DIFF_COLOURS["after"]
+    return image, int(np.count_nonzero(a != b))
+
+
+# ----- PNG (zlib + struct, NO IMAGING LIBRARY NEEDED) -----
+
+def _png_chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def encode_png(image):
+    """uint8 IMAGE, (H, W) GREYSCALE OR (H, W, 3) RGB, AS PNG BYTES"""
+    height, width = image.shape[:2]
+    colour_type = 2 if image.ndim == 3 else 0
+    rows = image.reshape(height, -1)
+    raw = np.hstack((np.zeros((height, 1), dtype=np.uint8), rows))    # FILTER TYPE 0 (NONE) PER ROW
+    header = struct.pack(">IIBBBBB", width, height, 8, colour_type, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + _png_chunk(b"IEND", b""))
+
+
+def write_png(path, image):
+    with open(path, "wb") as f:
+        f.write(encode_png(image))
+
+
+# ----- SINGLE FILES AND BATCHES -----
+
+def load_commands(source):
+    """A PATH TO A COMMAND FILE, OR PACKED COMMANDS FROM sessions.sqlite3"""
+    if isinstance(source, (bytes, memoryview)):
+        return np.frombuffer(source, dtype=session_store.COMMAND_DTYPE)
+    with open(source, "r", encoding="utf-8") as f:
+        return command_array(json.load(f))
+
+
+def render_job(job):
+    """
+    RENDER ONE (NAME, SOURCE, OUTPUT PNG, COMPARE SOURCE OR None, OPTIONS) JOB. RUNS IN A WORKER PROCESS.
+    RETURNS A STATS DICT; A BROKEN INPUT IS REPORTED IN "error" INSTEAD OF STOPPING THE BATCH.
+    """
+    name, source, out_path, compare_source, options = job
+    started = time.perf_counter()
+    try:
+        commands = load_commands(source)
+        image = rasterise(commands, **options)
+        write_png(out_path, image)
+        stats = {"name": name, "commands": len(commands), "ms": 0.0}
+        if compare_source is not None:
+            other = rasterise(load_commands(compare_source), **options)
+            if other.shape != image.shape:
+                stats["changed_px"] = -1          # --fit WINDOWS DIFFER, THE GEOMETRY CERTAINLY CHANGED
+            else:
+                diff, stats["changed_px"] = diff_image(image, other)
+                write_png(os.path.splitext(out_path)[0] + "_diff.png", diff)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        stats = {"name": name, "error": str(e)}
+    stats["ms"] = (time.perf_counter() - started) * 1000.0
+    return stats
+
+
+def file_jobs(inputs, out_dir, compare_dir=None):
+    """ONE JOB PER .json FILE IN inputs (FILES OR FOLDERS)"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += [os.path.join(item, f) for f in sorted(os.listdir(item)) if f.endswith(".json")]
+        else:
+            paths.append(item)
+    for path in paths:
+        name = os.path.basename(path)
+        compare = os.path.join(compare_dir, name) if compare_dir else None
+        if compare is not None and not os.path.exists(compare):
+            compare = None
+        yield name, path, os.path.join(out_dir, os.path.splitext(name)[0] + ".png"), compare
+
+
+def store_jobs(db_path, out_dir, session_id=None):
+    """ONE JOB PER DRAWING ARCHIVED IN sessions.sqlite3, ONE SUB-FOLDER PER SESSION"""
+    store = session_store.SessionStore(db_path)
+    try:
+        rows = store.drawing_blobs(session_id)
+    finally:
+        store.close()
+    for sid, file_name, blob in rows:
+        folder = os.path.join(out_dir, f"session_{sid}")
+        os.makedirs(folder, exist_ok=True)
+        yield f"{sid}/{file_name}", bytes(blob), os.path.join(folder, os.path.splitext(file_name)[0] + ".png"), None
+
+
+def render_batch(jobs, options=None, workers=DEFAULT_WORKERS, chunk_size=CHUNK_SIZE):
+    """RENDER (NAME, SOURCE, OUTPUT, COMPARE) JOBS IN A PROCESS POOL, YIELD EACH STATS DICT AS IT FINISHES (IN ORDER)"""
+    jobs = [(name, source, out, compare, options or {}) for name, source, out, compare in jobs]
+    if workers <= 1 or len(jobs) <= 1:
+        yield from map(render_job, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(render_job, jobs, chunksize=chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RENDER DRAWING COMMAND FILES TO PNG PREVIEWS")
+    parser.add_argument("inputs", nargs="*", help=f"COMMAND FILES OR FOLDERS (DEFAULT {JSON_DIR_PATH})")
+    parser.add_argument("--out-dir", default=PREVIEW_DIR)
+    parser.add_argument("--db", nargs="?", const=session_store.SESSION_STORE_PATH,
+                        help="RENDER THE DRAWINGS ARCHIVED IN THE SESSION DATABASE INSTEAD")
+    parser.add_argument("--session", type=int, help="WITH --db: ONLY THIS SESSION")
+    parser.add_argument("--compare", help="FOLDER WITH THE SAME FILE NAMES, WRITE *_diff.png AND COUNT CHANGED PIXELS")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--scale", type=float, default=PIXELS_PER_UNIT, help="PIXELS PER ARM UNIT")
+    parser.add_argument("--fit", action="store_true", help="CROP TO THE DRAWING INSTEAD OF THE FIXED PAPER WINDOW")
+    parser.add_argument("--travel", action="store_true", help="ALSO DRAW PEN-UP MOVES IN LIGHT GREY")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    if args.db:
+        jobs = list(store_jobs(args.db, args.out_dir, args.session))
+    else:
+        jobs = list(file_jobs(args.inputs or [JSON_DIR_PATH], args.out_dir, args.compare))
+    options = {"pixels_per_unit": args.scale, "fit": args.fit, "show_travel": args.travel}
+
+    started = time.perf_counter()
+    rendered = failed = changed = 0
+    for stats in render_batch(jobs, options, args.workers):
+        if "error" in stats:
+            failed += 1
+            print(f"[RASTER] {stats['name']}: FAILED ({stats['error']})")
+            continue
+        rendered += 1
+        line = f"[RASTER] {stats['name']}: {stats['commands']} COMMANDS, {stats['ms']:.1f} MS"
+        if "changed_px" in stats:
+            changed += stats["changed_px"] != 0
+            line += f", {stats['changed_px']} PIXELS CHANGED" if stats["changed_px"] >= 0 else ", WINDOW CHANGED"
+        print(line)
+    elapsed = time.perf_counter() - started
+    summary = f"[RASTER] {rendered} RENDERED, {failed} FAILED IN {elapsed:.1f}S -> {args.out_dir}"
+    if args.compare:
+        summary += f", {changed} DIFFER FROM {args.compare}"
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+# ========== DUAL-DEVICE DRAWING SCHEDULER ==========
+# THE SERVO ARM AND THE PAPER MOTOR ARE DRIVEN BY TWO INDEPENDENT COROUTINES.
+# WHILE THE PAPER ROLLS, THE NEXT DRAWING IS LOADED/PLANNED AND THE ARM (PEN UP) TRAVELS TO ITS FIRST POINT.
+#
+# SAFETY CONSTRAINTS THAT ARE ENFORCED (AND NOTHING ELSE IS SERIALISED):
+#   1) THE PAPER ONLY ROLLS WHILE THE PEN IS UP (THE LAST COMMAND OF A DRAWING MUST LEAVE updown = 0)
+#   2) THE PEN ONLY GOES DOWN WHILE THE PAPER IS STILL (DRAWING WAITS FOR THE ROLL TO FINISH)
+#   3) EACH DEVICE EXECUTES ONE COMMAND STREAM AT A TIME (ONLY ITS OWN COROUTINE TALKS TO IT)
+#
+# ALL DEVICE I/O IS BLOCKING pyserial CODE, IT RUNS IN WORKER THREADS VIA asyncio.to_thread.
+
+# SECONDS TO WAIT AFTER A ROLL BEFORE THE PEN MAY TOUCH THE PAPER AGAIN (PAPER SETTLING)
+PAPER_SETTLE_DELAY = 0.0
+
+
+class DrawingScheduler:
+    """
+    RUN A LIST OF DRAWINGS ON THE SERVO AND MOTOR DEVICES WITH OVERLAP.
+    THE DEVICE OPERATIONS ARE PASSED IN AS PLAIN (BLOCKING) CALLABLES:
+      load(path)          -> PLANNED DRAWING (LIST OF {"x","y","updown"} POINTS) OR None TO SKIP THE FILE;
+                             AN EMPTY LIST MEANS "ALREADY DRAWN", THE PAPER IS STILL ROLLED
+      draw(points, path)  -> SEND THE POINTS TO THE SERVO ARDUINO, RETURN WHEN THE LAST ONE IS ACKED
+                             (path IS None FOR THE SCHEDULER'S OWN PEN-UP MOVES)
+      roll()              -> ROLL THE PAPER, RETURN WHEN THE MOTOR ARDUINO REPORTS "Done"
+      on_done(path)       -> OPTIONAL, CALLED AFTER A DRAWING AND ITS ROLL HAVE FINISHED
+    """
+
+    def __init__(self, load, draw, roll, on_done=None, settle_delay=PAPER_SETTLE_DELAY):
+        self.load = load
+        self.draw = draw
+        self.roll = roll
+        self.on_done = on_done
+        self.settle_delay = settle_delay
+        self.timings = []
+
+    async def _motor_loop(self, roll_requests, paper_still):
+        """ROLL THE PAPER EVERY TIME THE SERVO LOOP HANDS OVER A FINISHED DRAWING"""
+        while True:
+            path = await roll_requests.get()
+            if path is None:
+                return
+            start = time.monotonic()
+            await asyncio.to_thread(self.roll)
+            if self.settle_delay > 0:
+                await asyncio.sleep(self.settle_delay)
+            print(f"[SCHEDULER] PAPER ROLLED IN {time.monotonic() - start:.2f}S")
+            paper_still.set()
+            if self.on_done:
+                await asyncio.to_thread(self.on_done, path)
+
+    async def _servo_loop(self, paths, roll_requests, paper_still):
+        """DRAW EACH FILE AS SOON AS THE PAPER IS STILL, PRELOADING THE NEXT ONE IN THE BACKGROUND"""
+        next_load = asyncio.create_task(asyncio.to_thread(self.load, paths[0])) if paths else None
+        for i, path in enumerate(paths):
+            person_start = time.monotonic()
+            points = await next_load
+            next_load = None
+            if i + 1 < len(paths):
+                next_load = asyncio.create_task(asyncio.to_thread(self.load, paths[i + 1]))
+            if points is None:
+                print(f"[SCHEDULER] NOTHING TO DRAW IN {path}, SKIPPING")
+                continue
+
+            if points:
+                # PEN-UP TRAVEL TO THE FIRST POINT IS ALLOWED WHILE THE PAPER IS STILL ROLLING
+                first = points[0]
+                await asyncio.to_thread(self.draw, [{"x": first["x"], "y": first["y"], "updown": 0}], None)
+
+            # CONSTRAINT 2: THE PEN MUST NOT TOUCH MOVING PAPER
+            await paper_still.wait()
+            draw_start = time.monotonic()
+
+            if points:
+                await asyncio.to_thread(self.draw, points, path)
+
+                # CONSTRAINT 1: LIFT THE PEN BEFORE THE PAPER MOVES
+                last = points[-1]
+                if last["updown"] != 0:
+                    await asyncio.to_thread(self.draw, [{"x": last["x"], "y": last["y"], "updown": 0}], None)
+
+            paper_still.clear()
+            await roll_requests.put(path)
+
+            self.timings.append({
+                "file": path,
+                "wait_s": round(draw_start - person_start, 3),
+                "draw_s": round(time.monotonic() - draw_start, 3)
+            })
+            print(f"[SCHEDULER] {path} DRAWN IN {time.monotonic() - draw_start:.2f}S")
+
+        await roll_requests.put(None)
+
+    async def run(self, paths):
+        """DRAW ALL paths IN ORDER, RETURN THE TOTAL WALL-CLOCK TIME"""
+        start = time.monotonic()
+        roll_requests = asyncio.Queue()
+        paper_still = asyncio.Event()
+        paper_still.set()
+        await asyncio.gather(
+            self._servo_loop(paths, roll_requests, paper_still),
+            self._motor_loop(roll_requests, paper_still)
+        )
+        total = time.monotonic() - start
+        if self.timings:
+            print(f"[SCHEDULER] {len(self.timings)} DRAWINGS IN {total:.2f}S "
+                  f"({total / len(self.timings):.2f}S PER PERSON)")
+        return total
+
+
+def run_drawings(paths, load, draw, roll, on_done=None, settle_delay=PAPER_SETTLE_DELAY):
+    """BLOCKING ENTRY POINT FOR SCRIPTS"""
+    scheduler = DrawingScheduler(load, draw, roll, on_done, settle_delay)
+    return asyncio.run(scheduler.run(paths))
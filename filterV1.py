@@ -1,5 +1,12 @@
+import argparse
+import itertools
 import json
 import os
+import time
+
+import session_store
+import time_axis
+from record_stream import JsonArrayWriter, iter_records, iter_records_with_offsets, prefix_fingerprint
 
 # DEFINE BASE DIRECTORY (CURRENT SCRIPT DIRECTORY)
 base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -61,14 +68,11 @@ def rdp(points, epsilon):
 # TOLERANCE FOR RDP ALGORITHM
 rdp_epsilon = 1.8
 
-if not os.path.exists(input_path):
-    print(f"INPUT FILE {input_path} DOES NOT EXIST, PLEASE CHECK THE PATH.")
-    exit()
-
-with open(input_path, 'r') as f:
-    data = json.load(f)
+# INCREMENTAL MODE: ONLY FILTER RECORDS APPENDED SINCE THE LAST RUN (ALSO ENABLED WITH --incremental)
+incremental_mode = False
 
-filtered_data = []
+# CHECKPOINT FILE FOR INCREMENTAL MODE, STORED NEXT TO THE OUTPUT FILE
+checkpoint_path = os.path.join(output_directory, "filtered_time_axis_contours.checkpoint.json")
 
 def scale_y_and_translate(points, scale_y, y_offset):
     """SCALE POINTS IN THE Y DIRECTION + TRANSLATE, BUT y_offset IS SET TO 0 HERE"""
@@ -79,70 +83,178 @@ def scale_y_and_translate(points, scale_y, y_offset):
         scaled_points.append({"x": x, "y": y})
     return scaled_points
 
-# ITERATE THROUGH JSON DATA (PROCESSING ONCE WITHOUT GLOBAL OFFSET)
-for item in data:
-    if item["type"] == "contour":
-        categories = item.get("categories", {"head": [], "body": [], "legs": []})
-        processed_categories = {}
+def filter_record(item):
+    """FILTER ONE TOP-LEVEL RECORD (PROCESSING ONCE WITHOUT GLOBAL OFFSET)"""
+    if item["type"] != "contour":
+        # NON-"CONTOUR" DATA IS NOT PROCESSED FURTHER AND IS KEPT AS-IS
+        return item
+
+    categories = item.get("categories", {"head": [], "body": [], "legs": []})
+    processed_categories = {}
 
-        # NO NEED FOR max_y_previous OR global_y_shift, AS GLOBAL Y ALIGNMENT IS REMOVED
-        global_min_y = float('inf')
-        global_max_y = -float('inf')
+    # NO NEED FOR max_y_previous OR global_y_shift, AS GLOBAL Y ALIGNMENT IS REMOVED
+    global_min_y = float('inf')
+    global_max_y = -float('inf')
 
-        for category, points in categories.items():
-            if not points:
-                processed_categories[category] = []
-                continue
+    for category, points in categories.items():
+        if not points:
+            processed_categories[category] = []
+            continue
 
-            if category in scaling_factors:
-                scale_y = scaling_factors[category]["scale_y"]
-                # DO NOT COMPUTE y_offset, SET IT TO 0
-                y_offset = 0
+        if category in scaling_factors:
+            scale_y = scaling_factors[category]["scale_y"]
+            # DO NOT COMPUTE y_offset, SET IT TO 0
+            y_offset = 0
 
-                # SCALE (WITHOUT TRANSLATION) POINT SET
-                processed_points = scale_y_and_translate(points, scale_y, y_offset)
+            # SCALE (WITHOUT TRANSLATION) POINT SET
+            processed_points = scale_y_and_translate(points, scale_y, y_offset)
 
-                # APPLY RDP SIMPLIFICATION TO HEAD, BODY, AND LEGS
-                if category in ["head", "body", "legs"]:
-                    processed_points = rdp(processed_points, rdp_epsilon)
+            # APPLY RDP SIMPLIFICATION TO HEAD, BODY, AND LEGS
+            if category in ["head", "body", "legs"]:
+                processed_points = rdp(processed_points, rdp_epsilon)
 
-                processed_categories[category] = processed_points
+            processed_categories[category] = processed_points
 
-                # UPDATE GLOBAL MIN AND MAX Y VALUES
-                cat_min_y = min(p["y"] for p in processed_points)
-                cat_max_y = max(p["y"] for p in processed_points)
+            # UPDATE GLOBAL MIN AND MAX Y VALUES
+            cat_min_y = min(p["y"] for p in processed_points)
+            cat_max_y = max(p["y"] for p in processed_points)
+            if cat_min_y < global_min_y:
+                global_min_y = cat_min_y
+            if cat_max_y > global_max_y:
+                global_max_y = cat_max_y
+        else:
+            processed_categories[category] = points
+            if points:
+                cat_min_y = min(p["y"] for p in points)
+                cat_max_y = max(p["y"] for p in points)
                 if cat_min_y < global_min_y:
                     global_min_y = cat_min_y
                 if cat_max_y > global_max_y:
                     global_max_y = cat_max_y
-            else:
-                processed_categories[category] = points
-                if points:
-                    cat_min_y = min(p["y"] for p in points)
-                    cat_max_y = max(p["y"] for p in points)
-                    if cat_min_y < global_min_y:
-                        global_min_y = cat_min_y
-                    if cat_max_y > global_max_y:
-                        global_max_y = cat_max_y
-
-        contour_item = {
-            "type": "contour",
-            "categories": processed_categories,
-            "height_info": {
-                "min_y": global_min_y if global_min_y != float('inf') else None,
-                "max_y": global_max_y if global_max_y != -float('inf') else None
-            }
+
+    return {
+        "type": "contour",
+        "categories": processed_categories,
+        "height_info": {
+            "min_y": global_min_y if global_min_y != float('inf') else None,
+            "max_y": global_max_y if global_max_y != -float('inf') else None
         }
+    }
 
-        filtered_data.append(contour_item)
+def load_checkpoint():
+    """READ THE INCREMENTAL CHECKPOINT, RETURN None IF IT IS MISSING OR UNREADABLE"""
+    try:
+        with open(checkpoint_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-    else:
-        # NON-"CONTOUR" DATA IS NOT PROCESSED FURTHER AND IS KEPT AS-IS
-        filtered_data.append(item)
+def save_checkpoint(records, input_offset, input_tail_sha1, output_size, output_offset=None):
+    """WRITE THE CHECKPOINT ATOMICALLY (TEMP FILE + RENAME)"""
+    checkpoint = {
+        "records": records,
+        "input_offset": input_offset,
+        "input_tail_sha1": input_tail_sha1,
+        "output_size": output_size,
+        "output_offset": output_offset
+    }
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def checkpoint_is_valid(checkpoint, input_tail_sha1):
+    """THE CHECKPOINT IS ONLY USABLE IF BOTH THE INPUT PREFIX AND THE OUTPUT FILE ARE UNCHANGED"""
+    if not checkpoint or input_tail_sha1 is None or not os.path.exists(output_path):
+        return False
+    if os.path.getsize(output_path) != checkpoint.get("output_size"):
+        return False
+    return input_tail_sha1 == checkpoint.get("input_tail_sha1")
+
+def input_fingerprint(end_offset):
+    """FINGERPRINT OF THE INPUT PREFIX CONSUMED UP TO end_offset (SEE record_stream.prefix_fingerprint)"""
+    return prefix_fingerprint(input_path, end_offset)
 
-# SECOND GLOBAL OFFSET ADJUSTMENT REMOVED, AS IT IS NO LONGER NEEDED
+def filter_records(records, writer, input_offset):
+    """
+    FILTER (RECORD, END_OFFSET) PAIRS INTO writer AND RETURN THE LAST SETTLED POINT
+    (RECORDS WRITTEN, INPUT OFFSET, OUTPUT OFFSET). A TRAILING line_run IS WRITTEN BUT LEFT OUT OF THE SETTLED POINT,
+    BECAUSE THE CAPTURE LOOP MAY STILL EXTEND IT; THE NEXT INCREMENTAL RUN READS IT AGAIN (SEE time_axis.py)
+    """
+    settled = (writer.count, input_offset, writer.tell())
+    for item, end_offset in records:
+        # A RECORD FOLLOWS, SO EVERYTHING WRITTEN SO FAR IS SETTLED
+        settled = (writer.count, input_offset, writer.tell())
+        writer.write(filter_record(item))
+        input_offset = end_offset
+        if not time_axis.is_provisional(item):
+            settled = (writer.count, input_offset, writer.tell())
+    return settled
 
-# SAVE THE PROCESSED DATA TO A NEW JSON FILE
-with open(output_path, 'w') as f:
-    json.dump(filtered_data, f, indent=4)
+def run_full():
+    """REPROCESS THE WHOLE INPUT FILE AND REWRITE THE OUTPUT (AND THE CHECKPOINT)"""
+    # RECORDS ARE STREAMED FROM THE INPUT AND WRITTEN AS SOON AS THEY ARE FILTERED
+    with JsonArrayWriter(output_path) as writer:
+        records, input_offset, output_offset = filter_records(iter_records_with_offsets(input_path), writer, 0)
     print(f"PROCESSED DATA SAVED TO {output_path}")
+
+    save_checkpoint(records, input_offset, input_fingerprint(input_offset), os.path.getsize(output_path), output_offset)
+
+def run_incremental():
+    """FILTER ONLY THE RECORDS APPENDED SINCE THE LAST CHECKPOINT AND APPEND THEM TO THE OUTPUT"""
+    checkpoint = load_checkpoint()
+    if checkpoint is None:
+        print("NO CHECKPOINT FOUND, RUNNING FULL FILTER.")
+        run_full()
+        return
+
+    input_offset = checkpoint["input_offset"]
+    if not checkpoint_is_valid(checkpoint, input_fingerprint(input_offset)):
+        print("CHECKPOINT DOES NOT MATCH INPUT OR OUTPUT, RUNNING FULL FILTER.")
+        run_full()
+        return
+
+    # WITH NO RECORDS CONSUMED YET THE INPUT IS PARSED FROM ITS OPENING '['
+    start_offset = input_offset if checkpoint["records"] else None
+    new_records = iter_records_with_offsets(input_path, start_offset=start_offset)
+    first = next(new_records, None)
+    if first is None:
+        print(f"NO NEW RECORDS SINCE LAST RUN, {output_path} IS UP TO DATE.")
+        return
+
+    # A line_run LEFT OUT OF THE CHECKPOINT LAST TIME IS DROPPED FROM THE OUTPUT AND WRITTEN AGAIN
+    with JsonArrayWriter(output_path, append_after=checkpoint["records"],
+                         truncate_at=checkpoint.get("output_offset")) as writer:
+        records, input_offset, output_offset = filter_records(
+            itertools.chain([first], new_records), writer, input_offset)
+    print(f"APPENDED {writer.count - checkpoint['records']} RECORDS TO {output_path}")
+
+    save_checkpoint(records, input_offset, input_fingerprint(input_offset), os.path.getsize(output_path), output_offset)
+
+def main():
+    parser = argparse.ArgumentParser(description="FILTER time_axis_contours.json")
+    parser.add_argument("--incremental", action="store_true",
+                        help="ONLY PROCESS RECORDS APPENDED SINCE THE LAST RUN")
+    args = parser.parse_args()
+
+    if not os.path.exists(input_path):
+        print(f"INPUT FILE {input_path} DOES NOT EXIST, PLEASE CHECK THE PATH.")
+        exit()
+
+    started = time.time()
+    if incremental_mode or args.incremental:
+        run_incremental()
+    else:
+        run_full()
+
+    # KEEP THE FILTERED RECORDS OF THE CURRENT SESSION IN THE SESSION DATABASE
+    store = session_store.open_store()
+    if store:
+        session_id = store.session_for_file(input_path)
+        store.write_records(session_id, session_store.STAGE_FILTERED, iter_records(output_path))
+        store.register_file(session_id, output_path)
+        store.add_timing(session_id, "filter", time.time() - started, started)
+        store.close()
+
+if __name__ == "__main__":
+    main()
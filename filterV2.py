@@ -1,6 +1,10 @@
 import json
 import math
 import os
+import time
+
+import session_store
+from record_stream import iter_records
 
 # ========== INPUT OUTPUT CONFIGURATION ==========
 # DEFINE BASE DIRECTORY (CURRENT SCRIPT DIRECTORY)
@@ -189,6 +193,7 @@ def process_one_person(full_contour_points, facial_feature_lines, nose_line, per
     """
     PROCESS THE CONTOUR & FACIAL FEATURE LINES FOR A SINGLE PERSON, AND OUTPUT TO A JSON FILE.
     dist_range = (max_y - min_y) IS USED TO DETERMINE PEN DEPTH (1/2/3).
+    RETURNS (OUTPUT PATH, COMMANDS WRITTEN).
     """
     # === 1) APPLY RDP TO full_contour (POSSIBLY ONE OR MULTIPLE LINES) ===
     simplified_full = [rdp(line, rdp_epsilon) for line in full_contour_points]
@@ -208,7 +213,7 @@ def process_one_person(full_contour_points, facial_feature_lines, nose_line, per
         output_path = f"{output_prefix}{person_index}.json"
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump([], f, ensure_ascii=False, indent=2)
-        return
+        return output_path, []
 
     # === 2) ROTATE -90° ===
     rotated_lines = []
@@ -329,13 +334,16 @@ def process_one_person(full_contour_points, facial_feature_lines, nose_line, per
     output_path = f"{output_prefix}{person_index}.json"
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(final_points, f, ensure_ascii=False, indent=2)
+    return output_path, final_points
 
 def main():
-    with open(input_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # RECORDS ARE STREAMED ONE BY ONE, EACH PERSON IS WRITTEN AS SOON AS BOTH PARTS HAVE BEEN READ
+    # A PERSON IS NUMBERED BY ITS "contour" RECORD, LIKE THE PERSONS OF THE SESSION DATABASE
+    shapes = session_store.iter_persons(iter_records(input_path))
 
-    shapes = data
-    person_index = 1
+    # EVERY DRAWING IS ALSO KEPT IN THE SESSION DATABASE (send_to_arduino.py DELETES THE FILES ONCE DRAWN)
+    store = session_store.open_store()
+    session_id = store.session_for_file(input_path) if store else None
 
     # RECORD DATA FOR THE CURRENT PERSON
     dist_range_for_person = 0.0
@@ -347,7 +355,7 @@ def main():
     got_face = False
 
     # ITERATE THROUGH JSON: FIND "contour" => height_info, "full_contour" => FULL BODY POINTS, "facial_features" => FACIAL FEATURES
-    for shape in shapes:
+    for person_index, shape in shapes:
         shape_type = shape.get("type")
 
         if shape_type == "contour":
@@ -419,14 +427,17 @@ def main():
 
         # ONCE BOTH full_contour AND facial_features ARE READY => OUTPUT
         if got_full and got_face:
-            process_one_person(
+            started = time.time()
+            output_path, commands = process_one_person(
                 current_full_contour_lines,
                 current_facial_feature_lines,
                 nose_final_line,
                 person_index,
                 dist_range_for_person
             )
-            person_index += 1
+            if store:
+                store.put_drawing(session_id, os.path.basename(output_path), commands, person_index)
+                store.add_timing(session_id, "convert", time.time() - started, started, person_index)
 
             # RESET
             dist_range_for_person = 0.0
@@ -436,6 +447,8 @@ def main():
             got_full = False
             got_face = False
 
+    if store:
+        store.close()
     print("[MAIN] ALL DONE. JSON FILES SAVED IN:", output_prefix)
 
 if __name__ == "__main__":
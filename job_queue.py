@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+# ========== RESUMABLE DRAWING JOB QUEUE ==========
+# ONE JOB PER converted_output_N.json. THE QUEUE REMEMBERS HOW MANY POINTS OF EACH FILE THE SERVO ARDUINO HAS
+# ACKNOWLEDGED AND WHETHER THE PAPER HAS BEEN ROLLED, SO AFTER A CRASH send_to_arduino.py CONTINUES WHERE IT
+# STOPPED. A FILE IS ONLY DELETED ONCE IT IS FULLY DRAWN AND ROLLED.
+# THE STATE IS A SMALL JSON FILE NEXT TO THE DRAWINGS, REWRITTEN ATOMICALLY ON EVERY UPDATE.
+# drawing_scheduler.py UPDATES THE QUEUE FROM SEVERAL WORKER THREADS (ACKS OF THE NEXT FILE WHILE THE PREVIOUS ONE
+# IS COMPLETED), SO EVERY MUTATION AND SAVE HOLDS self.lock.
+
+STATE_FILE_NAME = ".drawing_queue.state"  # NOT *.json, SO IT IS NEVER MISTAKEN FOR A DRAWING
+
+STATUS_PENDING = "pending"
+STATUS_DRAWN = "drawn"
+
+
+def file_digest(path):
+    """CONTENT HASH, SO A NEW SESSION THAT REUSES A FILE NAME IS NOT MISTAKEN FOR A HALF-DRAWN OLD ONE"""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class JobQueue:
+    def __init__(self, directory, state_name=STATE_FILE_NAME):
+        self.directory = directory
+        self.state_path = os.path.join(directory, state_name)
+        self.jobs = {}
+        self.lock = threading.RLock()
+        self._load()
+
+    # ----- PERSISTENCE -----
+
+    def _load(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.jobs = json.load(f).get("jobs", {})
+        except (OSError, ValueError):
+            self.jobs = {}
+
+    def _save(self):
+        """CALLER HOLDS self.lock. A UNIQUE TEMP FILE PER SAVE, SO A CONCURRENT SAVE CANNOT REPLACE A TORN ONE"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=STATE_FILE_NAME, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"jobs": self.jobs}, f, indent=2)
+            os.replace(tmp_path, self.state_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    # ----- QUEUE MANAGEMENT -----
+
+    def sync(self, file_names):
+        """
+        REGISTER NEW FILES, RESET JOBS WHOSE FILE CONTENT CHANGED AND FORGET JOBS WHOSE FILE IS GONE.
+        RETURNS THE FILES STILL TO BE PROCESSED, IN THE GIVEN ORDER.
+        """
+        present = set(file_names)
+        with self.lock:
+            for name in list(self.jobs):
+                if name not in present:
+                    del self.jobs[name]
+            for name in file_names:
+                digest = file_digest(os.path.join(self.directory, name))
+                job = self.jobs.get(name)
+                if job is None or job.get("sha1") != digest:
+                    self.jobs[name] = {"sha1": digest, "acked": 0, "status": STATUS_PENDING}
+                elif job["acked"] > 0 or job["status"] != STATUS_PENDING:
+                    print(f"[QUEUE] RESUMING {name}: {job['acked']} POINTS ALREADY DRAWN, "
+                          f"STATUS {job['status'].upper()}")
+            self._save()
+            return [name for name in file_names if name in self.jobs]
+
+    def job(self, name):
+        with self.lock:
+            job = self.jobs.get(name)
+            return dict(job) if job is not None else None
+
+    def record_ack(self, name, acked):
+        """PERSIST THE NUMBER OF POINTS OF name THAT THE ARDUINO HAS ACKNOWLEDGED"""
+        with self.lock:
+            job = self.jobs.get(name)
+            if job is None or acked <= job["acked"]:
+                return
+            job["acked"] = acked
+            self._save()
+
+    def mark_drawn(self, name):
+        with self.lock:
+            job = self.jobs.get(name)
+            if job is not None:
+                job["status"] = STATUS_DRAWN
+                self._save()
+
+    def complete(self, name):
+        """DRAWN AND ROLLED: DELETE THE FILE AND FORGET THE JOB"""
+        path = os.path.join(self.directory, name)
+        try:
+            os.remove(path)
+            print(f"[QUEUE] FILE DELETED: {path}")
+        except OSError as e:
+            print(f"[ERROR] FAIL TO DELETE FILE: {path}, ERROR: {e}")
+        with self.lock:
+            self.jobs.pop(name, None)
+            self._save()
+
+
+def resume_points(points, acked):
+    """
+    POINTS STILL TO SEND AFTER acked POINTS WERE DRAWN, AND THE NUMBER OF LEADING POINTS THAT ARE REPLAYS.
+    THE ARDUINO RESETS (PEN UP, ARM HOME) WHEN THE PORT IS REOPENED, SO THE LAST ACKNOWLEDGED POINT IS
+    REPLAYED FIRST: THE ARM TRAVELS THERE WITH THE PEN UP AND RESTORES ITS PEN DEPTH BEFORE CONTINUING.
+    """
+    if acked <= 0:
+        return list(points), 0
+    if acked >= len(points):
+        return [], 0
+    return [points[acked - 1]] + list(points[acked:]), 1
@@ -5,7 +5,11 @@ import json
 import os
 import time
 import requests
-import serial
+
+import capture_workers
+import serial_manager
+import session_store
+import time_axis
 
 # -------------------------------
 # BASE DIRECTORY SETUP (RECOMMENDED TO USE RELATIVE PATHS)
@@ -23,9 +27,14 @@ frame_interval = 1
 capture_interval = 5  # THIS IS KEPT BUT AUTO CAPTURE IS NO LONGER USED
 
 # -------------------------------
-# INITIALIZE MEDIAPIPE MODULES
-mp_selfie_segmentation = mp.solutions.selfie_segmentation.SelfieSegmentation(model_selection=1)
-mp_face_mesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1)
+# MULTI-PROCESS CAPTURE: SEGMENTATION AND FACE MESH RUN IN TWO WORKER PROCESSES ON SHARED-MEMORY FRAMES
+# (SEE capture_workers.py). SET TO False TO RUN BOTH MODELS ONE AFTER THE OTHER IN THIS PROCESS
+PARALLEL_CAPTURE = True
+
+# MOTION GATE: SKIP SEGMENTATION / FACE MESH WHILE THE SCENE IS STATIC AND REUSE THE PREVIOUS MASK
+# MOTION_THRESHOLD IS THE MEAN GRAY LEVEL DIFFERENCE (0..255) OF A 32x18 THUMBNAIL THAT COUNTS AS MOTION
+MOTION_GATE = True
+MOTION_THRESHOLD = 3.0
 
 # IMPORT OFFICIAL CONNECTION CONSTANTS
 from mediapipe.python.solutions.face_mesh_connections import (
@@ -46,11 +55,6 @@ FACEMESH_INNER_LIPS = frozenset([
 ])
 inner_lips_indices = set([pt for connection in FACEMESH_INNER_LIPS for pt in connection])
 
-# -------------------------------
-# INITIALIZE TIME AXIS AND CONTOUR DATA
-time_axis_data = []
-current_x_position = 0
-
 def classify_points(points, frame_height):
     categories = {
         "head": [],
@@ -75,143 +79,248 @@ stream_url = "http://192.168.5.1:81/stream"  # USERS CAN MODIFY THE DEVICE STREA
 # URL FOR SETTING RESOLUTION, MODIFY DEVICE IP OR PARAMETERS IF NEEDED
 framesize_val = 11
 control_url = f"http://192.168.5.1/control?var=framesize&val={framesize_val}"
-try:
-    response = requests.get(control_url)
-    if response.status_code == 200:
-        print("RESOLUTION SET TO HD(1280x720) SUCCESSFULLY!")
-    else:
-        print(f"FAILED TO SET RESOLUTION, HTTP STATUS CODE: {response.status_code}")
-except Exception as e:
-    print(f"EXCEPTION OCCURRED WHILE SETTING RESOLUTION: {e}")
-
-time.sleep(1)
-
-cap = cv2.VideoCapture(stream_url)
-if not cap.isOpened():
-    print("UNABLE TO OPEN VIDEO STREAM")
-    exit()
-
-print("INITIALIZING THE STREAM, PLEASE WAIT...")
-time.sleep(2)
-print("RECOGNITION STARTED, PLEASE STAY STABLE...")
-
-last_capture_time = time.time()
-last_update_time = time.time()
 
 json_path = os.path.join(output_directory, "time_axis_contours.json")
 
 # -------------------------------
 # OPEN ARDUINO SERIAL PORT & AUTO SEND "C"
 # MODIFY THE SERIAL PORT ACCORDING TO YOUR DEVICE (E.G., "COM3" FOR WINDOWS OR "/DEV/TTYUSB0" FOR LINUX)
-try:
-    ser = serial.Serial("COM3", 9600, timeout=0.5)  # USERS SHOULD MODIFY THE SERIAL PORT ACCORDING TO THEIR SETUP
-    time.sleep(2)
-    print("[PYTHON] SERIAL PORT OPENED, WAITING FOR ARDUINO COMMUNICATION...")
-
-    ser.write(b"C\n")
-    print("[PYTHON] SENT 'C' COMMAND TO ARDUINO TO TRIGGER MOTOR C PROCESS")
-
-except Exception as e:
-    print(f"UNABLE TO OPEN SERIAL PORT: {e}")
-    ser = None
-
-# -------------------------------
-# MAIN LOOP
-try:
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("UNABLE TO READ THE VIDEO STREAM")
-            break
-
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        segmentation_results = mp_selfie_segmentation.process(rgb_frame)
-        face_results = mp_face_mesh.process(rgb_frame)
-
-        # SEGMENTATION MASK
-        mask = segmentation_results.segmentation_mask > 0.5
-        mask_8bit = (mask * 255).astype(np.uint8)
-
-        # DISPLAY SEGMENTATION MASK AND REAL-TIME FRAME
-        cv2.imshow("Segmentation Mask", mask_8bit)
-        cv2.imshow("Real-Time Frame", frame)
-
-        current_time = time.time()
-
-        # KEEP "HORIZONTAL MOVEMENT LINE" LOGIC
-        if current_time - last_update_time >= frame_interval:
-            current_x_position += horizontal_speed
-            time_axis_data.append({"type": "line", "x": current_x_position, "y": 0})
-            last_update_time = current_time
-
-        # ========== SERIAL INTERACTION: C_STEP / Done ==========
-        if ser and ser.in_waiting > 0:
-            line = ser.readline().decode('utf-8').strip()
+# THE PORT IS SHARED THROUGH serial_manager, SO send_to_arduino.py REUSES IT WHEN THE STAGES RUN IN ONE PROCESS
+MOTOR_SERIAL_PORT = "COM3"  # USERS SHOULD MODIFY THE SERIAL PORT ACCORDING TO THEIR SETUP
+# THE PORT IS NOT REOPENED (AND THE BOARD NOT RESET) BETWEEN STAGES ANY MORE: IF THE CAPTURE STOPS BEFORE "Done",
+# motor.ino IS STILL INSIDE ITS "C" SEQUENCE. IT IS ANSWERED WITH "CONTINUE" UNTIL IT FINISHES (AND TURNS MOTOR C
+# BACK), FOR AT MOST THIS MANY SECONDS, THEN THE PORT IS RESET
+C_SEQUENCE_RELEASE_TIMEOUT = 60.0
+
+
+def release_motor(ser, awaiting_continue):
+    """LET motor.ino FINISH AN INTERRUPTED "C" SEQUENCE SO IT ACCEPTS THE NEXT STAGE'S "AB" COMMAND"""
+    print("[PYTHON] CAPTURE ENDED BEFORE 'Done', RELEASING THE MOTOR ARDUINO...")
+    try:
+        if awaiting_continue:
+            ser.write(b"CONTINUE\n")
+        deadline = time.time() + C_SEQUENCE_RELEASE_TIMEOUT
+        while time.time() < deadline:
+            line = ser.readline().decode('utf-8', errors='replace').strip()
             if line == "C_STEP":
-                print("[PYTHON] RECEIVED 'C_STEP' FROM ARDUINO -> WAITING 1.5 SECONDS FOR FOCUS")
-                time.sleep(1.5)
-
-                print("[PYTHON] STARTING CAPTURE + PROCESSING...")
-                output_image = frame.copy()
-
-                # HUMAN CONTOUR DETECTION
-                contours, _ = cv2.findContours(mask_8bit, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                if contours:
-                    largest_contour = max(contours, key=cv2.contourArea)
-                    if cv2.contourArea(largest_contour) > 500:
-                        scaled_contour = [
-                            {
-                                "x": float(pt[0][0]) * pixel_to_mm + current_x_position,
-                                "y": float(pt[0][1]) * pixel_to_mm
-                            }
-                            for pt in largest_contour
-                        ]
-                        cats = classify_points(scaled_contour, frame.shape[0])
-                        time_axis_data.append({
-                            "type": "contour",
-                            "categories": cats
-                        })
-                        time_axis_data.append({
-                            "type": "full_contour",
-                            "points": scaled_contour
-                        })
-                        cv2.drawContours(output_image, [largest_contour], -1, (0, 255, 0), 2)
-                        print(f"HUMAN CONTOUR CAPTURED, {len(scaled_contour)} POINTS")
-
-                # SAVE IMAGE
-                image_path = os.path.join(output_directory, f"frame_{int(time.time())}.png")
-                cv2.imwrite(image_path, output_image)
-                print(f"ANNOTATED IMAGE SAVED: {image_path}")
-
-                # SAVE JSON DATA
-                with open(json_path, 'w') as f:
-                    json.dump(time_axis_data, f, indent=4)
-                    print(f"DATA SAVED TO {json_path}")
-
-                # DELAY 1 SECOND THEN SEND CONTINUE SIGNAL
-                time.sleep(1.0)
                 ser.write(b"CONTINUE\n")
-                print("[PYTHON] SENT 'CONTINUE', ARDUINO CAN PROCEED TO NEXT ROTATION")
-
             elif line == "Done":
-                print("[PYTHON] RECEIVED 'Done' FROM ARDUINO, MOTOR C ACTION COMPLETED, EXITING.")
-                break
+                print("[PYTHON] MOTOR C SEQUENCE FINISHED")
+                return
+        print("[PYTHON] NO 'Done' FROM THE MOTOR ARDUINO, RESETTING IT")
+        ser.reset()
+    except Exception as e:
+        print(f"[PYTHON] UNABLE TO RELEASE THE MOTOR ARDUINO: {e}")
+
+
+def main():
+    # -------------------------------
+    # INITIALIZE TIME AXIS AND CONTOUR DATA
+    # THE TIME AXIS IS STORED AS line_run RECORDS (ONE PER STRETCH BETWEEN CAPTURES, SEE time_axis.py)
+    time_axis_data = []
+    current_x_position = 0
+
+    try:
+        response = requests.get(control_url)
+        if response.status_code == 200:
+            print("RESOLUTION SET TO HD(1280x720) SUCCESSFULLY!")
+        else:
+            print(f"FAILED TO SET RESOLUTION, HTTP STATUS CODE: {response.status_code}")
+    except Exception as e:
+        print(f"EXCEPTION OCCURRED WHILE SETTING RESOLUTION: {e}")
 
-        # USERS CAN EXIT BY PRESSING 'Q'
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            print("PROGRAM EXITED BY USER")
-            break
+    time.sleep(1)
 
-except KeyboardInterrupt:
-    print("PROGRAM INTERRUPTED BY USER")
+    cap = cv2.VideoCapture(stream_url)
+    if not cap.isOpened():
+        print("UNABLE TO OPEN VIDEO STREAM")
+        exit()
 
-finally:
-    if cap.isOpened():
-        cap.release()
-    cv2.destroyAllWindows()
+    print("INITIALIZING THE STREAM, PLEASE WAIT...")
+    time.sleep(2)
+    print("RECOGNITION STARTED, PLEASE STAY STABLE...")
+
+    last_update_time = time.time()
+    session_start = last_update_time
+
+    # EVERY CAPTURE IS ALSO KEPT IN THE SESSION DATABASE (time_axis_contours.json IS OVERWRITTEN BY THE NEXT SESSION)
+    store = session_store.open_store()
+    session_id = store.begin_session(json_path, session_start) if store else None
+
+    persons_captured = 0
+    c_done = False                # motor.ino REPORTED THE END OF THE "C" SEQUENCE
+    awaiting_continue = False     # motor.ino SENT "C_STEP" AND WAITS FOR "CONTINUE"
+    try:
+        ser = serial_manager.get_serial(MOTOR_SERIAL_PORT, 9600, timeout=0.5)
+        print("[PYTHON] SERIAL PORT OPENED, WAITING FOR ARDUINO COMMUNICATION...")
+
+        ser.write(b"C\n")
+        print("[PYTHON] SENT 'C' COMMAND TO ARDUINO TO TRIGGER MOTOR C PROCESS")
+
+    except Exception as e:
+        print(f"UNABLE TO OPEN SERIAL PORT: {e}")
+        ser = None
+
+    # -------------------------------
+    # INITIALIZE MEDIAPIPE MODULES (IN PARALLEL MODE THEY LIVE IN THE WORKER PROCESSES)
+    capture = None
+    gate = capture_workers.MotionGate(MOTION_THRESHOLD if MOTION_GATE else -1.0)   # NEGATIVE THRESHOLD = EVERY FRAME IS PROCESSED
+    mask_8bit = None
+    mask_frame = None             # PARALLEL MODE: THE FRAME mask_8bit WAS COMPUTED FROM
+    if not PARALLEL_CAPTURE:
+        mp_selfie_segmentation = mp.solutions.selfie_segmentation.SelfieSegmentation(model_selection=1)
+
+    # -------------------------------
+    # MAIN LOOP
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                print("UNABLE TO READ THE VIDEO STREAM")
+                break
 
-    if ser:
-        ser.close()
-        print("[PYTHON] SERIAL PORT CLOSED")
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if PARALLEL_CAPTURE:
+                # PUBLISH THE FRAME TO BOTH WORKERS, THEN CONTINUE WITH THE NEWEST FRAME WHOSE RESULTS ARE ALL BACK
+                # (FRAME AND MASK ALWAYS BELONG TOGETHER, THEY ARE JOINED BY FRAME ID). WHILE NO NEW RESULT IS BACK
+                # THE LAST COLLECTED FRAME IS USED AGAIN, NEVER THE NEW FRAME WITH AN OLDER MASK
+                # A STATIC FRAME IS NOT SUBMITTED, THE LAST MASK STAYS VALID FOR IT
+                if capture is None:
+                    capture = capture_workers.ParallelCapture(rgb_frame.shape).start()
+                if not gate.is_static(rgb_frame) and capture.submit(rgb_frame, payload=frame) is not None:
+                    gate.processed()
+                results = [r for r in capture.collect() if r.mask is not None]
+                if results:
+                    mask_frame = results[-1].payload
+                    mask_8bit = results[-1].mask
+                elif mask_8bit is None:
+                    continue
+                frame = mask_frame
+            elif not gate.is_static(rgb_frame):
+                segmentation_results = mp_selfie_segmentation.process(rgb_frame)
+                gate.processed()
+
+                # SEGMENTATION MASK
+                mask = segmentation_results.segmentation_mask > 0.5
+                mask_8bit = (mask * 255).astype(np.uint8)
+
+            # DISPLAY SEGMENTATION MASK AND REAL-TIME FRAME
+            cv2.imshow("Segmentation Mask", mask_8bit)
+            cv2.imshow("Real-Time Frame", frame)
+
+            current_time = time.time()
+
+            # KEEP "HORIZONTAL MOVEMENT LINE" LOGIC (ONE TICK PER frame_interval, EXTENDS THE CURRENT line_run)
+            if current_time - last_update_time >= frame_interval:
+                current_x_position += horizontal_speed
+                time_axis.append_tick(time_axis_data, current_time - session_start, current_x_position, frame_interval)
+                last_update_time = current_time
+
+            # ========== SERIAL INTERACTION: C_STEP / Done ==========
+            if ser and ser.in_waiting > 0:
+                line = ser.readline().decode('utf-8').strip()
+                if line == "C_STEP":
+                    awaiting_continue = True
+                    print("[PYTHON] RECEIVED 'C_STEP' FROM ARDUINO -> WAITING 1.5 SECONDS FOR FOCUS")
+                    time.sleep(1.5)
+
+                    print("[PYTHON] STARTING CAPTURE + PROCESSING...")
+                    capture_started = time.time()
+                    captured_person = None
+                    output_image = frame.copy()
+
+                    # HUMAN CONTOUR DETECTION
+                    contours, _ = cv2.findContours(mask_8bit, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                    if contours:
+                        largest_contour = max(contours, key=cv2.contourArea)
+                        if cv2.contourArea(largest_contour) > 500:
+                            scaled_contour = [
+                                {
+                                    "x": float(pt[0][0]) * pixel_to_mm + current_x_position,
+                                    "y": float(pt[0][1]) * pixel_to_mm
+                                }
+                                for pt in largest_contour
+                            ]
+                            cats = classify_points(scaled_contour, frame.shape[0])
+                            time_axis_data.append({
+                                "type": "contour",
+                                "categories": cats
+                            })
+                            persons_captured += 1
+                            captured_person = persons_captured
+                            time_axis_data.append({
+                                "type": "full_contour",
+                                "points": scaled_contour
+                            })
+                            cv2.drawContours(output_image, [largest_contour], -1, (0, 255, 0), 2)
+                            print(f"HUMAN CONTOUR CAPTURED, {len(scaled_contour)} POINTS")
+
+                    # SAVE IMAGE
+                    image_path = os.path.join(output_directory, f"frame_{int(time.time())}.png")
+                    cv2.imwrite(image_path, output_image)
+                    print(f"ANNOTATED IMAGE SAVED: {image_path}")
+
+                    # SAVE JSON DATA
+                    with open(json_path, 'w') as f:
+                        json.dump(time_axis_data, f, indent=4)
+                        print(f"DATA SAVED TO {json_path}")
+                    if store:
+                        # filterV1.py FINDS THIS SESSION BY THE CONTENT OF THE FILE
+                        store.register_file(session_id, json_path)
+                    capture_seconds = time.time() - capture_started
+
+                    # DELAY 1 SECOND THEN SEND CONTINUE SIGNAL
+                    time.sleep(1.0)
+                    ser.write(b"CONTINUE\n")
+                    awaiting_continue = False
+                    print("[PYTHON] SENT 'CONTINUE', ARDUINO CAN PROCEED TO NEXT ROTATION")
+
+                    if store:
+                        store.add_timing(session_id, "capture", capture_seconds, capture_started,
+                                         person_index=captured_person, detail=image_path)
+
+                elif line == "Done":
+                    c_done = True
+                    print("[PYTHON] RECEIVED 'Done' FROM ARDUINO, MOTOR C ACTION COMPLETED, EXITING.")
+                    break
+
+            # USERS CAN EXIT BY PRESSING 'Q'
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                print("PROGRAM EXITED BY USER")
+                break
 
-    print("CAMERA (STREAM) RESOURCES RELEASED")
+    except KeyboardInterrupt:
+        print("PROGRAM INTERRUPTED BY USER")
+
+    except serial_manager.SerialReconnected as e:
+        # THE BOARD WAS RESET BY THE RECONNECT, ITS "C" SEQUENCE IS GONE: END THE CAPTURE, NOTHING LEFT TO RELEASE
+        print(f"[PYTHON] MOTOR ARDUINO CONNECTION LOST, CAPTURE ENDED: {e}")
+        c_done = True
+
+    finally:
+        if cap.isOpened():
+            cap.release()
+        cv2.destroyAllWindows()
+
+        if capture is not None:
+            capture.stop()
+        gate.report()
+        if ser:
+            if not c_done:
+                release_motor(ser, awaiting_continue)
+            # THE PORT STAYS OPEN FOR THE NEXT STAGE, serial_manager CLOSES IT WHEN THE PROCESS EXITS
+            print("[PYTHON] SERIAL PORT RELEASED")
+
+        # THE WHOLE SESSION IS WRITTEN ONCE HERE (NOT ON EVERY C_STEP, WHICH WOULD REWRITE IT EVERY TIME)
+        if store:
+            try:
+                store.write_records(session_id, session_store.STAGE_RAW, time_axis_data)
+            except Exception as e:
+                print(f"[STORE] UNABLE TO SAVE THE RAW RECORDS: {e}")
+            store.close()
+
+        print("CAMERA (STREAM) RESOURCES RELEASED")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import subprocess
 import os
+import runpy
 import sys
+import traceback
 
 python_path = sys.executable
 
@@ -9,29 +11,58 @@ base_dir = os.path.dirname(os.path.abspath(__file__))
 liner_to_rhino_script = os.path.join(base_dir, "liner_to_rhino.py")
 filter_script = os.path.join(base_dir, "filterV1.py")
 print_filter_script = os.path.join(base_dir, "filterV2.py")
+optimise_script = os.path.join(base_dir, "command_optimizer.py")
 send_to_web_script = os.path.join(base_dir, "send_to_web.py")
 process_to_arduino = os.path.join(base_dir, "send_to_arduino.py")
 
+# RUN ALL STAGES IN THIS PROCESS SO THEY SHARE SERIAL PORTS THROUGH serial_manager
+# (THE MOTOR ARDUINO IS THEN ONLY OPENED, AND RESET, ONCE). SET TO False TO RUN EACH STAGE AS A SUBPROCESS
+RUN_IN_PROCESS = True
+
+def run_stage(script_path):
+    """RUN ONE STAGE SCRIPT, RAISE subprocess.CalledProcessError IF IT FAILS"""
+    if not RUN_IN_PROCESS:
+        subprocess.run([python_path, script_path], check=True)
+        return
+
+    saved_argv = sys.argv
+    sys.argv = [script_path]
+    try:
+        runpy.run_path(script_path, run_name="__main__")
+    except SystemExit as e:
+        # exit() / exit(0) INSIDE A STAGE ENDS THAT STAGE ONLY, LIKE IT DID AS A SUBPROCESS
+        if e.code not in (None, 0):
+            raise subprocess.CalledProcessError(e.code if isinstance(e.code, int) else 1, script_path)
+    except Exception:
+        traceback.print_exc()
+        raise subprocess.CalledProcessError(1, script_path)
+    finally:
+        sys.argv = saved_argv
+
 try:
 
     print("run liner_to_rhino.py...")
-    subprocess.run([python_path, liner_to_rhino_script], check=True)
+    run_stage(liner_to_rhino_script)
 
 
     print("run filterV1.py...")
-    subprocess.run([python_path, filter_script], check=True)
+    run_stage(filter_script)
 
 
     print("run filterV2.py...")
-    subprocess.run([python_path, print_filter_script], check=True)
+    run_stage(print_filter_script)
+
+
+    print("run command_optimizer.py...")
+    run_stage(optimise_script)
 
 
     # print("run send_to_web.py...")
-    # subprocess.run([python_path, send_to_web_script], check=True)
+    # run_stage(send_to_web_script)
 
 
     print("run send_to_arduino.py...")
-    subprocess.run([python_path, process_to_arduino], check=True)
+    run_stage(process_to_arduino)
 
     print("all scripts being processed")
 
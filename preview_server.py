@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import filterV1
+import send_to_web
+import time_axis
+from record_stream import iter_records_with_offsets, prefix_fingerprint
+
+# ========== LIVE GEOMETRY PREVIEW SERVER ==========
+# WATCHES THE SESSION FILE WHILE liner_to_rhino.py IS STILL CAPTURING, PARSES ONLY THE RECORDS THAT WERE
+# APPENDED SINCE THE LAST POLL (BYTE OFFSET + FINGERPRINT OF THE CONSUMED PREFIX, LIKE filterV1 --incremental)
+# AND PUSHES THE GEOMETRY OF THE NEW PERSONS TO ALL CONNECTED VIEWERS AS SERVER-SENT EVENTS.
+#
+#   GET /             MINIMAL 2D PREVIEW PAGE
+#   GET /events       SSE STREAM: "delta" EVENTS (AND "reset" WHEN THE FILE WAS REWRITTEN), RESUMES VIA Last-Event-ID
+#   GET /deltas?since=N   THE SAME EVENTS AS ONE JSON LIST, FOR POLLING CLIENTS
+#
+# DELTAS CONTAIN UN-BENT (UNROLLED) POSITIONS; THE CYLINDER BEND DEPENDS ON THE WHOLE SESSION'S X RANGE,
+# SO EACH DELTA CARRIES THE CURRENT "bend" PARAMETERS AND THE VIEWER APPLIES
+#   theta = (x - min_x) / (max_x - min_x) * 2 * PI,  X = radius * cos(theta),  Z = -radius * sin(theta)
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+# True: WATCH THE RAW CAPTURE (input/time_axis_contours.json) AND APPLY filterV1.filter_record TO EVERY NEW RECORD
+# False: WATCH THE FILTERED FILE WRITTEN BY filterV1.py
+WATCH_RAW_CAPTURE = True
+WATCH_PATH = filterV1.input_path if WATCH_RAW_CAPTURE else filterV1.output_path
+
+POLL_INTERVAL = 1.0             # SECONDS BETWEEN TWO CHECKS OF THE WATCHED FILE
+HEARTBEAT_INTERVAL = 15.0       # SSE COMMENT LINE TO KEEP IDLE CONNECTIONS OPEN
+PREVIEW_SCALING_FACTOR = 1.75   # send_to_web.py PICKS A RANDOM VALUE IN [1.5, 2.0], THE PREVIEW USES THE MIDDLE
+POSITION_DECIMALS = 2
+
+
+class GeometryFeed:
+    """
+    INCREMENTAL PARSER + EVENT LOG. poll() CONSUMES NEW RECORDS, events_since() SERVES THE VIEWERS.
+    ALL STATE IS GUARDED BY self.cond, WHICH IS ALSO NOTIFIED WHEN A NEW EVENT ARRIVES.
+    """
+
+    def __init__(self, path=WATCH_PATH, apply_filter=WATCH_RAW_CAPTURE):
+        self.path = path
+        self.apply_filter = apply_filter
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.events = []            # (SEQ, EVENT NAME, JSON PAYLOAD)
+        self._reset()
+
+    def _reset(self):
+        self.offset = None          # BYTE OFFSET AFTER THE LAST CONSUMED RECORD
+        self.tail = None            # FINGERPRINT OF THE BYTES BEFORE self.offset
+        self.records = 0
+        self.parse_state = send_to_web.new_parse_state()
+        self.min_x = self.max_x = None
+        self.last_stat = None
+
+    def _publish(self, name, payload):
+        """CALLER HOLDS self.cond"""
+        self.seq += 1
+        payload["seq"] = self.seq
+        self.events.append((self.seq, name, json.dumps(payload, separators=(",", ":"))))
+        self.cond.notify_all()
+
+    def _prefix_changed(self, size):
+        if self.offset is None:
+            return False
+        return size < self.offset or prefix_fingerprint(self.path, self.offset) != self.tail
+
+    def poll(self):
+        """READ THE RECORDS APPENDED SINCE THE LAST CALL AND PUBLISH THEIR GEOMETRY. RETURNS THE NUMBER OF NEW RECORDS"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return 0
+        stat_key = (st.st_size, st.st_mtime_ns)
+        if stat_key == self.last_stat:
+            return 0
+
+        with self.cond:
+            if self._prefix_changed(st.st_size):
+                print("[PREVIEW] SESSION FILE WAS REWRITTEN, STARTING OVER")
+                self._reset()
+                self.events = []
+                self._publish("reset", {})
+
+            new_records = []
+            offset = self.offset
+            try:
+                # A TRAILING line_run CAN STILL GROW, IT IS ONLY CONSUMED ONCE ANOTHER RECORD FOLLOWS IT
+                for item, end in time_axis.iter_settled(iter_records_with_offsets(self.path, self.offset)):
+                    new_records.append(item)
+                    offset = end
+            except ValueError:
+                # THE WRITER IS IN THE MIDDLE OF A RECORD (OR THE FILE IS STILL EMPTY), THE REST IS READ NEXT TIME
+                pass
+            else:
+                self.last_stat = stat_key
+
+            if not new_records:
+                return 0
+            first = self.records
+            self.records += len(new_records)
+            self.offset = offset
+            self.tail = prefix_fingerprint(self.path, offset)
+            self._publish("delta", self._build_delta(new_records, first))
+            return len(new_records)
+
+    def _build_delta(self, items, first_record):
+        """GEOMETRY OF items ONLY (WORK PROPORTIONAL TO THE NEW DATA)"""
+        polylines = []
+        for item in items:
+            if self.apply_filter:
+                item = filterV1.filter_record(item)
+            polylines.extend(send_to_web.parse_record(
+                item, self.parse_state, send_to_web.X_OFFSET_INCREMENT, send_to_web.MAX_LENGTH))
+
+        strip_mask = None
+        if send_to_web.MERGE_SEGMENTS and polylines:
+            polylines, strip_mask, _ = send_to_web.weld_segments(polylines, send_to_web.WELD_TOLERANCE)
+        points, offsets = send_to_web.pack_polylines(polylines)
+        vertices, indices = send_to_web.build_buffergeometry(
+            points, offsets, send_to_web.DIVISION_LENGTH, flip_z=False, strip_mask=strip_mask)
+
+        if len(vertices):
+            lo, hi = float(vertices[:, 0].min()), float(vertices[:, 0].max())
+            self.min_x = lo if self.min_x is None else min(self.min_x, lo)
+            self.max_x = hi if self.max_x is None else max(self.max_x, hi)
+        min_diff = send_to_web.min_height_diff(self.parse_state)
+        return {
+            "records": [first_record, first_record + len(items)],
+            "positions": vertices[:, :2].round(POSITION_DECIMALS).ravel().tolist(),   # z IS 0 BEFORE BENDING
+            "indices": indices.tolist(),
+            "bend": {
+                "min_x": self.min_x,
+                "max_x": self.max_x,
+                "radius": PREVIEW_SCALING_FACTOR * (500.0 - min_diff)
+            }
+        }
+
+    def events_since(self, last_seq):
+        """CALLER HOLDS self.cond. A CLIENT OLDER THAN THE LAST RESET GETS THE WHOLE CURRENT LOG"""
+        if self.events and last_seq < self.events[0][0] - 1:
+            return list(self.events)
+        return [e for e in self.events if e[0] > last_seq]
+
+    def watch(self, stop):
+        while not stop.is_set():
+            try:
+                count = self.poll()
+                if count:
+                    print(f"[PREVIEW] {count} NEW RECORDS ({self.records} IN TOTAL)")
+            except Exception as e:
+                print(f"[PREVIEW] ERROR WHILE READING {self.path}: {e}")
+            stop.wait(POLL_INTERVAL)
+
+
+PREVIEW_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>shododesk live preview</title>
+<style>body{margin:0;background:#111;color:#ccc;font:12px monospace}canvas{display:block}</style></head>
+<body><div id="info">connecting...</div><canvas id="c"></canvas><script>
+const canvas = document.getElementById("c"), ctx = canvas.getContext("2d"), info = document.getElementById("info");
+let chunks = [], minX = 0, maxX = 1;
+function draw() {
+  canvas.width = innerWidth; canvas.height = innerHeight - 20;
+  const scale = canvas.width / Math.max(1, maxX - minX);
+  ctx.strokeStyle = "#eee"; ctx.lineWidth = 1; ctx.beginPath();
+  for (const d of chunks) for (let i = 0; i < d.indices.length; i += 2) {
+    const a = d.indices[i] * 2, b = d.indices[i + 1] * 2;
+    ctx.moveTo((d.positions[a] - minX) * scale, d.positions[a + 1] * scale);
+    ctx.lineTo((d.positions[b] - minX) * scale, d.positions[b + 1] * scale);
+  }
+  ctx.stroke();
+}
+const source = new EventSource("/events");
+source.addEventListener("reset", () => { chunks = []; draw(); });
+source.addEventListener("delta", (e) => {
+  const d = JSON.parse(e.data); chunks.push(d);
+  if (d.bend.min_x !== null) { minX = d.bend.min_x; maxX = d.bend.max_x; }
+  info.textContent = "records: " + d.records[1] + ", bend radius: " + d.bend.radius.toFixed(1);
+  draw();
+});
+addEventListener("resize", draw);
+</script></body></html>
+"""
+
+
+class PreviewHandler(BaseHTTPRequestHandler):
+    feed = None   # SET BY serve()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/":
+            self._send(200, "text/html; charset=utf-8", PREVIEW_PAGE.encode("utf-8"))
+        elif url.path == "/deltas":
+            since = int(parse_qs(url.query).get("since", ["0"])[0])
+            with self.feed.cond:
+                events = self.feed.events_since(since)
+            body = "[" + ",".join(f'{{"event":"{name}","data":{data}}}' for _, name, data in events) + "]"
+            self._send(200, "application/json", body.encode("utf-8"))
+        elif url.path == "/events":
+            self._stream_events()
+        else:
+            self._send(404, "text/plain", b"not found")
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "keep-alive")
+        self.end_headers()
+        last_seq = int(self.headers.get("Last-Event-ID") or 0)
+        feed = self.feed
+        try:
+            while True:
+                with feed.cond:
+                    events = feed.events_since(last_seq)
+                    if not events:
+                        feed.cond.wait(HEARTBEAT_INTERVAL)
+                        events = feed.events_since(last_seq)
+                if not events:
+                    self.wfile.write(b": heartbeat\n\n")
+                for seq, name, data in events:
+                    self.wfile.write(f"id: {seq}\nevent: {name}\ndata: {data}\n\n".encode("utf-8"))
+                    last_seq = seq
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def serve(host=HOST, port=PORT, path=WATCH_PATH, apply_filter=WATCH_RAW_CAPTURE):
+    feed = GeometryFeed(path, apply_filter)
+    stop = threading.Event()
+    watcher = threading.Thread(target=feed.watch, args=(stop,), daemon=True)
+    watcher.start()
+    PreviewHandler.feed = feed
+    server = ThreadingHTTPServer((host, port), PreviewHandler)
+    server.daemon_threads = True
+    print(f"[PREVIEW] WATCHING {path}")
+    print(f"[PREVIEW] OPEN http://{host}:{port}/ IN A BROWSER")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[PREVIEW] STOPPED")
+    finally:
+        stop.set()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve()
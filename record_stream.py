@@ -0,0 +1,182 @@
+import codecs
+import hashlib
+import json
+import os
+
+# ========== STREAMING READ / WRITE OF TOP-LEVEL JSON ARRAYS ==========
+# THE SESSION FILES (time_axis_contours.json, filtered_time_axis_contours.json) ARE ONE BIG JSON ARRAY.
+# THESE HELPERS READ AND WRITE THEM ONE RECORD AT A TIME, SO A STAGE ONLY HOLDS THE CURRENT RECORD IN MEMORY.
+
+# NUMBER OF BYTES READ FROM DISK PER CHUNK
+CHUNK_SIZE = 64 * 1024
+# NUMBER OF BYTES BEFORE A READ OFFSET THAT prefix_fingerprint() HASHES
+PREFIX_TAIL_BYTES = 256
+
+_WHITESPACE = " \t\r\n"
+
+
+def iter_records_with_offsets(path, start_offset=None, chunk_size=CHUNK_SIZE):
+    """
+    YIELD (RECORD, END_OFFSET) FOR EVERY ELEMENT OF THE TOP-LEVEL JSON ARRAY IN path.
+    END_OFFSET IS THE BYTE OFFSET RIGHT AFTER THE RECORD, SO IT CAN BE USED AS start_offset LATER.
+    IF start_offset IS GIVEN, READING STARTS THERE (AFTER '[' OR AFTER A PREVIOUS RECORD) INSTEAD OF AT THE '['.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    with open(path, "rb") as f:
+        if start_offset is not None:
+            f.seek(start_offset)
+        byte_offset = start_offset or 0
+        buf = ""
+        pos = 0
+        eof = False
+        in_array = start_offset is not None
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                buf = buf[pos:] + utf8.decode(b"", final=True)
+            else:
+                buf = buf[pos:] + utf8.decode(chunk)
+            pos = 0
+
+        while True:
+            # SKIP WHITESPACE, COMMAS AND THE OPENING BRACKET
+            while True:
+                while pos < len(buf) and (buf[pos] in _WHITESPACE or (in_array and buf[pos] == ",")):
+                    byte_offset += 1
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                fill()
+
+            if pos >= len(buf):
+                if not in_array:
+                    raise ValueError(f"{path} IS EMPTY, EXPECTED A JSON ARRAY")
+                return
+            if not in_array:
+                if buf[pos] != "[":
+                    raise ValueError(f"{path} DOES NOT CONTAIN A TOP-LEVEL JSON ARRAY")
+                in_array = True
+                byte_offset += 1
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+
+            # DECODE ONE RECORD, READING MORE DATA UNTIL IT IS COMPLETE
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    fill()
+                    continue
+                if end == len(buf) and not eof:
+                    # A BARE NUMBER MAY CONTINUE IN THE NEXT CHUNK
+                    fill()
+                    continue
+                break
+
+            byte_offset += len(buf[pos:end].encode("utf-8"))
+            pos = end
+            yield item, byte_offset
+
+
+def iter_records(path, start_offset=None, chunk_size=CHUNK_SIZE):
+    """YIELD THE ELEMENTS OF THE TOP-LEVEL JSON ARRAY IN path ONE BY ONE"""
+    for item, _ in iter_records_with_offsets(path, start_offset, chunk_size):
+        yield item
+
+
+def format_record(item, indent=4):
+    """
+    SERIALIZE ONE RECORD EXACTLY AS json.dump(list, indent=indent) WOULD INSIDE THE TOP-LEVEL ARRAY
+    """
+    pad = " " * indent
+    return "\n".join(pad + line for line in json.dumps(item, indent=indent).split("\n"))
+
+
+def prefix_fingerprint(path, end_offset, tail_bytes=PREFIX_TAIL_BYTES):
+    """
+    SHA-1 OF THE tail_bytes BYTES JUST BEFORE end_offset. AN INCREMENTAL READER (filterV1 --incremental,
+    preview_server.py, send_to_web.BendCache) KEEPS IT WITH ITS OFFSET: IF IT DIFFERS ON THE NEXT READ, THE FILE
+    WAS REWRITTEN (A NEW SESSION) AND THE READER STARTS OVER. None IF THE FILE IS SHORTER THAN end_offset.
+    """
+    start = max(0, end_offset - tail_bytes)
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end_offset - start)
+    if len(data) != end_offset - start:
+        return None
+    return hashlib.sha1(data).hexdigest()
+
+
+class JsonArrayWriter:
+    """
+    WRITE A TOP-LEVEL JSON ARRAY RECORD BY RECORD.
+    THE RESULT IS BYTE-IDENTICAL TO json.dump(records, f, indent=indent) WITH '\\n' LINE ENDINGS.
+    """
+
+    def __init__(self, path, indent=4, append_after=None, truncate_at=None):
+        """
+        append_after=None CREATES A NEW FILE.
+        append_after=N CONTINUES AN EXISTING FILE THAT WAS WRITTEN WITH N RECORDS.
+        truncate_at=OFFSET (WITH append_after) DROPS EVERYTHING FROM OFFSET ON FIRST, E.G. RECORDS WRITTEN AFTER
+        THE N-TH ONE; OFFSET IS A VALUE RETURNED BY tell() RIGHT AFTER THE N-TH RECORD WAS WRITTEN.
+        """
+        self.path = path
+        self.indent = indent
+        if append_after is None:
+            self.count = 0
+            self.f = open(path, "wb")
+        else:
+            self.count = append_after
+            self.f = open(path, "r+b")
+            if append_after == 0:
+                # FILE IS "[]"
+                self.f.truncate(0)
+            elif truncate_at is not None:
+                self.f.truncate(truncate_at)
+            else:
+                # DROP THE CLOSING "\n]"
+                self.f.seek(-2, os.SEEK_END)
+                self.f.truncate()
+            self.f.seek(0, os.SEEK_END)
+
+    def write(self, item):
+        prefix = "[\n" if self.count == 0 else ",\n"
+        self.f.write((prefix + format_record(item, self.indent)).encode("utf-8"))
+        self.count += 1
+
+    def tell(self):
+        """BYTE OFFSET RIGHT AFTER THE LAST WRITTEN RECORD (BEFORE THE CLOSING "\n]")"""
+        return self.f.tell()
+
+    def close(self):
+        if self.f is None:
+            return
+        self.f.write(b"\n]" if self.count else b"[]")
+        self.f.close()
+        self.f = None
+
+    def abort(self):
+        """CLOSE WITHOUT THE CLOSING "\n]": A FAILED WRITE MUST NOT LOOK LIKE A COMPLETE (BUT TRUNCATED) ARRAY"""
+        if self.f is None:
+            return
+        self.f.close()
+        self.f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
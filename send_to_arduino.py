@@ -3,6 +3,14 @@ import time
 import json
 import os
 import math
+from collections import deque
+
+import drawing_scheduler
+import job_queue
+import serial_manager
+import servo_protocol
+import session_store
+import telemetry
 
 # ========== CONFIGURATION SECTION, MODIFY AS NEEDED ==========
 # (1) SERVO ARDUINO SERIAL PORT (DRAWING)
@@ -18,37 +26,146 @@ MOTOR_BAUD_RATE   = 9600    # USERS SHOULD MODIFY ACCORDING TO ACTUAL SETUP
 base_dir = os.path.dirname(os.path.abspath(__file__))
 JSON_DIR_PATH = os.path.join(base_dir, "arduino_input")  # MODIFY THIS PATH IF NECESSARY
 
+# (4) SERVO FLOW CONTROL
+# arm_final.ino PRINTS "N" AFTER EACH COMMAND HAS BEEN EXECUTED, THE NEXT COMMAND IS SENT AS SOON AS IT ARRIVES
+SERVO_ACK = "N"
+SERVO_NACKS = ("JSON parse error", servo_protocol.BATCH_ERROR)
+SERVO_ACK_TIMEOUT = 30.0    # SECONDS TO WAIT FOR ONE ACK BEFORE GIVING UP (ONE FIRMWARE LOOP INCLUDES ~4S OF LED BLINKING)
+SERVO_MAX_RETRIES = 2       # RESEND A COMMAND THIS MANY TIMES WHEN THE ARDUINO REPORTS A PARSE ERROR
+# OPTIONAL SLIDING WINDOW: SEND UP TO N COMMANDS AHEAD OF THE LAST ACK, AS LONG AS THE UNACKNOWLEDGED
+# BYTES FIT INTO THE ARDUINO'S SERIAL RECEIVE BUFFER (64 BYTES ON AVR BOARDS). 1 = STRICT STOP-AND-WAIT
+SERVO_MAX_IN_FLIGHT = 1
+SERVO_RX_BUFFER_BYTES = 64
+# "auto" PROBES THE FIRMWARE AND USES BATCHED FRAMES IF SUPPORTED, "json" FORCES THE ORIGINAL ONE-POINT PROTOCOL
+SERVO_PROTOCOL = "auto"
+
+# (5) TIME TO WAIT AFTER OPENING A PORT, THE ARDUINO RESETS WHEN THE PORT IS OPENED
+ARDUINO_RESET_DELAY = 2.0
+# MAX SECONDS FROM "AB 4" TO "Done" (motor.ino NEEDS 4S + 2S), AFTER THAT THE ROLL COUNTS AS FAILED
+MOTOR_ROLL_TIMEOUT = 20.0
+
+# (6) FILES ARE TRACKED IN job_queue.py: AFTER A CRASH THE NEXT RUN RESUMES FROM THE LAST ACKNOWLEDGED POINT,
+#     AND A FILE IS ONLY DELETED AFTER IT HAS BEEN FULLY DRAWN AND THE PAPER ROLLED
+
+# (7) OVERLAP PAPER ROLLING WITH LOADING THE NEXT DRAWING AND MOVING THE ARM (SEE drawing_scheduler.py)
+# SET TO False FOR THE ORIGINAL STRICTLY SEQUENTIAL DRAW -> WAIT 3S -> ROLL LOOP
+USE_SCHEDULER = True
+
+# (8) TELEMETRY: BYTES ON THE LINK, ACK ROUND TRIPS, TIME PER FILE AND PER ROLL (SEE telemetry.py)
+# PRINT ONLY EVERY N-TH COMMAND / ARDUINO REPLY: 1 = EVERYTHING (ORIGINAL BEHAVIOUR), 0 = NOTHING
+VERBOSE_SAMPLE_EVERY = 1
+TELEMETRY_REPORT_PATH = os.path.join(base_dir, "telemetry_report.json")
+
+stats = telemetry.SerialTelemetry(SERVO_BAUD_RATE, log_every=VERBOSE_SAMPLE_EVERY)
+
+class ServoCommandRejected(Exception):
+    """THE ARDUINO KEPT REPORTING A PARSE ERROR FOR A COMMAND, THE DRAWING CANNOT CONTINUE PAST IT"""
+
 def open_serial(port, baud_rate):
     """
-    OPEN SERIAL PORT HELPER FUNCTION
+    OPEN SERIAL PORT HELPER FUNCTION.
+    THE PORT IS SHARED THROUGH serial_manager, SO IT IS ONLY OPENED (AND THE ARDUINO ONLY RESET) ONCE PER PROCESS.
     """
     try:
-        print(f"[INFO] CONNECTING TO PORT {port} (BAUD_RATE {baud_rate})...")
-        ard = serial.Serial(port, baud_rate, timeout=1)
-        time.sleep(2)  # WAIT FOR ARDUINO INITIALIZATION
+        ard = serial_manager.get_serial(port, baud_rate, timeout=1, reset_delay=ARDUINO_RESET_DELAY)
         print(f"[INFO] SUCCESSFULLY CONNECTED TO {port}")
         return ard
     except serial.SerialException as e:
         print(f"[ERROR] UNABLE TO CONNECT {port}: {e}")
         exit(1)
 
+def wait_for_servo_reply(servo_arduino, timeout=SERVO_ACK_TIMEOUT):
+    """
+    READ LINES UNTIL THE ARDUINO ACKS ("N") OR REPORTS A PARSE ERROR.
+    DEBUG LINES (E.G. "[DEBUG] penupdown called") ARE PRINTED AND SKIPPED.
+    RETURNS THE ACK/NACK LINE, RAISES TimeoutError IF NOTHING ARRIVES IN TIME.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = servo_arduino.readline()
+        stats.line_received(len(response))
+        resp_decoded = response.decode(errors='ignore').strip()
+        if not resp_decoded:
+            continue
+        if resp_decoded == SERVO_ACK or resp_decoded in SERVO_NACKS:
+            return resp_decoded
+        stats.log(f"[SERVO] ARDUINO DEBUG: {resp_decoded}", kind="debug")
+    raise TimeoutError(f"NO ACK FROM SERVO ARDUINO WITHIN {timeout}S")
+
 def send_command_to_servo(servo_arduino, x, y, updown):
     """
     SEND JSON + 'R' FORMAT COMMAND TO THE SERVO SYSTEM ARDUINO.
-    USE READLINE() TO READ A COMPLETE LINE RESPONSE.
+    BLOCK UNTIL THE ARDUINO ACKNOWLEDGES THAT THE MOVE IS DONE.
+    """
+    send_points_to_servo(servo_arduino, [{"x": x, "y": y, "updown": updown}], max_in_flight=1)
+
+def select_servo_protocol(servo_arduino):
+    """RETURN (PROTOCOL, MAX_POINTS_PER_FRAME) ACCORDING TO SERVO_PROTOCOL, NEGOTIATING WITH THE FIRMWARE IN "auto" MODE"""
+    if SERVO_PROTOCOL == "auto":
+        protocol, max_points = servo_protocol.negotiate_protocol(servo_arduino)
+    elif SERVO_PROTOCOL == servo_protocol.PROTOCOL_BATCH:
+        protocol, max_points = servo_protocol.PROTOCOL_BATCH, servo_protocol.DEFAULT_MAX_POINTS
+    else:
+        protocol, max_points = servo_protocol.PROTOCOL_JSON, 1
+    print(f"[SERVO] USING {protocol.upper()} PROTOCOL ({max_points} POINTS PER COMMAND)")
+    return protocol, max_points
+
+def send_points_to_servo(servo_arduino, points, max_in_flight=SERVO_MAX_IN_FLIGHT,
+                         rx_buffer_bytes=SERVO_RX_BUFFER_BYTES,
+                         protocol=servo_protocol.PROTOCOL_JSON, max_points=1, on_progress=None):
+    """
+    SEND A LIST OF {"x", "y", "updown"} POINTS WITH ACK-DRIVEN FLOW CONTROL.
+    WITH protocol="batch" SEVERAL POINTS ARE PACKED INTO ONE FRAME AND ACKED TOGETHER.
+    on_progress(N) IS CALLED AFTER EVERY ACK WITH THE NUMBER OF POINTS ACKNOWLEDGED SO FAR.
+    A NEW COMMAND IS WRITTEN WHENEVER FEWER THAN max_in_flight COMMANDS ARE UNACKNOWLEDGED
+    AND THEIR BYTES STILL FIT INTO THE ARDUINO RECEIVE BUFFER.
+    A PARSE ERROR IS RETRIED IN STOP-AND-WAIT MODE. WHEN THE RETRIES RUN OUT, OR ANY COMMAND OF A WINDOW IS
+    REJECTED (RESENDING IT WOULD REORDER THE STROKE), THE JOB IS ABORTED: on_progress NEVER COUNTS A REJECTED
+    COMMAND, SO THE QUEUE RESUMES THE NEXT RUN FROM THE REJECTED POINT.
     """
+    commands = servo_protocol.encode_commands(points, protocol, max_points, rx_buffer_bytes)
+    points_per_command = [servo_protocol.points_in_command(cmd) for cmd in commands]
+    points_acked = 0
+    in_flight = deque()  # (INDEX, BYTES, SEND TIME) OF UNACKNOWLEDGED COMMANDS
+    in_flight_bytes = 0
+    next_index = 0
+    retries = 0
+
     try:
-        data = {"x": x, "y": y, "updown": updown}
-        cmd_str = json.dumps(data) + "R"
-        print(f"[SERVO] COMMAND: {cmd_str}")
-        servo_arduino.write(cmd_str.encode())
+        while next_index < len(commands) or in_flight:
+            # FILL THE WINDOW
+            while next_index < len(commands) and len(in_flight) < max_in_flight:
+                cmd_bytes = commands[next_index].encode()
+                if in_flight and in_flight_bytes + len(cmd_bytes) > rx_buffer_bytes:
+                    break
+                stats.log(f"[SERVO] COMMAND: {commands[next_index]}", kind="command")
+                servo_arduino.write(cmd_bytes)
+                sent_at = stats.command_sent(len(cmd_bytes))
+                in_flight.append((next_index, len(cmd_bytes), sent_at))
+                in_flight_bytes += len(cmd_bytes)
+                next_index += 1
 
-        # USE READLINE() TO READ ARDUINO RESPONSE
-        response = servo_arduino.readline()
-        resp_decoded = response.decode(errors='ignore').strip()
-        print(f"[SERVO] ARDUINO RETURN: {resp_decoded}")
+            # WAIT FOR THE OLDEST COMMAND TO COMPLETE
+            reply = wait_for_servo_reply(servo_arduino)
+            index, size, sent_at = in_flight.popleft()
+            in_flight_bytes -= size
+            stats.ack_received(sent_at, ok=reply == SERVO_ACK)
+            stats.log(f"[SERVO] ARDUINO RETURN: {reply}", kind="reply")
 
-    except serial.SerialException as e:
+            if reply in SERVO_NACKS:
+                if max_in_flight == 1 and retries < SERVO_MAX_RETRIES:
+                    retries += 1
+                    print(f"[SERVO] RESENDING COMMAND {index} (RETRY {retries})")
+                    next_index = index
+                    continue
+                raise ServoCommandRejected(f"ARDUINO COULD NOT PARSE COMMAND {index}: {commands[index]}")
+            retries = 0
+
+            points_acked += points_per_command[index]
+            if on_progress:
+                on_progress(points_acked)
+
+    except (serial.SerialException, TimeoutError, ServoCommandRejected) as e:
         print(f"[ERROR] FAIL TO SEND DATA - {e}")
         servo_arduino.close()
         exit(1)
@@ -58,76 +175,126 @@ def roll_paper_with_motor():
     FIXEDLY ROTATE MOTORS A, B, D FOR 3 SECONDS (PAPER ROLLING, NO CALCULATION OF ROLLING TIME)
     """
     print(f"[MOTOR] WE WILL ROTATE MOTORS A, B, D FOR 3S USING 'AB 3'.")
-    # OPEN MOTOR PORT
+    # REUSE THE MOTOR PORT (ONLY THE FIRST ROLL OPENS IT)
     motor_arduino = open_serial(MOTOR_SERIAL_PORT, MOTOR_BAUD_RATE)
     ab_cmd = "AB 4\n"  # FIXED ROTATION FOR 4 SECONDS
-    motor_arduino.write(ab_cmd.encode('utf-8'))
-    print(f"[MOTOR] COMMAND SENT: {ab_cmd.strip()}")
+    start = time.monotonic()
+
+    # HOLD THE PORT UNTIL "Done" SO NO OTHER CALLER CAN INTERLEAVE COMMANDS
+    with motor_arduino.transaction():
+        # DROP STALE "C_STEP" / "Done" LINES FROM THE CAPTURE STAGE, THEY MUST NOT BE TAKEN FOR THIS ROLL'S "Done"
+        motor_arduino.reset_input_buffer()
+        motor_arduino.write(ab_cmd.encode('utf-8'))
+        print(f"[MOTOR] COMMAND SENT: {ab_cmd.strip()}")
+
+        deadline = start + MOTOR_ROLL_TIMEOUT
+        finished = False
+        while not finished:
+            if time.monotonic() > deadline:
+                # THE JOB STAYS IN THE QUEUE, THE NEXT RUN ONLY ROLLS THE PAPER FOR IT
+                raise TimeoutError(f"NO 'Done' FROM THE MOTOR ARDUINO WITHIN {MOTOR_ROLL_TIMEOUT:.0f}S")
+            line = motor_arduino.readline().decode('utf-8').strip()
+            if line:
+                print(f"[MOTOR] ARDUINO RETURN: {line}")
+                if line == "Done":
+                    finished = True
 
-    finished = False
-    while not finished:
-        line = motor_arduino.readline().decode('utf-8').strip()
-        if line:
-            print(f"[MOTOR] ARDUINO RETURN: {line}")
-            if line == "Done":
-                finished = True
+    stats.roll_finished(time.monotonic() - start)
+    print("[MOTOR] DONE ROLLING, PORT KEPT OPEN FOR THE NEXT DRAWING.")
 
-    motor_arduino.close()
-    print("[MOTOR] DONE ROLLING, CLOSING PORT NOW.")
+def load_drawing(file_path):
+    """READ ONE converted_output_N.json, RETURN ITS POINTS OR None IF THE FILE CANNOT BE USED"""
+    print(f"[MAIN] READING FILE: {file_path}")
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"[ERROR] CANNOT FIND FILE {file_path}")
+    except json.JSONDecodeError:
+        print(f"[ERROR] JSON FILE FORMAT WRONG: {file_path}")
+    return None
 
 def main():
     # OPEN SERVO ARDUINO SERIAL PORT
     servo_arduino = open_serial(SERVO_SERIAL_PORT, SERVO_BAUD_RATE)
+    protocol, max_points = select_servo_protocol(servo_arduino)
 
-    # GET ALL .JSON FILES
+    # GET ALL .JSON FILES AND RESTORE THE PROGRESS OF AN INTERRUPTED RUN
     json_files = [f for f in os.listdir(JSON_DIR_PATH) if f.endswith(".json")]
     json_files.sort()
+    queue = job_queue.JobQueue(JSON_DIR_PATH)
+    json_files = queue.sync(json_files)
+    replayed = {}  # FILE NAME -> NUMBER OF ALREADY ACKNOWLEDGED POINTS BEFORE THE RESUMED STREAM
+    store = session_store.open_store()
+    session_ids = {}  # FILE NAME -> SESSION OF THE DRAWING IN THE STORE (NONE FOR E.G. A REPRINT)
+
+    def load(file_path):
+        name = os.path.basename(file_path)
+        drawing_data = load_drawing(file_path)
+        job = queue.job(name)
+        if drawing_data is None or job is None:
+            return None
+        session_ids[name] = store.drawing_session(name, drawing_data) if store else None
+        if job["status"] == job_queue.STATUS_DRAWN:
+            print(f"[MAIN] {name} WAS ALREADY DRAWN, ONLY ROLLING THE PAPER")
+            return []
+        remaining, replays = job_queue.resume_points(drawing_data, job["acked"])
+        replayed[name] = job["acked"] - replays
+        return remaining
+
+    def draw(points, file_path=None):
+        # SEND POINTS TO SERVO ARDUINO, EACH ONE IS RELEASED BY THE PREVIOUS ACK
+        if file_path is None:
+            send_points_to_servo(servo_arduino, points, protocol=protocol, max_points=max_points)
+            return
+        name = os.path.basename(file_path)
+        stats.file_started(name)
+        started = time.time()
+        send_points_to_servo(
+            servo_arduino, points, protocol=protocol, max_points=max_points,
+            on_progress=lambda n: queue.record_ack(name, replayed[name] + n)
+        )
+        queue.mark_drawn(name)
+        stats.file_finished(name, len(points))
+        session_id = session_ids.get(name)
+        if session_id is not None and store.mark_drawn(session_id, name):
+            store.add_timing(session_id, "draw", time.time() - started, started, detail=name)
+
+    def done(file_path):
+        queue.complete(os.path.basename(file_path))
 
     try:
-        for json_file in json_files:
-            file_path = os.path.join(JSON_DIR_PATH, json_file)
-            print(f"[MAIN] READING FILE: {file_path}")
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    drawing_data = json.load(f)
-            except FileNotFoundError:
-                print(f"[ERROR] CANNOT FIND FILE {file_path}")
-                continue
-            except json.JSONDecodeError:
-                print(f"[ERROR] JSON FILE FORMAT WRONG: {file_path}")
-                continue
-
-            # SEND POINTS TO SERVO ARDUINO ONE BY ONE
-            for point in drawing_data:
-                x = point["x"]
-                y = point["y"]
-                up = point["updown"]
-                send_command_to_servo(servo_arduino, x, y, up)
-                time.sleep(2)  # OPTIONAL DELAY
-
-            print("[MAIN] DONE HANDLING FILE, WAITING FOR 3S...")
-            time.sleep(3)
-
-            # *** PAPER ROLLING ACTION: FIXED ROTATION FOR 3 SECONDS ***
-            print("[MAIN] ROLLING PAPER FOR 3 SECONDS.")
-            roll_paper_with_motor()
+        paths = [os.path.join(JSON_DIR_PATH, jf) for jf in json_files]
+        if USE_SCHEDULER:
+            drawing_scheduler.run_drawings(paths, load=load, draw=draw, roll=roll_paper_with_motor, on_done=done)
+        else:
+            for file_path in paths:
+                drawing_data = load(file_path)
+                if drawing_data is None:
+                    continue
+
+                if drawing_data:
+                    draw(drawing_data, file_path)
+
+                print("[MAIN] DONE HANDLING FILE, WAITING FOR 3S...")
+                time.sleep(3)
+
+                # *** PAPER ROLLING ACTION: FIXED ROTATION FOR 3 SECONDS ***
+                print("[MAIN] ROLLING PAPER FOR 3 SECONDS.")
+                roll_paper_with_motor()
+                done(file_path)
 
         print("[MAIN] ALL JSON FILES COMPLETED")
 
     finally:
-        # CLOSE SERVO SERIAL PORT
-        print("[MAIN] CLOSING SERVO PORT...")
-        servo_arduino.close()
-        print("[MAIN] SERVO PORT CLOSED.")
-
-        # DELETE ALL .JSON FILES
-        for jf in json_files:
-            jfpath = os.path.join(JSON_DIR_PATH, jf)
-            try:
-                os.remove(jfpath)
-                print(f"[MAIN] FILE DELETED: {jfpath}")
-            except OSError as e:
-                print(f"[ERROR] FAIL TO DELETE FILE: {jfpath}, ERROR: {e}")
+        # CLOSE ALL SHARED SERIAL PORTS (SERVO AND MOTOR)
+        # UNFINISHED FILES ARE KEPT, THE NEXT RUN RESUMES THEM FROM THE QUEUE STATE
+        print("[MAIN] CLOSING SERIAL PORTS...")
+        serial_manager.close_all()
+        print("[MAIN] SERIAL PORTS CLOSED.")
+        stats.write_report(TELEMETRY_REPORT_PATH)
+        if store:
+            store.close()
 
 if __name__ == "__main__":
     main()
@@ -3,8 +3,23 @@ import json
 import math
 import os
 import random
-import shutil
+import struct
 import datetime
+import gzip
+import io
+import time
+
+import numpy as np
+
+import session_store
+import time_axis
+from record_stream import iter_records, iter_records_with_offsets, prefix_fingerprint
+from upload_store import UploadStore
+
+try:
+    import brotli  # 可选：pip install brotli，没有安装时只生成 .gz
+except ImportError:
+    brotli = None
 
 # ========== 配置部分 ==========
 
@@ -15,6 +30,7 @@ INPUT_JSON_PATH = r"C:\Users\romal\Documents\MArc-Tokyo\Studio\2.0_coding\input\
 ARDUINO_OUTPUT_FOLDER = r"C:\Users\romal\Documents\MArc-Tokyo\Studio\5.0_arduino_input"
 
 # 3) 网站端 uploads 目录，在此下创建时间戳文件夹
+#    文件内容只在 uploads/.objects 中按哈希存一份，时间戳文件夹里是指向它的链接 (见 upload_store.py)
 WEB_UPLOADS_FOLDER = r"C:\Users\romal\PycharmProjects\obj_api\uploads"
 
 # 4) 弯曲时的一些参数
@@ -30,12 +46,160 @@ FLIP_Z_IN_EXPORT = True        # 导出时是否对 Z 坐标做 -Z
 # 6) 输出主文件名 (给"viewer"用)
 VIEWER_OUTPUT_NAME = "bent_reconstructed.json"
 
+# 7) 导出格式："json" = three.js BufferGeometry JSON (旧版 viewer 读取)，
+#    "glb" = 二进制 glTF 2.0 (同名 .glb，体积小、加载快)。只保留 "glb" 可以省掉最慢的 JSON 序列化
+#    "qbin" = 量化二进制 (int16 坐标 + 每轴 scale/offset，索引差分编码)，见 write_quantised
+EXPORT_FORMATS = ("json", "glb", "qbin")
+
+# 7b) 量化允许的最大坐标误差，超过时 qbin 退回 float32 坐标
+QUANTISE_MAX_ERROR = 0.05
+
+# 7c) 预压缩：每个导出文件旁边再写 .gz / .br (brotli 需要安装 brotli 包)，web 服务器可直接按 Accept-Encoding 返回
+PRECOMPRESS = ("gz", "br")
+
+# 8) 细节层级 (LOD)：除了 DIVISION_LENGTH 的精细版本，再导出若干粗糙版本 + 清单文件，
+#    viewer 可以先加载最粗的，再逐级替换。粗糙版本直接从精细采样中每隔 N 个点取一个，
+#    所以这里的长度必须是 DIVISION_LENGTH 的整数倍。设为 () 则只导出精细版本
+LOD_DIVISION_LENGTHS = (64.0, 32.0, 16.0)   # 由粗到细
+LOD_MANIFEST_NAME = "bent_reconstructed.lods.json"
+
+# 9) 焊接：面部连线/下颌线/鼻子生成的都是两点折线，共享端点会被重复导出。
+#    距离小于 WELD_TOLERANCE 的端点合并为同一顶点，相邻的两点线段串成长折线 (细分时保留每个原始顶点，形状不变)
+MERGE_SEGMENTS = True
+WELD_TOLERANCE = 0.01
+
+# 10) 增量导出：按人缓存未弯曲、已细分的 2D 折线 (见 BendCache)，session 追加了新的人时只解析、焊接、细分新记录；
+#     弯曲参数 (整体 x 范围、半径) 变了只对缓存重新做一次向量化弯曲，没变则只弯曲新的人。
+#     scaling_factor 也存在缓存里，同一个 session 重复导出时半径不会每次随机变化。
+#     注意：增量模式在弯曲前 (展开的 2D 平面上) 按 DIVISION_LENGTH 细分，全量模式是在弯曲后细分；
+#     弯曲会在 x 方向按 2πR / (max_x - min_x) 缩放，所以两种模式的点数不同。设为 False 恢复全量导出
+INCREMENTAL_EXPORT = True
+BEND_CACHE_PATH = INPUT_JSON_PATH + ".bendcache.npz"
+
 # ========== 几何辅助函数 ==========
 
 def distance_3d(p1, p2):
     """三维点间距"""
     return math.sqrt((p1[0]-p2[0])**2 + (p1[1]-p2[1])**2 + (p1[2]-p2[2])**2)
 
+def pack_polylines(polylines):
+    """
+    把折线列表打包成连续数组：
+      points  : (N, 3) float64，所有折线的点首尾相接
+      offsets : (M+1,) int64，第 k 条折线是 points[offsets[k]:offsets[k+1]]
+    """
+    counts = np.fromiter((len(pl) for pl in polylines), dtype=np.int64, count=len(polylines))
+    offsets = np.zeros(len(polylines) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    points = np.array([p for pl in polylines for p in pl], dtype=np.float64).reshape(-1, 3)
+    return points, offsets
+
+
+def unpack_polylines(points, offsets):
+    """pack_polylines 的逆操作，返回 [(x,y,z), ...] 的列表"""
+    rows = [tuple(p) for p in points.tolist()]
+    return [rows[offsets[k]:offsets[k + 1]] for k in range(len(offsets) - 1)]
+
+
+def subdivide_packed(points, offsets, dist_step):
+    """
+    对打包后的所有折线一次性做等距采样(与逐条 subdivide_by_length 结果一致)：
+    - 累积弧长 cumsum，采样位置 k*dist_step 用 searchsorted 找到所在线段
+    - 每条折线保留起点和终点，相邻重合点(<=1e-9)去掉
+    返回新的 (points, offsets)。
+    """
+    num_pl = len(offsets) - 1
+    counts = np.diff(offsets)
+    if len(points) == 0:
+        return points.copy(), np.zeros(num_pl + 1, dtype=np.int64)
+
+    # 线段长度；跨折线的“线段”长度记为 0，searchsorted(side="right") 会跳过它们
+    d = points[1:] - points[:-1]
+    seg_len = np.sqrt(d[:, 0] ** 2 + d[:, 1] ** 2 + d[:, 2] ** 2)
+    nonempty = np.flatnonzero(counts > 0)
+    starts = offsets[:-1][nonempty]
+    ends = offsets[1:][nonempty] - 1
+    seg_len[starts[starts > 0] - 1] = 0.0
+    cum = np.zeros(len(points), dtype=np.float64)
+    np.cumsum(seg_len, out=cum[1:])
+
+    start_cum = cum[starts]
+    total = cum[ends] - start_cum
+
+    # 每条折线的采样位置 0, step, 2*step, ... <= total (多生成一个，再按 <= total 过滤)
+    n_cand = np.where(total > 0, np.floor(total / dist_step).astype(np.int64) + 2, 0)
+    pl = np.repeat(np.arange(len(nonempty)), n_cand)
+    k = np.arange(len(pl)) - np.repeat(np.cumsum(n_cand) - n_cand, n_cand)
+    t_local = k * dist_step
+    keep = t_local <= total[pl]
+    pl, k, t_local = pl[keep], k[keep], t_local[keep]
+
+    t_global = start_cum[pl] + t_local
+    seg = np.searchsorted(cum, t_global, side="right") - 1
+    seg = np.clip(seg, starts[pl], np.maximum(ends[pl] - 1, starts[pl]))
+    length = seg_len[seg]
+    ratio = np.divide(t_global - cum[seg], length, out=np.zeros_like(length), where=length > 0)
+    sampled = points[seg] + ratio[:, None] * (points[seg + 1] - points[seg])
+
+    # 每条折线依次放：起点、采样点(k 从 0 连续递增)、终点
+    n_samples = np.bincount(pl, minlength=len(nonempty))
+    slots = n_samples + 2
+    slot_start = np.cumsum(slots) - slots
+    all_pl = np.repeat(np.arange(len(nonempty)), slots)
+    all_pts = np.empty((len(all_pl), 3), dtype=np.float64)
+    all_pts[slot_start] = points[starts]
+    all_pts[slot_start[pl] + 1 + k] = sampled
+    all_pts[slot_start + slots - 1] = points[ends]
+
+    # 去掉与前一个点重合的点
+    if len(all_pts):
+        step = all_pts[1:] - all_pts[:-1]
+        dist = np.sqrt(step[:, 0] ** 2 + step[:, 1] ** 2 + step[:, 2] ** 2)
+        keep = np.concatenate([[True], (all_pl[1:] != all_pl[:-1]) | (dist > 1e-9)])
+        all_pl, all_pts = all_pl[keep], all_pts[keep]
+
+    new_counts = np.zeros(num_pl, dtype=np.int64)
+    new_counts[nonempty] = np.bincount(all_pl, minlength=len(nonempty))
+    new_offsets = np.zeros(num_pl + 1, dtype=np.int64)
+    np.cumsum(new_counts, out=new_offsets[1:])
+    return all_pts, new_offsets
+
+
+def subdivide_strips(points, offsets, dist_step, strip_mask):
+    """
+    与 subdivide_packed 相同，但 strip_mask 为 True 的折线逐段细分：每个原始顶点都保留，
+    相邻两段共享的顶点只输出一次 (结果等于把各段当作两点折线分别细分，再去掉重复的连接点)。
+    """
+    counts = np.diff(offsets)
+    strip = np.asarray(strip_mask, dtype=bool) & (counts >= 2)
+    if not strip.any():
+        return subdivide_packed(points, offsets, dist_step)
+
+    # 拆分：普通折线为一块，strip 的每一段为一块 (两点)
+    pieces = np.where(strip, counts - 1, 1)
+    owner = np.repeat(np.arange(len(counts)), pieces)
+    first_piece = np.cumsum(pieces) - pieces
+    piece_rank = np.arange(len(owner)) - np.repeat(first_piece, pieces)
+    piece_start = offsets[:-1][owner] + np.where(strip[owner], piece_rank, 0)
+    piece_len = np.where(strip[owner], 2, counts[owner])
+    piece_offsets = np.zeros(len(owner) + 1, dtype=np.int64)
+    np.cumsum(piece_len, out=piece_offsets[1:])
+    gather = np.repeat(piece_start - piece_offsets[:-1], piece_len) + np.arange(piece_offsets[-1])
+
+    sub_points, sub_offsets = subdivide_packed(points[gather], piece_offsets, dist_step)
+
+    # 合并回原折线，去掉相邻重合点 (段与段之间的连接点)
+    point_owner = np.repeat(owner, np.diff(sub_offsets))
+    if len(sub_points):
+        step = sub_points[1:] - sub_points[:-1]
+        dist = np.sqrt(step[:, 0] ** 2 + step[:, 1] ** 2 + step[:, 2] ** 2)
+        keep = np.concatenate([[True], (point_owner[1:] != point_owner[:-1]) | (dist > 1e-9)])
+        sub_points, point_owner = sub_points[keep], point_owner[keep]
+    new_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(point_owner, minlength=len(counts)), out=new_offsets[1:])
+    return sub_points, new_offsets
+
+
 def subdivide_by_length(polyline, dist_step):
     """
     将 polyline(点列表) 按指定距离做均匀采样(类似 DivideByLength)。
@@ -43,57 +207,31 @@ def subdivide_by_length(polyline, dist_step):
     """
     if len(polyline) < 2:
         return polyline[:]
+    points, offsets = subdivide_packed(*pack_polylines([polyline]), dist_step)
+    return unpack_polylines(points, offsets)[0]
 
-    out_points = []
-    lengths = []
-    total_len = 0.0
-    for i in range(len(polyline)-1):
-        seg_len = distance_3d(polyline[i], polyline[i+1])
-        lengths.append(seg_len)
-        total_len += seg_len
-
-    if total_len == 0:
-        return [polyline[0]]
-
-    accumulated = 0.0
-    current_target = 0.0
-    step = dist_step
-
-    out_points.append(polyline[0])  # 第一个点
-    for i, seg_len in enumerate(lengths):
-        p_start = polyline[i]
-        p_end   = polyline[i+1]
-        if seg_len > 0:
-            dir_vec = (
-                (p_end[0] - p_start[0]) / seg_len,
-                (p_end[1] - p_start[1]) / seg_len,
-                (p_end[2] - p_start[2]) / seg_len
-            )
-        else:
-            dir_vec = (0,0,0)
-
-        start_dist = accumulated
-        end_dist   = accumulated + seg_len
-
-        while current_target <= end_dist:
-            if current_target >= start_dist:
-                ratio = 0.0
-                if seg_len != 0:
-                    ratio = (current_target - start_dist)/seg_len
-                px = p_start[0] + ratio*(p_end[0] - p_start[0])
-                py = p_start[1] + ratio*(p_end[1] - p_start[1])
-                pz = p_start[2] + ratio*(p_end[2] - p_start[2])
-                new_pt = (px, py, pz)
-                if distance_3d(new_pt, out_points[-1])>1e-9:
-                    out_points.append(new_pt)
-            current_target += step
 
-        accumulated += seg_len
+def bend_points_to_cylinder(points, radius, min_x=None, max_x=None):
+    """
+    bend_2d_to_cylinder 的数组版本，points 为 (N, 3)，一次性计算所有点的 cos/sin。
+    min_x / max_x 默认取 points 自身的范围；增量导出时传入整个 session 的范围，只弯曲其中一部分点。
+    """
+    if len(points) == 0:
+        return points
+    x = points[:, 0]
+    if min_x is None:
+        min_x = x.min()
+    if max_x is None:
+        max_x = x.max()
+    if abs(max_x - min_x) < 1e-9:
+        return points
 
-    # 确保终点包含
-    if distance_3d(out_points[-1], polyline[-1])>1e-9:
-        out_points.append(polyline[-1])
-    return out_points
+    theta = (x - min_x) / (max_x - min_x) * 2.0 * math.pi
+    bent = np.empty_like(points)
+    bent[:, 0] = radius * np.cos(theta)
+    bent[:, 1] = points[:, 1]
+    bent[:, 2] = radius * np.sin(theta)
+    return bent
 
 
 def bend_2d_to_cylinder(polylines, radius):
@@ -105,35 +243,204 @@ def bend_2d_to_cylinder(polylines, radius):
     """
     if not polylines:
         return []
-
-    all_x = []
-    for pl in polylines:
-        for (x,y,z) in pl:
-            all_x.append(x)
-
-    if not all_x:
+    points, offsets = pack_polylines(polylines)
+    bent = bend_points_to_cylinder(points, radius)
+    if bent is points:
         return polylines
+    return unpack_polylines(bent, offsets)
 
-    min_x = min(all_x)
-    max_x = max(all_x)
-    if abs(max_x - min_x) < 1e-9:
-        return polylines
 
-    bent_result = []
-    for pl in polylines:
-        new_pl = []
-        for (x,y,z) in pl:
-            theta = (x - min_x)/(max_x - min_x) * 2.0*math.pi
-            newX = radius*math.cos(theta)
-            newZ = radius*math.sin(theta)
-            newY = y
-            new_pl.append((newX, newY, newZ))
-        bent_result.append(new_pl)
-    return bent_result
+def weld_segments(polylines, tolerance=WELD_TOLERANCE):
+    """
+    把所有两点折线的端点用哈希网格焊接 (距离 <= tolerance 视为同一点)，去掉重复/退化线段，
+    再把首尾相连的线段串成长折线。
+    返回 (新的折线列表, 其中哪些是串成的折线 [bool]，统计)。多于两点的折线原样保留在前面。
+    """
+    others = [pl for pl in polylines if len(pl) != 2]
+    segments = [pl for pl in polylines if len(pl) == 2]
+    cell_size = max(tolerance, 1e-12)
+    grid = {}          # 网格坐标 -> [顶点编号]
+    vertices = []      # 焊接后的顶点
+
+    def vertex_id(p):
+        cx, cy, cz = (int(math.floor(c / cell_size)) for c in p)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    for vid in grid.get((cx + dx, cy + dy, cz + dz), ()):
+                        if distance_3d(vertices[vid], p) <= tolerance:
+                            return vid
+        vertices.append(p)
+        grid.setdefault((cx, cy, cz), []).append(len(vertices) - 1)
+        return len(vertices) - 1
+
+    edges = {}         # (小编号, 大编号) -> 线段编号，去掉重复的线段 (例如 A->B 和 B->A)
+    for a, b in segments:
+        u, v = vertex_id(a), vertex_id(b)
+        if u != v:
+            edges.setdefault((min(u, v), max(u, v)), len(edges))
+
+    adjacency = {}
+    for (u, v), eid in edges.items():
+        adjacency.setdefault(u, []).append((v, eid))
+        adjacency.setdefault(v, []).append((u, eid))
+    used = [False] * len(edges)
+
+    def walk(start):
+        chain = [start]
+        current = start
+        while True:
+            for nxt, eid in adjacency[current]:
+                if not used[eid]:
+                    used[eid] = True
+                    chain.append(nxt)
+                    current = nxt
+                    break
+            else:
+                return chain
+
+    # 先从端点/分叉点 (度数不为 2) 出发，剩下的是闭合环
+    strips = []
+    for start in sorted(adjacency, key=lambda vid: len(adjacency[vid]) == 2):
+        while any(not used[eid] for _, eid in adjacency[start]):
+            strips.append([vertices[vid] for vid in walk(start)])
+
+    stats = {
+        "segments": len(segments),
+        "unique_segments": len(edges),
+        "endpoints": 2 * len(segments),
+        "welded_vertices": len(vertices),
+        "strips": len(strips)
+    }
+    return others + strips, [False] * len(others) + [True] * len(strips), stats
 
 
 # ========== 解析 JSON: 包括 polylines 和 height_info ==========
 
+def new_parse_state():
+    """parse_record 在记录之间需要保留的状态"""
+    return {"contour_index": 0, "current_x_offset": 0.0, "height_diffs": []}
+
+
+def parse_record(item, state, x_offset_increment, max_seg_length):
+    """
+    解析一条记录，返回它产生的折线；contour 计数、x 偏移和 height_info 差值记录在 state 中。
+    """
+    polylines = []
+
+    # 先看是否有 height_info
+    hi = item.get("height_info")
+    if hi and "min_y" in hi and "max_y" in hi:
+        diff = hi["max_y"] - hi["min_y"]
+        state["height_diffs"].append(diff)
+
+    typ = item.get("type", "")
+    if typ == "contour":
+        x_offset = state["contour_index"] * x_offset_increment
+        state["contour_index"] += 1
+        state["current_x_offset"] = x_offset
+
+        cats = item.get("categories", {})
+        for cat_name, points_list in cats.items():
+            if not isinstance(points_list, list):
+                continue
+
+            offset_points = []
+            for p in points_list:
+                px = p["x"] + x_offset
+                py = p["y"]
+                offset_points.append((px, py, 0.0))
+
+            # 断线逻辑
+            if len(offset_points) < 2:
+                continue
+            seg_buf = [offset_points[0]]
+            for i_pt in range(1, len(offset_points)):
+                dist_ = distance_3d(seg_buf[-1], offset_points[i_pt])
+                if dist_ <= max_seg_length:
+                    seg_buf.append(offset_points[i_pt])
+                else:
+                    if len(seg_buf) > 1:
+                        polylines.append(seg_buf[:])
+                    seg_buf = [offset_points[i_pt]]
+            if len(seg_buf) > 1:
+                polylines.append(seg_buf)
+
+    elif typ == "facial_features":
+        x_offset = state["current_x_offset"]
+        categories = item.get("categories", {})
+
+        # 收集 jawline/nose 用于附加处理
+        jawline_pts = []
+        nose_pts = []
+
+        for feature_key, feature_data in categories.items():
+            if isinstance(feature_data, dict):
+                pts_map = {}
+                for p in feature_data.get("points", []):
+                    idx = p["index"]
+                    px = p["x"] + x_offset
+                    py = p["y"]
+                    pts_map[idx] = (px, py, 0.0)
+
+                    if feature_key == "jawline":
+                        jawline_pts.append((px, py, 0.0))
+                    elif feature_key == "nose":
+                        nose_pts.append((px, py, 0.0))
+
+                # connections => 两点线
+                for conn in feature_data.get("connections", []):
+                    s = conn["start"]
+                    e = conn["end"]
+                    if s in pts_map and e in pts_map:
+                        dist_ = distance_3d(pts_map[s], pts_map[e])
+                        if dist_ <= max_seg_length:
+                            polylines.append([pts_map[s], pts_map[e]])
+
+            elif isinstance(feature_data, list):
+                # 不做额外处理
+                pass
+
+        # 额外处理下颌线
+        if jawline_pts:
+            jaw_sorted = sorted(jawline_pts, key=lambda p: p[1])  # 按 y 排序
+            half_count = len(jaw_sorted)//2
+            kept = jaw_sorted[half_count:]
+            for i_pt, pt in enumerate(kept):
+                min_d = float('inf')
+                closest = None
+                for j_pt, other in enumerate(kept):
+                    if i_pt != j_pt:
+                        d_ = distance_3d(pt, other)
+                        if d_ < min_d:
+                            min_d = d_
+                            closest = other
+                if closest is not None:
+                    polylines.append([pt, closest])
+
+        # 额外处理鼻子
+        if nose_pts:
+            nose_sorted = sorted(nose_pts, key=lambda p: p[1])
+            selected = []
+            if len(nose_sorted)>=3:
+                selected.append(nose_sorted[2])
+            if len(nose_sorted)>=7:
+                selected.append(nose_sorted[6])
+            for i_pt, pt in enumerate(selected):
+                min_d = float('inf')
+                closest = None
+                for j_pt, other in enumerate(selected):
+                    if i_pt != j_pt:
+                        d_ = distance_3d(pt, other)
+                        if d_ < min_d:
+                            min_d = d_
+                            closest = other
+                if closest:
+                    polylines.append([pt, closest])
+
+    return polylines
+
+
 def parse_filtered_json(json_file, x_offset_increment, max_seg_length):
     """
     解析 filtered_time_axis_contours.json，返回：
@@ -141,170 +448,125 @@ def parse_filtered_json(json_file, x_offset_increment, max_seg_length):
       2) min_diff_in_height: 所有 "height_info" 中 (max_y-min_y) 的最小值
     """
 
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
     # 用于存储折线
     polylines = []
-    contour_index = 0
-    current_x_offset = 0.0
-
-    # 用于收集 height_info 的差值
-    height_diffs = []
-
-    for item in data:
-        # 先看是否有 height_info
-        hi = item.get("height_info")
-        if hi and "min_y" in hi and "max_y" in hi:
-            diff = hi["max_y"] - hi["min_y"]
-            height_diffs.append(diff)
-
-        typ = item.get("type", "")
-        if typ == "contour":
-            x_offset = contour_index * x_offset_increment
-            contour_index += 1
-            current_x_offset = x_offset
-
-            cats = item.get("categories", {})
-            for cat_name, points_list in cats.items():
-                if not isinstance(points_list, list):
-                    continue
-
-                offset_points = []
-                for p in points_list:
-                    px = p["x"] + x_offset
-                    py = p["y"]
-                    offset_points.append((px, py, 0.0))
-
-                # 断线逻辑
-                if len(offset_points) < 2:
-                    continue
-                seg_buf = [offset_points[0]]
-                for i_pt in range(1, len(offset_points)):
-                    dist_ = distance_3d(seg_buf[-1], offset_points[i_pt])
-                    if dist_ <= max_seg_length:
-                        seg_buf.append(offset_points[i_pt])
-                    else:
-                        if len(seg_buf) > 1:
-                            polylines.append(seg_buf[:])
-                        seg_buf = [offset_points[i_pt]]
-                if len(seg_buf) > 1:
-                    polylines.append(seg_buf)
-
-        elif typ == "facial_features":
-            x_offset = current_x_offset
-            categories = item.get("categories", {})
-
-            # 收集 jawline/nose 用于附加处理
-            jawline_pts = []
-            nose_pts = []
-
-            for feature_key, feature_data in categories.items():
-                if isinstance(feature_data, dict):
-                    pts_map = {}
-                    for p in feature_data.get("points", []):
-                        idx = p["index"]
-                        px = p["x"] + x_offset
-                        py = p["y"]
-                        pts_map[idx] = (px, py, 0.0)
-
-                        if feature_key == "jawline":
-                            jawline_pts.append((px, py, 0.0))
-                        elif feature_key == "nose":
-                            nose_pts.append((px, py, 0.0))
-
-                    # connections => 两点线
-                    for conn in feature_data.get("connections", []):
-                        s = conn["start"]
-                        e = conn["end"]
-                        if s in pts_map and e in pts_map:
-                            dist_ = distance_3d(pts_map[s], pts_map[e])
-                            if dist_ <= max_seg_length:
-                                polylines.append([pts_map[s], pts_map[e]])
-
-                elif isinstance(feature_data, list):
-                    # 不做额外处理
-                    pass
-
-            # 额外处理下颌线
-            if jawline_pts:
-                jaw_sorted = sorted(jawline_pts, key=lambda p: p[1])  # 按 y 排序
-                half_count = len(jaw_sorted)//2
-                kept = jaw_sorted[half_count:]
-                for i_pt, pt in enumerate(kept):
-                    min_d = float('inf')
-                    closest = None
-                    for j_pt, other in enumerate(kept):
-                        if i_pt != j_pt:
-                            d_ = distance_3d(pt, other)
-                            if d_ < min_d:
-                                min_d = d_
-                                closest = other
-                    if closest is not None:
-                        polylines.append([pt, closest])
-
-            # 额外处理鼻子
-            if nose_pts:
-                nose_sorted = sorted(nose_pts, key=lambda p: p[1])
-                selected = []
-                if len(nose_sorted)>=3:
-                    selected.append(nose_sorted[2])
-                if len(nose_sorted)>=7:
-                    selected.append(nose_sorted[6])
-                for i_pt, pt in enumerate(selected):
-                    min_d = float('inf')
-                    closest = None
-                    for j_pt, other in enumerate(selected):
-                        if i_pt != j_pt:
-                            d_ = distance_3d(pt, other)
-                            if d_ < min_d:
-                                min_d = d_
-                                closest = other
-                    if closest:
-                        polylines.append([pt, closest])
-
-    # 计算 min_diff_in_height
+    state = new_parse_state()
+
+    # 逐条流式读取记录，不把整个文件载入内存
+    for item in iter_records(json_file):
+        polylines.extend(parse_record(item, state, x_offset_increment, max_seg_length))
+
+    return polylines, min_height_diff(state)
+
+
+def min_height_diff(state):
+    """所有 "height_info" 中 (max_y-min_y) 的最小值，没有则为 0"""
+    height_diffs = state["height_diffs"]
     if height_diffs:
         min_diff = min(height_diffs)
     else:
         min_diff = 0.0
+    return min_diff
 
-    return polylines, min_diff
 
-
-def export_to_buffergeometry_json(polylines, out_file, division_len=8.0, flip_z=True):
+def build_buffergeometry(points, offsets, division_len=8.0, flip_z=True, strip_mask=None):
     """
-    将多条折线 => 做“等距细分” => 输出 three.js BufferGeometry JSON。
-    如果 flip_z=True，则对输出点的 Z 坐标做取反(类似 GH 里的 -Z)。
+    打包的折线 => 等距细分 => (顶点数组 (V, 3), 索引数组 (2*E,))。
+    少于 2 个点的折线被丢弃；如果 flip_z=True，则对 Z 坐标取反(类似 GH 里的 -Z)。
+    strip_mask 标记由 weld_segments 串成的折线 (逐段细分)。
+    """
+    if strip_mask is None:
+        sub_points, sub_offsets = subdivide_packed(points, offsets, division_len)
+    else:
+        sub_points, sub_offsets = subdivide_strips(points, offsets, division_len, strip_mask)
+    return packed_to_buffergeometry(sub_points, sub_offsets, flip_z)
+
+
+def packed_to_buffergeometry(sub_points, sub_offsets, flip_z=True):
+    """已细分的打包折线 => (顶点数组, 索引数组)，少于 2 个点的折线被丢弃"""
+    counts = np.diff(sub_offsets)
+    valid = counts >= 2
+    point_mask = np.repeat(valid, counts)
+    vertices = sub_points[point_mask]
+    if flip_z:
+        vertices = vertices * np.array([1.0, 1.0, -1.0])
+
+    # 同一条折线内相邻两点 => 一条线段
+    line_id = np.repeat(np.arange(len(counts))[valid], counts[valid])
+    first = np.flatnonzero(line_id[1:] == line_id[:-1])
+    indices = np.stack([first, first + 1], axis=1).ravel()
+    return vertices, indices
+
+
+def decimate_packed(points, offsets, keep_every):
+    """每条折线每隔 keep_every 个点保留一个，起点和终点总是保留"""
+    if keep_every <= 1 or len(points) == 0:
+        return points, offsets
+    counts = np.diff(offsets)
+    local = np.arange(len(points)) - np.repeat(offsets[:-1], counts)
+    last = np.repeat(counts - 1, counts)
+    keep = (local % keep_every == 0) | (local == last)
+    kept_counts = np.add.reduceat(keep.astype(np.int64), offsets[:-1][counts > 0])
+    new_counts = np.zeros(len(counts), dtype=np.int64)
+    new_counts[counts > 0] = kept_counts
+    new_offsets = np.zeros(len(offsets), dtype=np.int64)
+    np.cumsum(new_counts, out=new_offsets[1:])
+    return points[keep], new_offsets
+
+
+def build_lods(points, offsets, division_len=8.0, lod_lengths=LOD_DIVISION_LENGTHS, flip_z=True, strip_mask=None):
+    """
+    返回由粗到细的 [(采样间距, 顶点数组, 索引数组), ...]，最后一项为 division_len 的精细版本。
+    只细分一次，粗糙版本从精细采样中抽点得到。
     """
-    vertices = []
-    indices  = []
-    cur_idx_base = 0
+    if strip_mask is None:
+        sub_points, sub_offsets = subdivide_packed(points, offsets, division_len)
+    else:
+        sub_points, sub_offsets = subdivide_strips(points, offsets, division_len, strip_mask)
+    return lods_from_subdivided(sub_points, sub_offsets, division_len, lod_lengths, flip_z)
+
 
-    for pl in polylines:
-        subdiv = subdivide_by_length(pl, division_len)
-        if len(subdiv)<2:
+def lods_from_subdivided(sub_points, sub_offsets, division_len=8.0, lod_lengths=LOD_DIVISION_LENGTHS, flip_z=True):
+    """build_lods 的后半部分：输入已按 division_len 细分好的打包折线"""
+    lods = []
+    for length in sorted(set(lod_lengths), reverse=True):
+        factor = int(round(length / division_len))
+        if factor <= 1:
             continue
+        lod_points, lod_offsets = decimate_packed(sub_points, sub_offsets, factor)
+        lods.append((division_len * factor, *packed_to_buffergeometry(lod_points, lod_offsets, flip_z)))
+    lods.append((division_len, *packed_to_buffergeometry(sub_points, sub_offsets, flip_z)))
+    return lods
 
-        for i, p in enumerate(subdiv):
-            px, py, pz = p
-            if flip_z:
-                pz = -pz
-            vertices.append((px, py, pz))
 
-            if i>0:
-                indices.append([cur_idx_base + i - 1, cur_idx_base + i])
+def write_lod_manifest(lods, lod_files, out_file):
+    """
+    清单：由粗到细列出每个 LOD 的采样间距、顶点数、线段数和文件名 (相对于清单所在目录)。
+    """
+    manifest = {"version": 1, "lods": []}
+    for level, ((length, vertices, indices), files) in enumerate(zip(lods, lod_files)):
+        manifest["lods"].append({
+            "level": level,
+            "division_length": length,
+            "vertices": int(len(vertices)),
+            "segments": int(len(indices) // 2),
+            "files": {os.path.splitext(f)[1][1:]: os.path.basename(f) for f in files
+                      if not f.endswith((".gz", ".br"))},
+            "precompressed": sorted({os.path.splitext(f)[1][1:] for f in files if f.endswith((".gz", ".br"))})
+        })
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    print(f"导出完成：{out_file}")
 
-        cur_idx_base += len(subdiv)
 
-    float_array = []
-    for (x,y,z) in vertices:
-        float_array.extend([x,y,z])
+def index_dtype(vertex_count):
+    """顶点数不超过 65535 时用 Uint16 索引，否则用 Uint32"""
+    return np.uint16 if vertex_count <= 0xFFFF else np.uint32
 
-    index_array = []
-    for pair in indices:
-        index_array.extend(pair)
 
+def write_buffergeometry_json(vertices, indices, out_file):
+    """输出 three.js BufferGeometry JSON (紧凑格式，索引类型随顶点数自动选择)"""
+    index_type = "Uint16Array" if index_dtype(len(vertices)) == np.uint16 else "Uint32Array"
     json_data = {
         "metadata": {
             "type": "BufferGeometry",
@@ -315,67 +577,545 @@ def export_to_buffergeometry_json(polylines, out_file, division_len=8.0, flip_z=
                 "position": {
                     "itemSize": 3,
                     "type": "Float32Array",
-                    "array": float_array
+                    "array": vertices.ravel().tolist()
                 }
             },
             "index": {
-                "type": "Uint16Array",
-                "array": index_array
+                "type": index_type,
+                "array": indices.tolist()
             }
         }
     }
 
     with open(out_file, 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, indent=2, ensure_ascii=False)
+        json.dump(json_data, f, separators=(",", ":"), ensure_ascii=False)
     print(f"导出完成：{out_file}")
 
 
+# glTF 2.0 常量
+GLB_MAGIC = 0x46546C67         # "glTF"
+GLB_CHUNK_JSON = 0x4E4F534A    # "JSON"
+GLB_CHUNK_BIN = 0x004E4942     # "BIN\0"
+GLTF_FLOAT = 5126
+GLTF_UNSIGNED_SHORT = 5123
+GLTF_UNSIGNED_INT = 5125
+GLTF_ARRAY_BUFFER = 34962
+GLTF_ELEMENT_ARRAY_BUFFER = 34963
+GLTF_MODE_LINES = 1
+
+
+def _pad4(length):
+    return (4 - length % 4) % 4
+
+
+def write_glb(vertices, indices, out_file):
+    """
+    输出二进制 glTF (GLB)：一个 LINES 图元，POSITION 为 float32，索引为 Uint16/Uint32。
+    顶点和索引数组直接写入文件，不经过 Python 列表。
+    没有顶点时 count 为 0 的 accessor 不是合法的 glTF，此时不写文件，返回 False。
+    """
+    if len(vertices) == 0 or len(indices) == 0:
+        print(f"跳过 {out_file}：没有顶点")
+        return False
+    positions = np.ascontiguousarray(vertices, dtype="<f4")
+    idx_type = index_dtype(len(positions))
+    index_data = np.ascontiguousarray(indices, dtype=np.dtype(idx_type).newbyteorder("<"))
+
+    pos_bytes = positions.nbytes                 # 12 * V，天然 4 字节对齐
+    idx_bytes = index_data.nbytes
+    bin_length = pos_bytes + idx_bytes + _pad4(idx_bytes)
+
+    pos_min = positions.min(axis=0).tolist()
+    pos_max = positions.max(axis=0).tolist()
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "shododesk send_to_web.py"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0}, "indices": 1, "mode": GLTF_MODE_LINES}]}],
+        "buffers": [{"byteLength": bin_length}],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": pos_bytes, "target": GLTF_ARRAY_BUFFER},
+            {"buffer": 0, "byteOffset": pos_bytes, "byteLength": idx_bytes, "target": GLTF_ELEMENT_ARRAY_BUFFER}
+        ],
+        "accessors": [
+            {"bufferView": 0, "componentType": GLTF_FLOAT, "count": len(positions), "type": "VEC3",
+             "min": pos_min, "max": pos_max},
+            {"bufferView": 1, "componentType": GLTF_UNSIGNED_SHORT if idx_type == np.uint16 else GLTF_UNSIGNED_INT,
+             "count": len(index_data), "type": "SCALAR"}
+        ]
+    }
+    json_chunk = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_chunk += b" " * _pad4(len(json_chunk))
+    total_length = 12 + 8 + len(json_chunk) + 8 + bin_length
+
+    with open(out_file, "wb") as f:
+        f.write(struct.pack("<III", GLB_MAGIC, 2, total_length))
+        f.write(struct.pack("<II", len(json_chunk), GLB_CHUNK_JSON))
+        f.write(json_chunk)
+        f.write(struct.pack("<II", bin_length, GLB_CHUNK_BIN))
+        f.write(positions.tobytes())
+        f.write(index_data.tobytes())
+        f.write(b"\0" * _pad4(idx_bytes))
+    print(f"导出完成：{out_file}")
+    return True
+
+
+QBIN_MAGIC = b"SDQG"
+
+
+def quantise_positions(vertices, max_error=QUANTISE_MAX_ERROR):
+    """
+    每个轴线性映射到 int16 [-32767, 32767]：v ≈ q * scale + offset。
+    返回 (q, scale, offset, 实际最大误差)；误差超过 max_error 时 q 为 None。
+    """
+    if len(vertices) == 0:
+        return np.zeros((0, 3), dtype="<i2"), [1.0] * 3, [0.0] * 3, 0.0
+    lo = vertices.min(axis=0)
+    hi = vertices.max(axis=0)
+    offset = (lo + hi) / 2.0
+    scale = np.where(hi > lo, (hi - lo) / 65534.0, 1.0)
+    q = np.clip(np.rint((vertices - offset) / scale), -32767, 32767).astype("<i2")
+    error = float(np.abs(q * scale + offset - vertices).max())
+    if error > max_error:
+        return None, scale.tolist(), offset.tolist(), error
+    return q, scale.tolist(), offset.tolist(), error
+
+
+def write_quantised(vertices, indices, out_file, max_error=QUANTISE_MAX_ERROR):
+    """
+    量化二进制格式 (小端)：
+      "SDQG" | uint32 头长度 | JSON 头 (空格补齐到 4 字节) | 坐标 | 索引
+    坐标：int16 x 3 (头里 position_type = "int16"，v = q * scale + offset)，
+          量化误差超过 max_error 时为 float32 x 3 (position_type = "float32")，补齐到 4 字节；
+    索引：int32 差分 (d[0] = i[0], d[k] = i[k] - i[k-1])，串成的折线几乎全是 0/1，压缩后很小。
+    没有顶点时不写文件 (也就不会预压缩)，返回 False。
+    """
+    if len(vertices) == 0 or len(indices) == 0:
+        print(f"跳过 {out_file}：没有顶点")
+        return False
+    q, scale, offset, error = quantise_positions(vertices, max_error)
+    if q is None:
+        print(f"警告：量化误差 {error:.4f} 超过 {max_error}，{out_file} 使用 float32 坐标")
+        positions = np.ascontiguousarray(vertices, dtype="<f4")
+        position_type = "float32"
+    else:
+        positions = q
+        position_type = "int16"
+    index_deltas = np.diff(np.asarray(indices, dtype=np.int64), prepend=0).astype("<i4")
+
+    header = {
+        "version": 1,
+        "vertex_count": int(len(vertices)),
+        "index_count": int(len(index_deltas)),
+        "position_type": position_type,
+        "scale": scale,
+        "offset": offset,
+        "max_error": error if position_type == "int16" else 0.0,
+        "index_coding": "delta-int32"
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * _pad4(len(header_bytes))
+    with open(out_file, "wb") as f:
+        f.write(QBIN_MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(positions.tobytes())
+        f.write(b"\0" * _pad4(positions.nbytes))
+        f.write(index_deltas.tobytes())
+    print(f"导出完成：{out_file} (坐标 {position_type}，最大误差 {header['max_error']:.4f})")
+    return True
+
+
+def read_quantised(path):
+    """write_quantised 的逆操作，返回 (顶点 float64 (V, 3), 索引)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != QBIN_MAGIC:
+        raise ValueError(f"{path} 不是量化几何文件")
+    (header_len,) = struct.unpack_from("<I", data, 4)
+    header = json.loads(data[8:8 + header_len])
+    pos = 8 + header_len
+    dtype = "<i2" if header["position_type"] == "int16" else "<f4"
+    count = header["vertex_count"] * 3
+    positions = np.frombuffer(data, dtype=dtype, count=count, offset=pos).reshape(-1, 3).astype(np.float64)
+    pos += count * np.dtype(dtype).itemsize
+    pos += _pad4(pos)
+    deltas = np.frombuffer(data, dtype="<i4", count=header["index_count"], offset=pos)
+    if header["position_type"] == "int16":
+        positions = positions * np.array(header["scale"]) + np.array(header["offset"])
+    return positions, np.cumsum(deltas, dtype=np.int64)
+
+
+def precompress(path, encodings=PRECOMPRESS):
+    """在 path 旁边写 .gz / .br，返回写出的文件列表 (内容固定，不含时间戳，便于上传存储去重)"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    written = []
+    if "gz" in encodings:
+        buf = io.BytesIO()
+        with gzip.GzipFile(filename="", mode="wb", fileobj=buf, compresslevel=9, mtime=0) as gz:
+            gz.write(raw)
+        with open(path + ".gz", "wb") as f:
+            f.write(buf.getvalue())
+        written.append(path + ".gz")
+    if "br" in encodings and brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(raw, quality=11))
+        written.append(path + ".br")
+    return written
+
+
+def write_viewer_geometry(vertices, indices, out_file, formats=EXPORT_FORMATS, encodings=PRECOMPRESS):
+    """
+    按 formats 导出；out_file 为 .json 路径，.glb / .qbin 与之同名，并按 encodings 写预压缩版本。
+    返回写出的文件列表 (先是各格式文件，再是压缩版本)。
+    """
+    base, _ = os.path.splitext(out_file)
+    written = []
+    if "json" in formats:
+        write_buffergeometry_json(vertices, indices, base + ".json")
+        written.append(base + ".json")
+    if "glb" in formats and write_glb(vertices, indices, base + ".glb"):
+        written.append(base + ".glb")
+    if "qbin" in formats and write_quantised(vertices, indices, base + ".qbin"):
+        written.append(base + ".qbin")
+    compressed = []
+    for path in written:
+        compressed.extend(precompress(path, encodings))
+    return written + compressed
+
+
+def export_to_buffergeometry_json(polylines, out_file, division_len=8.0, flip_z=True):
+    """
+    将多条折线 => 做“等距细分” => 输出 three.js BufferGeometry JSON。
+    如果 flip_z=True，则对输出点的 Z 坐标做取反(类似 GH 里的 -Z)。
+    """
+    points, offsets = pack_polylines(polylines)
+    vertices, indices = build_buffergeometry(points, offsets, division_len, flip_z)
+    write_buffergeometry_json(vertices, indices, out_file)
+
+
+# ========== 增量弯曲缓存 ==========
+
+def _empty_packed():
+    return np.zeros((0, 3), dtype=np.float64), np.zeros(1, dtype=np.int64)
+
+
+class BendCache:
+    """
+    按人缓存一个 session 的几何。一个人 = 一条 contour 记录 + 其后的 facial_features 记录，每个人保存：
+      raw  : 焊接前的 2D 折线 (打包)，这个人再追加记录时从这里重新焊接、细分
+      sub  : 焊接 + 按 division_len 细分后的 2D 折线 (未弯曲)
+      bent : 用 self.bend 参数弯曲后的 sub 点，None 表示还没弯曲
+    另外保存输入文件已读到的字节偏移及其前缀指纹、parse_record 的状态和 scaling_factor。
+    整个缓存是一个 .npz 文件 (元数据以 JSON 字符串存在 "meta" 中)，写临时文件再改名。
+    """
+
+    def __init__(self, path=BEND_CACHE_PATH, input_path=INPUT_JSON_PATH, division_len=DIVISION_LENGTH):
+        self.path = path
+        self.input_path = input_path
+        self.division_len = division_len
+        # 这些参数变了，缓存的折线就作废
+        self.settings = {
+            "x_offset_increment": X_OFFSET_INCREMENT,
+            "max_length": MAX_LENGTH,
+            "division_length": division_len,
+            "merge_segments": MERGE_SEGMENTS,
+            "weld_tolerance": WELD_TOLERANCE
+        }
+        self._reset()
+
+    def _reset(self):
+        self.offset = None          # 已读记录之后的字节偏移
+        self.tail = None            # self.offset 之前已读部分的指纹 (record_stream.prefix_fingerprint)
+        self.records = 0
+        self.parse_state = new_parse_state()
+        self.scaling_factor = random.uniform(1.5, 2.0)
+        self.bend = None            # (min_x, max_x, radius)
+        self.persons = []
+        self.rebent = 0             # 上一次 bent_geometry() 弯曲了几个人
+
+    # ----- 读写缓存文件 -----
+
+    def load(self):
+        """读取缓存，文件不存在、损坏或参数不同则从空缓存开始。返回是否读到了可用的缓存"""
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("settings") != self.settings:
+                    print("增量缓存的参数与当前配置不同，重新计算。")
+                    return False
+                raw_points, raw_offsets = data["raw_points"], data["raw_offsets"]
+                sub_points, sub_offsets = data["sub_points"], data["sub_offsets"]
+                bent_points = data["bent_points"]
+        except (OSError, KeyError, ValueError):
+            return False
+
+        self.offset = meta["offset"]
+        self.tail = meta["tail"]
+        self.records = meta["records"]
+        self.parse_state = meta["parse_state"]
+        self.scaling_factor = meta["scaling_factor"]
+        self.bend = tuple(meta["bend"]) if meta["bend"] is not None else None
+        self.persons = []
+        raw_pos = sub_pos = raw_at = sub_at = bent_at = 0
+        for raw_count, sub_count, bent in meta["persons"]:
+            # 每个人的 offsets 从 0 开始，依次存放；points 依次首尾相接
+            r_off = raw_offsets[raw_pos:raw_pos + raw_count + 1]
+            s_off = sub_offsets[sub_pos:sub_pos + sub_count + 1]
+            raw_pos += raw_count + 1
+            sub_pos += sub_count + 1
+            person = {
+                "raw": (raw_points[raw_at:raw_at + r_off[-1]], r_off),
+                "sub": (sub_points[sub_at:sub_at + s_off[-1]], s_off),
+                "bent": bent_points[bent_at:bent_at + s_off[-1]] if bent else None
+            }
+            raw_at += r_off[-1]
+            sub_at += s_off[-1]
+            if bent:
+                bent_at += s_off[-1]
+            self.persons.append(person)
+        return True
+
+    def save(self):
+        persons = self.persons
+        meta = {
+            "settings": self.settings,
+            "offset": self.offset,
+            "tail": self.tail,
+            "records": self.records,
+            "parse_state": self.parse_state,
+            "scaling_factor": self.scaling_factor,
+            "bend": self.bend,
+            "persons": [[len(p["raw"][1]) - 1, len(p["sub"][1]) - 1, p["bent"] is not None] for p in persons]
+        }
+
+        def concat(arrays, empty):
+            return np.concatenate(arrays) if arrays else empty
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                meta=np.array(json.dumps(meta)),
+                raw_points=concat([p["raw"][0] for p in persons], np.zeros((0, 3))),
+                raw_offsets=concat([p["raw"][1] for p in persons], np.zeros(0, dtype=np.int64)),
+                sub_points=concat([p["sub"][0] for p in persons], np.zeros((0, 3))),
+                sub_offsets=concat([p["sub"][1] for p in persons], np.zeros(0, dtype=np.int64)),
+                bent_points=concat([p["bent"] for p in persons if p["bent"] is not None], np.zeros((0, 3)))
+            )
+        os.replace(tmp_path, self.path)
+
+    # ----- 增量更新 -----
+
+    def _prefix_changed(self):
+        if self.offset is None:
+            return False
+        if os.path.getsize(self.input_path) < self.offset:
+            return True
+        return prefix_fingerprint(self.input_path, self.offset) != self.tail
+
+    def update(self):
+        """
+        读取上次之后追加的记录，只重新计算涉及到的人。输入文件被重写时整个缓存作废。
+        返回 (新记录数, 重新计算的人数)。
+        """
+        if self._prefix_changed():
+            print("输入文件已被重写 (新的 session)，增量缓存作废。")
+            self._reset()
+
+        new_polylines = {}          # 人的编号 -> 新增的 2D 折线
+        offset = self.offset
+        count = 0
+        try:
+            # 末尾的 line_run 还可能在变长 (见 time_axis.py)，等后面有新记录时才读入，缓存的偏移停在它前面
+            for item, end in time_axis.iter_settled(iter_records_with_offsets(self.input_path, self.offset)):
+                # contour 记录开始一个新的人，其它记录属于当前这个人
+                if item.get("type", "") == "contour":
+                    person = self.parse_state["contour_index"]
+                else:
+                    person = max(self.parse_state["contour_index"] - 1, 0)
+                polylines = parse_record(item, self.parse_state, X_OFFSET_INCREMENT, MAX_LENGTH)
+                if polylines:
+                    new_polylines.setdefault(person, []).extend(polylines)
+                offset = end
+                count += 1
+        except ValueError:
+            # 最后一条记录还没写完 (或文件还是空的)，下次再读
+            pass
+
+        if count:
+            self.records += count
+            self.offset = offset
+            self.tail = prefix_fingerprint(self.input_path, offset)
+        for person, polylines in sorted(new_polylines.items()):
+            self._add_to_person(person, polylines)
+        return count, len(new_polylines)
+
+    def _add_to_person(self, person, polylines):
+        while len(self.persons) <= person:
+            self.persons.append({"raw": _empty_packed(), "sub": _empty_packed(), "bent": None})
+        entry = self.persons[person]
+        raw = unpack_polylines(*entry["raw"]) + polylines
+        if raw:
+            entry["raw"] = pack_polylines(raw)
+        strip_mask = None
+        if MERGE_SEGMENTS and raw:
+            raw, strip_mask, _ = weld_segments(raw, WELD_TOLERANCE)
+        if raw:
+            points, offsets = pack_polylines(raw)
+            if strip_mask is None:
+                entry["sub"] = subdivide_packed(points, offsets, self.division_len)
+            else:
+                entry["sub"] = subdivide_strips(points, offsets, self.division_len, strip_mask)
+        entry["bent"] = None
+
+    # ----- 弯曲 -----
+
+    def bend_params(self):
+        """(整体 min_x, max_x, 半径)；没有任何点时为 None"""
+        ranges = [(p["sub"][0][:, 0].min(), p["sub"][0][:, 0].max()) for p in self.persons if len(p["sub"][0])]
+        if not ranges:
+            return None
+        radius = self.scaling_factor * (500.0 - min_height_diff(self.parse_state))
+        return (float(min(r[0] for r in ranges)), float(max(r[1] for r in ranges)), float(radius))
+
+    def bent_geometry(self):
+        """
+        返回所有人弯曲后的 (points, offsets)，已按 division_len 细分。
+        弯曲参数变了 => 所有缓存点一次性重新弯曲；没变 => 只弯曲还没有弯曲过的人。
+        """
+        params = self.bend_params()
+        if params is None:
+            return _empty_packed()
+        if params != self.bend:
+            todo = self.persons
+            self.bend = params
+        else:
+            todo = [p for p in self.persons if p["bent"] is None]
+        if todo:
+            min_x, max_x, radius = params
+            counts = [len(p["sub"][0]) for p in todo]
+            bent = bend_points_to_cylinder(np.concatenate([p["sub"][0] for p in todo]), radius, min_x, max_x)
+            for p, part in zip(todo, np.split(bent, np.cumsum(counts)[:-1])):
+                p["bent"] = part
+        self.rebent = len(todo)
+
+        points = np.concatenate([p["bent"] for p in self.persons])
+        counts = np.concatenate([np.diff(p["sub"][1]) for p in self.persons])
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return points, offsets
+
+
 def main():
-    # 1) 解析 JSON => 得到 2D 折线 & min_diff_in_height
-    polylines_2d, min_diff_in_height = parse_filtered_json(
-        INPUT_JSON_PATH,
-        x_offset_increment=X_OFFSET_INCREMENT,
-        max_seg_length=MAX_LENGTH
-    )
-
-    if not polylines_2d:
-        print("未解析到任何线，脚本结束。")
-        return
-
-    # 2) 动态计算 BEND_RADIUS
-    #    scaling_factor ∈ [1.5, 2.0]
-    scaling_factor = random.uniform(1.5, 2.0)
-    BEND_RADIUS = scaling_factor * (500.0 - min_diff_in_height)
-    print(f"min_diff_in_height = {min_diff_in_height}, scaling_factor = {scaling_factor:.2f}, BEND_RADIUS = {BEND_RADIUS:.2f}")
-
-    # 3) 弯曲到圆柱
-    bent_polylines = bend_2d_to_cylinder(polylines_2d, BEND_RADIUS)
+    started = time.time()
+    if INCREMENTAL_EXPORT:
+        # 1-3) 增量：只解析/细分新追加的人，缓存中的几何直接复用
+        cache = BendCache(BEND_CACHE_PATH, INPUT_JSON_PATH, DIVISION_LENGTH)
+        if cache.load():
+            print(f"读取增量缓存：{cache.records} 条记录，{len(cache.persons)} 个人")
+        new_records, changed = cache.update()
+        sub_points, sub_offsets = cache.bent_geometry()
+        if len(sub_points) == 0:
+            print("未解析到任何线，脚本结束。")
+            return
+        cache.save()
+        BEND_RADIUS = cache.bend[2]
+        print(f"新记录 {new_records} 条，重新细分 {changed} 个人，重新弯曲 {cache.rebent} 个人；"
+              f"scaling_factor = {cache.scaling_factor:.2f}, BEND_RADIUS = {BEND_RADIUS:.2f}")
+    else:
+        # 1) 解析 JSON => 得到 2D 折线 & min_diff_in_height
+        polylines_2d, min_diff_in_height = parse_filtered_json(
+            INPUT_JSON_PATH,
+            x_offset_increment=X_OFFSET_INCREMENT,
+            max_seg_length=MAX_LENGTH
+        )
+
+        if not polylines_2d:
+            print("未解析到任何线，脚本结束。")
+            return
+
+        # 2) 动态计算 BEND_RADIUS
+        #    scaling_factor ∈ [1.5, 2.0]
+        scaling_factor = random.uniform(1.5, 2.0)
+        BEND_RADIUS = scaling_factor * (500.0 - min_diff_in_height)
+        print(f"min_diff_in_height = {min_diff_in_height}, scaling_factor = {scaling_factor:.2f}, BEND_RADIUS = {BEND_RADIUS:.2f}")
+
+        # 3) 焊接共享端点，把两点线段串成长折线
+        strip_mask = None
+        if MERGE_SEGMENTS:
+            polylines_2d, strip_mask, weld_stats = weld_segments(polylines_2d, WELD_TOLERANCE)
+            print(f"焊接：{weld_stats['segments']} 条两点线段 ({weld_stats['unique_segments']} 条不重复)，"
+                  f"{weld_stats['endpoints']} 个端点 -> {weld_stats['welded_vertices']} 个顶点，"
+                  f"串成 {weld_stats['strips']} 条折线")
+
+        # 弯曲到圆柱 (打包成数组，整批计算)
+        points_2d, offsets = pack_polylines(polylines_2d)
+        bent_points = bend_points_to_cylinder(points_2d, BEND_RADIUS)
 
     # 4) 准备输出目录：以时间戳命名的新文件夹
     now_str = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     out_folder = os.path.join(WEB_UPLOADS_FOLDER, now_str)
     os.makedirs(out_folder, exist_ok=True)
     print(f"已创建输出文件夹：{out_folder}")
+    store = UploadStore(WEB_UPLOADS_FOLDER)
 
-    # 5) 复制 "viewer-affiliated" 需要的 splitted JSON (Arduino 输出) 到这个文件夹
+    # 5) 把 "viewer-affiliated" 需要的 splitted JSON (Arduino 输出) 链接到这个文件夹，已上传过的内容不再复制
     if os.path.isdir(ARDUINO_OUTPUT_FOLDER):
         for fname in os.listdir(ARDUINO_OUTPUT_FOLDER):
             if fname.lower().endswith(".json"):
                 src_path = os.path.join(ARDUINO_OUTPUT_FOLDER, fname)
                 dst_path = os.path.join(out_folder, fname)
-                shutil.copy2(src_path, dst_path)
-                print(f"复制 {src_path} -> {dst_path}")
+                store.add_file(src_path, dst_path)
+                print(f"链接 {src_path} -> {dst_path}")
     else:
         print(f"警告：Arduino 输出目录不存在：{ARDUINO_OUTPUT_FOLDER}")
 
-    # 6) 导出“viewer”所需的主 3D JSON
+    # 6) 导出“viewer”所需的主 3D 几何 (JSON 和/或 GLB，见 EXPORT_FORMATS)
+    #    精细版本沿用原文件名，粗糙版本为 *_lod0, *_lod1 ...，另附 LOD 清单
     out_json_path = os.path.join(out_folder, VIEWER_OUTPUT_NAME)
-    export_to_buffergeometry_json(
-        bent_polylines,
-        out_json_path,
-        division_len=DIVISION_LENGTH,
-        flip_z=FLIP_Z_IN_EXPORT
-    )
+    if INCREMENTAL_EXPORT:
+        lods = lods_from_subdivided(
+            sub_points,
+            sub_offsets,
+            division_len=DIVISION_LENGTH,
+            lod_lengths=LOD_DIVISION_LENGTHS,
+            flip_z=FLIP_Z_IN_EXPORT
+        )
+    else:
+        lods = build_lods(
+            bent_points,
+            offsets,
+            division_len=DIVISION_LENGTH,
+            lod_lengths=LOD_DIVISION_LENGTHS,
+            flip_z=FLIP_Z_IN_EXPORT,
+            strip_mask=strip_mask
+        )
+    base, ext = os.path.splitext(out_json_path)
+    lod_files = []
+    for level, (length, vertices, indices) in enumerate(lods):
+        path = out_json_path if level == len(lods) - 1 else f"{base}_lod{level}{ext}"
+        lod_files.append(write_viewer_geometry(vertices, indices, path))
+        print(f"LOD {level}: 采样间距 {length}, {len(vertices)} 个顶点")
+    manifest_path = os.path.join(out_folder, LOD_MANIFEST_NAME)
+    write_lod_manifest(lods, lod_files, manifest_path)
+    for path in [p for files in lod_files for p in files] + [manifest_path]:
+        store.ingest(path)
+
+    # 7) 清理不再被任何上传文件夹引用的对象
+    freed, freed_bytes = store.gc()
+    print(f"上传存储：新写入 {store.stats['written']} 个对象，复用 {store.stats['reused']} 个，"
+          f"清理 {freed} 个未引用对象 ({freed_bytes} 字节)")
+
+    # 8) 记录本次导出耗时到会话数据库
+    sessions = session_store.open_store()
+    if sessions:
+        sessions.add_timing(sessions.session_for_file(INPUT_JSON_PATH), "web_export", time.time() - started, started,
+                            detail=out_folder)
+        sessions.close()
 
     print("全部处理完成！")
 
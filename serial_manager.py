@@ -0,0 +1,173 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+import serial
+
+# ========== SHARED SERIAL CONNECTION MANAGER ==========
+# EVERY ARDUINO RESETS WHEN ITS PORT IS OPENED, SO EACH PORT IS OPENED ONCE PER PROCESS AND REUSED
+# BY ALL STAGES (liner_to_rhino.py, send_to_arduino.py, ...) INSTEAD OF BEING REOPENED FOR EVERY DRAWING.
+# RUN THE STAGES IN ONE PROCESS (main.py RUN_IN_PROCESS = True) TO SHARE THE PORTS ACROSS STAGES.
+
+ARDUINO_RESET_DELAY = 2.0   # SECONDS TO WAIT AFTER OPENING A PORT FOR THE ARDUINO BOOTLOADER
+RECONNECT_ATTEMPTS = 3      # HOW OFTEN A FAILED READ/WRITE REOPENS THE PORT BEFORE GIVING UP
+RECONNECT_BACKOFF = 1.0     # SECONDS BETWEEN RECONNECT ATTEMPTS
+
+_connections = {}
+_registry_lock = threading.Lock()
+
+
+class SerialReconnected(serial.SerialException):
+    """
+    A READ/WRITE FAILED AND THE PORT WAS REOPENED. REOPENING RESETS THE ARDUINO, SO THE CALL IS NOT REPEATED:
+    THE CALLER MUST START ITS EXCHANGE OVER (E.G. send_to_arduino.py RESUMES THE DRAWING FROM THE JOB QUEUE).
+    """
+
+
+class ManagedSerial:
+    """
+    A SERIAL PORT THAT STAYS OPEN, REOPENS ITSELF AFTER AN I/O ERROR (RAISING SerialReconnected) AND SERIALISES ACCESS.
+    USE transaction() TO KEEP OTHER CALLERS OUT DURING A MULTI-LINE EXCHANGE (E.G. COMMAND + "Done").
+    """
+
+    def __init__(self, port, baud_rate, timeout=1, reset_delay=None):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.timeout = timeout
+        self.reset_delay = ARDUINO_RESET_DELAY if reset_delay is None else reset_delay
+        self.lock = threading.RLock()
+        self.opens = 0
+        self._ser = None
+
+    # ----- CONNECTION HANDLING -----
+
+    def open(self):
+        """OPEN THE PORT IF IT IS NOT OPEN YET (RAISES serial.SerialException ON FAILURE)"""
+        with self.lock:
+            if self._ser is not None and self._ser.is_open:
+                return
+            print(f"[SERIAL] OPENING {self.port} (BAUD_RATE {self.baud_rate})...")
+            self._ser = serial.Serial(self.port, self.baud_rate, timeout=self.timeout)
+            time.sleep(self.reset_delay)  # WAIT FOR ARDUINO INITIALIZATION
+            self.opens += 1
+            print(f"[SERIAL] {self.port} READY")
+
+    def close(self):
+        with self.lock:
+            if self._ser is not None:
+                try:
+                    self._ser.close()
+                finally:
+                    self._ser = None
+
+    def reset(self):
+        """CLOSE AND REOPEN THE PORT, WHICH RESETS THE ARDUINO (E.G. TO ABORT A SEQUENCE IT IS STUCK IN)"""
+        with self.lock:
+            print(f"[SERIAL] RESETTING {self.port}...")
+            self.close()
+            self.open()
+
+    def set_timeout(self, timeout):
+        """CHANGE THE DEFAULT READ TIMEOUT, ALSO ON AN ALREADY OPEN PORT"""
+        with self.lock:
+            self.timeout = timeout
+            if self._ser is not None:
+                self._ser.timeout = timeout
+
+    def reconnect(self):
+        with self.lock:
+            self.close()
+            last_error = None
+            for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+                try:
+                    print(f"[SERIAL] RECONNECTING {self.port} (ATTEMPT {attempt})...")
+                    self.open()
+                    return
+                except serial.SerialException as e:
+                    last_error = e
+                    time.sleep(RECONNECT_BACKOFF)
+            raise last_error
+
+    def _call(self, fn):
+        """
+        RUN fn(SERIAL) UNDER THE LOCK. IF IT FAILS THE PORT IS REOPENED FOR THE NEXT CALL AND SerialReconnected IS
+        RAISED: REPLAYING fn ON THE FRESHLY RESET BOARD COULD WAIT FOREVER FOR A REPLY TO A COMMAND IT NEVER GOT.
+        """
+        with self.lock:
+            self.open()
+            try:
+                return fn(self._ser)
+            except (serial.SerialException, OSError) as e:
+                print(f"[SERIAL] I/O ERROR ON {self.port}: {e}")
+                self.reconnect()
+                raise SerialReconnected(f"{self.port} WAS REOPENED AFTER AN I/O ERROR ({e}), THE ARDUINO HAS RESET") from e
+
+    @contextmanager
+    def transaction(self):
+        """HOLD THE PORT FOR A WHOLE REQUEST/RESPONSE EXCHANGE"""
+        with self.lock:
+            yield self
+
+    # ----- pyserial-COMPATIBLE SUBSET -----
+
+    @property
+    def is_open(self):
+        return self._ser is not None and self._ser.is_open
+
+    @property
+    def in_waiting(self):
+        return self._call(lambda s: s.in_waiting)
+
+    def write(self, data):
+        return self._call(lambda s: s.write(data))
+
+    def readline(self, timeout=None):
+        """READ ONE LINE, OPTIONALLY WITH A TIMEOUT THAT DIFFERS FROM THE PORT DEFAULT"""
+        def read(s):
+            if timeout is None or timeout == s.timeout:
+                return s.readline()
+            previous = s.timeout
+            s.timeout = timeout
+            try:
+                return s.readline()
+            finally:
+                s.timeout = previous
+        return self._call(read)
+
+    def reset_input_buffer(self):
+        return self._call(lambda s: s.reset_input_buffer())
+
+
+def get_serial(port, baud_rate=9600, timeout=1, reset_delay=None):
+    """
+    RETURN THE SHARED CONNECTION FOR port, OPENING IT ON FIRST USE.
+    baud_rate AND timeout ARE APPLIED EVEN IF ANOTHER STAGE OPENED THE PORT WITH DIFFERENT VALUES.
+    RAISES serial.SerialException IF THE PORT CANNOT BE OPENED.
+    """
+    with _registry_lock:
+        conn = _connections.get(port)
+        if conn is None:
+            conn = ManagedSerial(port, baud_rate, timeout, reset_delay)
+            _connections[port] = conn
+    with conn.lock:
+        if conn.is_open and conn.baud_rate != baud_rate:
+            conn._ser.baudrate = baud_rate
+        conn.baud_rate = baud_rate
+        if conn.timeout != timeout:
+            conn.set_timeout(timeout)
+        conn.open()
+    return conn
+
+
+def close_all():
+    """CLOSE EVERY MANAGED PORT (CALLED AUTOMATICALLY AT INTERPRETER EXIT)"""
+    with _registry_lock:
+        conns = list(_connections.values())
+        _connections.clear()
+    for conn in conns:
+        conn.close()
+        print(f"[SERIAL] {conn.port} CLOSED")
+
+
+atexit.register(close_all)
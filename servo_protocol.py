@@ -0,0 +1,162 @@
+import json
+import time
+
+# ========== SERVO LINK PROTOCOLS ==========
+# "json":  ONE POINT PER COMMAND, {"x": .., "y": .., "updown": ..}R  (ORIGINAL arm_final.ino PROTOCOL, ~40 BYTES)
+# "batch": MANY POINTS PER FRAME IN FIXED-POINT TEXT WITH AN XOR CHECKSUM, E.G.
+#          P-1000,300,2;-995,305,2*3FR
+#          COORDINATES ARE INTEGERS IN TENTHS (filterV2 ALREADY ROUNDS TO 0.1), UPDOWN IS 0-3.
+#          THE PAYLOAD NEVER CONTAINS 'R', SO THE FIRMWARE CAN KEEP 'R' AS THE TERMINATOR.
+# THE FIRMWARE ACKS EVERY FRAME WITH ONE "N" AFTER ALL ITS POINTS ARE DRAWN, AND REPLIES "E" TO A BAD FRAME.
+
+PROTOCOL_JSON = "json"
+PROTOCOL_BATCH = "batch"
+
+TERMINATOR = "R"
+PROBE = "?" + TERMINATOR              # OLD FIRMWARE ANSWERS "JSON parse error", NEW FIRMWARE ANSWERS "B<max points>"
+BATCH_ERROR = "E"
+
+FIXED_POINT_SCALE = 10                # ONE UNIT = 0.1
+MAX_FRAME_BYTES = 64                  # AVR SERIAL RECEIVE BUFFER
+DEFAULT_MAX_POINTS = 8                # MATCHES MAX_BATCH_POINTS IN arm_final.ino
+
+
+def encode_json_command(point):
+    """ONE POINT IN THE ORIGINAL JSON + 'R' FORMAT"""
+    data = {"x": point["x"], "y": point["y"], "updown": point["updown"]}
+    return json.dumps(data) + TERMINATOR
+
+
+def checksum(payload):
+    """XOR OF ALL PAYLOAD CHARACTERS AS TWO UPPERCASE HEX DIGITS"""
+    value = 0
+    for ch in payload.encode("ascii"):
+        value ^= ch
+    return f"{value:02X}"
+
+
+def _encode_point(point):
+    x = int(round(point["x"] * FIXED_POINT_SCALE))
+    y = int(round(point["y"] * FIXED_POINT_SCALE))
+    return f"{x},{y},{int(point['updown'])}"
+
+
+def encode_batch(points):
+    """ENCODE A LIST OF POINTS INTO ONE BATCH FRAME (STRING, INCLUDING THE 'R' TERMINATOR)"""
+    payload = ";".join(_encode_point(p) for p in points)
+    return "P" + payload + "*" + checksum(payload) + TERMINATOR
+
+
+def decode_batch(frame):
+    """
+    DECODE ONE BATCH FRAME (WITH OR WITHOUT THE TRAILING 'R') BACK INTO POINTS.
+    RAISES ValueError ON A MALFORMED FRAME OR CHECKSUM MISMATCH.
+    """
+    if frame.endswith(TERMINATOR):
+        frame = frame[:-1]
+    if not frame.startswith("P") or "*" not in frame:
+        raise ValueError(f"NOT A BATCH FRAME: {frame!r}")
+    payload, ck = frame[1:].rsplit("*", 1)
+    if checksum(payload) != ck.upper():
+        raise ValueError(f"CHECKSUM MISMATCH IN FRAME: {frame!r}")
+    points = []
+    for item in payload.split(";"):
+        x, y, updown = item.split(",")
+        points.append({
+            "x": int(x) / FIXED_POINT_SCALE,
+            "y": int(y) / FIXED_POINT_SCALE,
+            "updown": int(updown)
+        })
+    return points
+
+
+def split_into_frames(points, max_points=DEFAULT_MAX_POINTS, max_bytes=MAX_FRAME_BYTES):
+    """GREEDILY PACK POINTS INTO FRAMES THAT RESPECT BOTH THE POINT AND THE BYTE LIMIT"""
+    frames = []
+    current = []
+    for point in points:
+        candidate = current + [point]
+        if current and (len(candidate) > max_points or len(encode_batch(candidate)) > max_bytes):
+            frames.append(encode_batch(current))
+            current = [point]
+        else:
+            current = candidate
+    if current:
+        frames.append(encode_batch(current))
+    return frames
+
+
+def encode_commands(points, protocol, max_points=DEFAULT_MAX_POINTS, max_bytes=MAX_FRAME_BYTES):
+    """RETURN THE LIST OF COMMAND STRINGS TO SEND FOR points, ONE ACK IS EXPECTED PER STRING"""
+    if protocol == PROTOCOL_BATCH:
+        return split_into_frames(points, max_points, max_bytes)
+    return [encode_json_command(p) for p in points]
+
+
+def points_in_command(cmd):
+    """NUMBER OF POINTS CARRIED BY ONE ENCODED COMMAND (1 FOR JSON, N FOR A BATCH FRAME)"""
+    if cmd.startswith("P"):
+        return cmd.count(";") + 1
+    return 1
+
+
+def negotiate_protocol(servo_arduino, timeout=5.0):
+    """
+    PROBE THE FIRMWARE. RETURNS (PROTOCOL_BATCH, MAX_POINTS) IF IT UNDERSTANDS BATCH FRAMES,
+    OTHERWISE (PROTOCOL_JSON, 1). THE PROBE IS NOT VALID JSON, SO OLD FIRMWARE DOES NOT MOVE THE ARM.
+    """
+    servo_arduino.write(PROBE.encode())
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        line = servo_arduino.readline().decode(errors="ignore").strip()
+        if not line:
+            continue
+        if line.startswith("B") and line[1:].isdigit():
+            return PROTOCOL_BATCH, int(line[1:])
+        if line == "JSON parse error":
+            return PROTOCOL_JSON, 1
+    return PROTOCOL_JSON, 1
+
+
+# ========== THROUGHPUT BENCHMARK AGAINST THE PTY SERVO EMULATOR ==========
+
+def benchmark(num_points=300, baud_rate=9600):
+    """
+    SEND THE SAME DRAWING WITH BOTH PROTOCOLS TO device_emulator.ServoEmulator AND PRINT POINTS PER SECOND.
+    THE LED BLINKING IS SWITCHED OFF, SO THE RESULT IS WIRE TIME PLUS SERVO STEPPING.
+    """
+    # ONLY NEEDED FOR THE BENCHMARK (pty IS NOT AVAILABLE ON WINDOWS)
+    import serial
+    import device_emulator
+
+    points = [
+        {"x": round(-100 + (i % 250) * 0.7, 1), "y": round(30 + (i * 3.3) % 200, 1), "updown": 1 + i % 3}
+        for i in range(num_points)
+    ]
+    results = {}
+    for supports_batch in (False, True):
+        emulator = device_emulator.ServoEmulator(baud_rate, supports_batch, time_scale=1.0, blink_s=0.0).start()
+        link = serial.Serial(emulator.port, baud_rate, timeout=1)
+
+        protocol, max_points = negotiate_protocol(link)
+        commands = encode_commands(points, protocol, max_points)
+        start = time.perf_counter()
+        total_bytes = 0
+        for cmd in commands:
+            link.write(cmd.encode())
+            total_bytes += len(cmd)
+            while link.readline().decode(errors="ignore").strip() != "N":
+                pass
+        elapsed = time.perf_counter() - start
+
+        link.close()
+        emulator.stop()
+        results[protocol] = elapsed
+        print(f"[BENCH] {protocol:5s}: {len(commands):4d} COMMANDS, {total_bytes:6d} BYTES, "
+              f"{elapsed:6.2f}S, {num_points / elapsed:7.1f} POINTS/S")
+
+    print(f"[BENCH] BATCH SPEEDUP: {results[PROTOCOL_JSON] / results[PROTOCOL_BATCH]:.1f}X")
+
+
+if __name__ == "__main__":
+    benchmark()
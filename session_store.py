@@ -0,0 +1,474 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# ========== SQLITE SESSION STORE ==========
+# THE JSON FILES OF THE PIPELINE ARE OVERWRITTEN BY EVERY RUN AND send_to_arduino.py DELETES THE DRAWINGS IT HAS
+# FINISHED. EVERY STAGE THEREFORE ALSO WRITES WHAT IT PRODUCED INTO ONE LOCAL SQLITE DATABASE:
+#   sessions   ONE ROW PER CAPTURE SESSION
+#   persons    ONE ROW PER CAPTURED PERSON (person_index IS THE N OF converted_output_N.json)
+#   records    THE SESSION FILE RECORDS PER STAGE ("raw" = time_axis_contours.json, "filtered" = filterV1 OUTPUT),
+#              STORED AS JSON WITH EVERY POINT LIST REPLACED BY {"$contour": SLOT}
+#   contours   THE POINT LISTS OF A RECORD AS BLOBS OF PACKED float64 (x, y) PAIRS
+#   drawings   THE COMMAND LIST OF EVERY converted_output_N.json (UPDATED BY command_optimizer.py, drawn_at BY
+#              send_to_arduino.py), PACKED AS (x float64, y float64, updown int8)
+#   timings    HOW LONG EACH STAGE TOOK (PER SESSION / PERSON)
+#   session_files  THE SESSION FILES A STAGE WROTE (PATH + SHA-1 OF THE CONTENT): THE NEXT STAGE LOOKS UP THE SESSION
+#              OF ITS INPUT FILE BY ITS CONTENT, NOT "THE NEWEST SESSION", WHICH MAY BE A CAPTURE STILL RUNNING
+# ALL TABLES ARE INDEXED BY SESSION, TIME AND PERSON, SO RE-RENDERING OR REPRINTING AN OLD VISITOR IS ONE LOOKUP:
+#   python session_store.py persons                   LIST THE MOST RECENT PERSONS
+#   python session_store.py reprint PERSON_ID         WRITE THE PERSON'S DRAWING BACK INTO arduino_input/
+#   python session_store.py export PERSON_ID OUT.json WRITE THE PERSON'S FILTERED RECORDS (INPUT FOR send_to_web.py)
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+STORE_ENABLED = True                                           # False: STAGES SKIP THE DATABASE ENTIRELY
+SESSION_STORE_PATH = os.path.join(base_dir, "sessions.sqlite3")
+ARDUINO_INPUT_DIR = os.path.join(base_dir, "arduino_input")
+BUSY_TIMEOUT_S = 30.0                                          # OTHER STAGES MAY BE WRITING AT THE SAME TIME
+FINGERPRINT_CHUNK_BYTES = 1 << 20
+
+STAGE_RAW = "raw"
+STAGE_FILTERED = "filtered"
+
+POINT_DTYPE = np.dtype("<f8")
+COMMAND_DTYPE = np.dtype([("x", "<f8"), ("y", "<f8"), ("updown", "i1")])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_by_time ON sessions(started_at);
+
+CREATE TABLE IF NOT EXISTS persons (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    person_index INTEGER NOT NULL,
+    captured_at REAL NOT NULL,
+    height_range REAL,
+    UNIQUE (session_id, person_index)
+);
+CREATE INDEX IF NOT EXISTS persons_by_time ON persons(captured_at);
+
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    person_id INTEGER REFERENCES persons(id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    type TEXT,
+    skeleton TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_by_session ON records(session_id, stage, seq);
+CREATE INDEX IF NOT EXISTS records_by_person ON records(person_id, stage, seq);
+
+CREATE TABLE IF NOT EXISTS contours (
+    record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+    slot INTEGER NOT NULL,
+    point_count INTEGER NOT NULL,
+    points BLOB NOT NULL,
+    extra TEXT,
+    PRIMARY KEY (record_id, slot)
+);
+
+CREATE TABLE IF NOT EXISTS drawings (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    person_id INTEGER REFERENCES persons(id) ON DELETE SET NULL,
+    file_name TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    command_count INTEGER NOT NULL,
+    commands BLOB NOT NULL,
+    optimised INTEGER NOT NULL DEFAULT 0,
+    drawn_at REAL,
+    UNIQUE (session_id, file_name)
+);
+CREATE INDEX IF NOT EXISTS drawings_by_person ON drawings(person_id);
+CREATE INDEX IF NOT EXISTS drawings_by_file ON drawings(file_name, created_at);
+CREATE INDEX IF NOT EXISTS drawings_by_time ON drawings(drawn_at);
+
+CREATE TABLE IF NOT EXISTS timings (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER REFERENCES sessions(id) ON DELETE CASCADE,
+    person_id INTEGER REFERENCES persons(id) ON DELETE SET NULL,
+    stage TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    seconds REAL NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS timings_by_session ON timings(session_id, stage);
+CREATE INDEX IF NOT EXISTS timings_by_time ON timings(started_at);
+
+CREATE TABLE IF NOT EXISTS session_files (
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    written_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS session_files_by_path ON session_files(path, fingerprint, written_at);
+"""
+
+
+# ----- PACKING -----
+
+def _is_point_list(value):
+    return (isinstance(value, list) and len(value) > 0
+            and all(isinstance(p, dict) and "x" in p and "y" in p for p in value))
+
+
+def pack_points(points):
+    """[{"x", "y", ...}, ...] -> (BLOB, EXTRA JSON OR None). OTHER KEYS (E.G. "index") GO INTO EXTRA AS COLUMNS"""
+    blob = np.array([(p["x"], p["y"]) for p in points], dtype=POINT_DTYPE).tobytes()
+    keys = list(dict.fromkeys(k for p in points for k in p))
+    if keys == ["x", "y"]:
+        return blob, None
+    columns = {k: [p.get(k) for p in points] for k in keys if k not in ("x", "y")}
+    return blob, json.dumps({"keys": keys, "columns": columns}, separators=(",", ":"))
+
+
+def unpack_points(blob, extra):
+    xy = np.frombuffer(blob, dtype=POINT_DTYPE).reshape(-1, 2).tolist()
+    if extra is None:
+        return [{"x": x, "y": y} for x, y in xy]
+    extra = json.loads(extra)
+    columns = extra["columns"]
+    points = []
+    for i, (x, y) in enumerate(xy):
+        # THE ORIGINAL KEY ORDER, E.G. {"index", "x", "y"} FOR FACIAL FEATURE POINTS
+        points.append({k: x if k == "x" else y if k == "y" else columns[k][i] for k in extra["keys"]})
+    return points
+
+
+def split_record(item):
+    """RETURN (SKELETON, [POINT LISTS]): EVERY POINT LIST IN THE RECORD IS REPLACED BY {"$contour": SLOT}"""
+    contours = []
+
+    def walk(value):
+        if _is_point_list(value):
+            contours.append(value)
+            return {"$contour": len(contours) - 1}
+        if isinstance(value, dict):
+            return {k: walk(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [walk(v) for v in value]
+        return value
+
+    return walk(item), contours
+
+
+def join_record(skeleton, contours):
+    def walk(value):
+        if isinstance(value, dict):
+            if len(value) == 1 and "$contour" in value:
+                return contours[value["$contour"]]
+            return {k: walk(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [walk(v) for v in value]
+        return value
+
+    return walk(skeleton)
+
+
+def pack_commands(commands):
+    packed = np.zeros(len(commands), dtype=COMMAND_DTYPE)
+    for i, c in enumerate(commands):
+        packed[i] = (c["x"], c["y"], c["updown"])
+    return packed.tobytes()
+
+
+def unpack_commands(blob):
+    return [{"x": float(x), "y": float(y), "updown": int(u)} for x, y, u in np.frombuffer(blob, dtype=COMMAND_DTYPE)]
+
+
+def file_fingerprint(path):
+    """SHA-1 OF THE WHOLE FILE, IDENTIFIES WHICH SESSION'S CONTENT A PIPELINE FILE CURRENTLY HOLDS"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(FINGERPRINT_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_persons(records):
+    """
+    (PERSON INDEX, RECORD) FOR EVERY RECORD OF A SESSION FILE: A "contour" RECORD STARTS THE NEXT PERSON, THE
+    FOLLOWING RECORDS (full_contour, facial_features, ...) BELONG TO IT, 0 BEFORE THE FIRST "contour".
+    liner_to_rhino.py, filterV2.py (THE N OF converted_output_N.json) AND write_records() ALL NUMBER PERSONS SO.
+    """
+    person_index = 0
+    for item in records:
+        if item.get("type") == "contour":
+            person_index += 1
+        yield person_index, item
+
+
+# ----- STORE -----
+
+class SessionStore:
+    def __init__(self, path=SESSION_STORE_PATH):
+        self.path = path
+        # send_to_arduino.py DRAWS AND ROLLS IN WORKER THREADS, ALL ACCESS GOES THROUGH self.lock
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ----- SESSIONS AND PERSONS -----
+
+    def begin_session(self, source=None, started_at=None):
+        with self.lock, self.conn:
+            cur = self.conn.execute("INSERT INTO sessions (started_at, source) VALUES (?, ?)",
+                                    (started_at or time.time(), source))
+        return cur.lastrowid
+
+    def register_file(self, session_id, path):
+        """REMEMBER THAT THE FILE AT path, WITH ITS CURRENT CONTENT, WAS WRITTEN FOR session_id"""
+        fingerprint = file_fingerprint(path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO session_files (session_id, path, fingerprint, written_at) VALUES (?, ?, ?, ?)",
+                (session_id, os.path.abspath(path), fingerprint, time.time()))
+
+    def session_for_file(self, path):
+        """
+        THE SESSION WHOSE STAGE WROTE THE FILE AT path AS IT IS NOW (SEE register_file()). A FILE NO STAGE
+        REGISTERED, E.G. A SESSION FILE COPIED IN BY HAND, STARTS A NEW SESSION (REGISTERED UNDER IT).
+        """
+        path = os.path.abspath(path)
+        fingerprint = file_fingerprint(path)
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT session_id FROM session_files WHERE path = ? AND fingerprint = ? "
+                "ORDER BY written_at DESC LIMIT 1", (path, fingerprint)).fetchone()
+            if row:
+                return row[0]
+            now = time.time()
+            session_id = self.conn.execute("INSERT INTO sessions (started_at, source) VALUES (?, ?)",
+                                           (now, path)).lastrowid
+            self.conn.execute(
+                "INSERT INTO session_files (session_id, path, fingerprint, written_at) VALUES (?, ?, ?, ?)",
+                (session_id, path, fingerprint, now))
+        return session_id
+
+    def _person_id(self, session_id, person_index, height_range=None):
+        """CALLER HOLDS THE TRANSACTION"""
+        row = self.conn.execute("SELECT id FROM persons WHERE session_id = ? AND person_index = ?",
+                                (session_id, person_index)).fetchone()
+        if row is None:
+            return self.conn.execute(
+                "INSERT INTO persons (session_id, person_index, captured_at, height_range) VALUES (?, ?, ?, ?)",
+                (session_id, person_index, time.time(), height_range)).lastrowid
+        if height_range is not None:
+            self.conn.execute("UPDATE persons SET height_range = ? WHERE id = ?", (height_range, row[0]))
+        return row[0]
+
+    def persons(self, session_id=None, limit=50):
+        """MOST RECENT PERSONS FIRST: DICTS WITH id, session_id, person_index, captured_at, height_range, drawn_at"""
+        query = ("SELECT p.id, p.session_id, p.person_index, p.captured_at, p.height_range, MAX(d.drawn_at) "
+                 "FROM persons p LEFT JOIN drawings d ON d.person_id = p.id ")
+        args = ()
+        if session_id is not None:
+            query += "WHERE p.session_id = ? "
+            args = (session_id,)
+        query += "GROUP BY p.id ORDER BY p.captured_at DESC LIMIT ?"
+        keys = ("id", "session_id", "person_index", "captured_at", "height_range", "drawn_at")
+        with self.lock:
+            return [dict(zip(keys, row)) for row in self.conn.execute(query, args + (limit,))]
+
+    # ----- SESSION FILE RECORDS -----
+
+    def write_records(self, session_id, stage, records):
+        """
+        REPLACE THE RECORDS OF ONE STAGE OF A SESSION. A "contour" RECORD STARTS THE NEXT PERSON, THE FOLLOWING
+        RECORDS (full_contour, facial_features, ...) BELONG TO IT. RETURNS THE NUMBER OF PERSONS.
+        """
+        person_index = 0
+        person_id = None
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM records WHERE session_id = ? AND stage = ?", (session_id, stage))
+            for seq, (person_index, item) in enumerate(iter_persons(records)):
+                if item.get("type") == "contour":
+                    hi = item.get("height_info") or {}
+                    height = (hi["max_y"] - hi["min_y"]
+                              if hi.get("max_y") is not None and hi.get("min_y") is not None else None)
+                    person_id = self._person_id(session_id, person_index, height)
+                skeleton, contours = split_record(item)
+                record_id = self.conn.execute(
+                    "INSERT INTO records (session_id, person_id, stage, seq, type, skeleton) VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, person_id, stage, seq, item.get("type"), json.dumps(skeleton, separators=(",", ":")))
+                ).lastrowid
+                self.conn.executemany(
+                    "INSERT INTO contours (record_id, slot, point_count, points, extra) VALUES (?, ?, ?, ?, ?)",
+                    [(record_id, slot, len(points), *pack_points(points)) for slot, points in enumerate(contours)])
+        return person_index
+
+    def _read_records(self, where, args):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT r.id, r.skeleton, c.slot, c.points, c.extra FROM records r "
+                "LEFT JOIN contours c ON c.record_id = r.id "
+                f"WHERE {where} ORDER BY r.seq, c.slot", args).fetchall()
+        records = []
+        current_id = None
+        skeleton = contours = None
+        for record_id, skel, slot, points, extra in rows:
+            if record_id != current_id:
+                if current_id is not None:
+                    records.append(join_record(skeleton, contours))
+                current_id, skeleton, contours = record_id, json.loads(skel), []
+            if slot is not None:
+                contours.append(unpack_points(points, extra))
+        if current_id is not None:
+            records.append(join_record(skeleton, contours))
+        return records
+
+    def session_records(self, session_id, stage=STAGE_FILTERED):
+        return self._read_records("r.session_id = ? AND r.stage = ?", (session_id, stage))
+
+    def person_records(self, person_id, stage=STAGE_FILTERED):
+        """THE RECORDS OF ONE PERSON, E.G. TO RE-RENDER IT (ONE INDEXED LOOKUP ON records_by_person)"""
+        return self._read_records("r.person_id = ? AND r.stage = ?", (person_id, stage))
+
+    # ----- DRAWINGS -----
+
+    def put_drawing(self, session_id, file_name, commands, person_index=None):
+        with self.lock, self.conn:
+            person_id = self._person_id(session_id, person_index) if person_index is not None else None
+            self.conn.execute(
+                "INSERT INTO drawings (session_id, person_id, file_name, created_at, command_count, commands) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (session_id, file_name) DO UPDATE SET "
+                "person_id = excluded.person_id, created_at = excluded.created_at, "
+                "command_count = excluded.command_count, commands = excluded.commands, optimised = 0, drawn_at = NULL",
+                (session_id, person_id, file_name, time.time(), len(commands), pack_commands(commands)))
+
+    def update_drawing(self, session_id, file_name, commands, optimised=True):
+        with self.lock, self.conn:
+            cur = self.conn.execute(
+                "UPDATE drawings SET command_count = ?, commands = ?, optimised = ? "
+                "WHERE session_id = ? AND file_name = ?",
+                (len(commands), pack_commands(commands), int(optimised), session_id, file_name))
+        return cur.rowcount > 0
+
+    def drawing_session(self, file_name, commands):
+        """
+        THE SESSION OF A converted_output_N.json: THE NEWEST STORED DRAWING WITH THIS FILE NAME AND EXACTLY THESE
+        COMMANDS (EVERY SESSION REUSES THE FILE NAMES). None IF THE FILE IS NOT IN THE STORE, E.G. A REPRINT.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT session_id FROM drawings WHERE file_name = ? AND commands = ? ORDER BY created_at DESC LIMIT 1",
+                (file_name, pack_commands(commands))).fetchone()
+        return row[0] if row else None
+
+    def mark_drawn(self, session_id, file_name, drawn_at=None):
+        with self.lock, self.conn:
+            cur = self.conn.execute("UPDATE drawings SET drawn_at = ? WHERE session_id = ? AND file_name = ?",
+                                    (drawn_at or time.time(), session_id, file_name))
+        return cur.rowcount > 0
+
+    def person_drawing(self, person_id):
+        """THE LATEST COMMAND LIST DRAWN FOR A PERSON, None IF THERE IS NONE (ONE LOOKUP ON drawings_by_person)"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT commands FROM drawings WHERE person_id = ? ORDER BY created_at DESC LIMIT 1",
+                (person_id,)).fetchone()
+        return unpack_commands(row[0]) if row else None
+
+    def drawing_blobs(self, session_id=None):
+        """(SESSION ID, FILE NAME, PACKED COMMANDS) OF EVERY STORED DRAWING, OLDEST FIRST (drawing_rasteriser.py)"""
+        query = "SELECT session_id, file_name, commands FROM drawings "
+        args = ()
+        if session_id is not None:
+            query += "WHERE session_id = ? "
+            args = (session_id,)
+        with self.lock:
+            return self.conn.execute(query + "ORDER BY session_id, created_at", args).fetchall()
+
+    # ----- TIMINGS -----
+
+    def add_timing(self, session_id, stage, seconds, started_at=None, person_index=None, detail=None):
+        with self.lock, self.conn:
+            person_id = self._person_id(session_id, person_index) if person_index is not None else None
+            self.conn.execute(
+                "INSERT INTO timings (session_id, person_id, stage, started_at, seconds, detail) VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, person_id, stage, started_at or time.time() - seconds, seconds, detail))
+
+    def stage_timings(self, session_id):
+        """{STAGE: (RUNS, TOTAL SECONDS)} FOR ONE SESSION"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT stage, COUNT(*), SUM(seconds) FROM timings WHERE session_id = ? GROUP BY stage",
+                (session_id,)).fetchall()
+        return {stage: (count, total) for stage, count, total in rows}
+
+
+def open_store(path=SESSION_STORE_PATH):
+    """
+    THE STORE FOR A STAGE SCRIPT, OR None IF IT IS DISABLED OR CANNOT BE OPENED.
+    THE DATABASE IS A RECORD OF THE INSTALLATION, NOT PART OF IT: A STAGE KEEPS WORKING WITHOUT IT.
+    """
+    if not STORE_ENABLED:
+        return None
+    try:
+        return SessionStore(path)
+    except sqlite3.Error as e:
+        print(f"[STORE] CANNOT OPEN {path}: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LOOK UP, REPRINT OR EXPORT EARLIER VISITORS")
+    parser.add_argument("--db", default=SESSION_STORE_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_persons = sub.add_parser("persons", help="LIST THE MOST RECENT PERSONS")
+    p_persons.add_argument("--session", type=int)
+    p_persons.add_argument("--limit", type=int, default=50)
+    p_reprint = sub.add_parser("reprint", help="WRITE A PERSON'S DRAWING INTO arduino_input/ FOR send_to_arduino.py")
+    p_reprint.add_argument("person_id", type=int)
+    p_reprint.add_argument("--out-dir", default=ARDUINO_INPUT_DIR)
+    p_export = sub.add_parser("export", help="WRITE A PERSON'S RECORDS AS A SESSION FILE")
+    p_export.add_argument("person_id", type=int)
+    p_export.add_argument("output")
+    p_export.add_argument("--stage", default=STAGE_FILTERED, choices=(STAGE_RAW, STAGE_FILTERED))
+    args = parser.parse_args()
+
+    store = SessionStore(args.db)
+    try:
+        if args.command == "persons":
+            for p in store.persons(args.session, args.limit):
+                captured = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(p["captured_at"]))
+                drawn = "DRAWN" if p["drawn_at"] else "NOT DRAWN"
+                print(f"PERSON {p['id']:>5}  SESSION {p['session_id']:>4}  #{p['person_index']:<3} {captured}  {drawn}")
+        elif args.command == "reprint":
+            commands = store.person_drawing(args.person_id)
+            if commands is None:
+                print(f"[STORE] NO DRAWING STORED FOR PERSON {args.person_id}")
+                return
+            os.makedirs(args.out_dir, exist_ok=True)
+            path = os.path.join(args.out_dir, f"reprint_person_{args.person_id}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(commands, f, ensure_ascii=False, indent=2)
+            print(f"[STORE] {len(commands)} COMMANDS WRITTEN TO {path}, RUN send_to_arduino.py TO DRAW THEM")
+        elif args.command == "export":
+            records = store.person_records(args.person_id, args.stage)
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(records, f, indent=4)
+            print(f"[STORE] {len(records)} RECORDS WRITTEN TO {args.output}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
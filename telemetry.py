@@ -0,0 +1,174 @@
+import json
+import math
+import os
+import threading
+import time
+
+# ========== SERIAL I/O TELEMETRY ==========
+# COUNTS BYTES ON THE SERVO LINK, MEASURES THE ROUND TRIP FROM WRITING A COMMAND TO ITS "N",
+# AND TIMES EVERY FILE AND EVERY PAPER ROLL. THE SUMMARY IS WRITTEN AS A MACHINE-READABLE JSON REPORT.
+
+# UPPER BOUNDS (MS) OF THE ACK ROUND-TRIP HISTOGRAM BUCKETS, THE LAST BUCKET COLLECTS EVERYTHING ABOVE
+RTT_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+SERIAL_BITS_PER_BYTE = 10   # 8N1
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, value):
+        index = len(self.bounds)
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """UPPER BOUND OF THE BUCKET CONTAINING THE q-TH PERCENTILE (THE MAX FOR THE OVERFLOW BUCKET)"""
+        if not self.total:
+            return None
+        rank = q / 100.0 * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.total,
+            "min": round(self.min, 3) if self.total else None,
+            "max": round(self.max, 3) if self.total else None,
+            "mean": round(self.sum / self.total, 3) if self.total else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+class SerialTelemetry:
+    """
+    THREAD-SAFE COUNTERS FOR THE SERVO AND MOTOR LINKS.
+    log_every CONTROLS THE VERBOSE PER-COMMAND OUTPUT: 0 = OFF, 1 = EVERY COMMAND, N = EVERY N-TH COMMAND.
+    """
+
+    def __init__(self, baud_rate=9600, log_every=1):
+        self.baud_rate = baud_rate
+        self.log_every = log_every
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.commands = 0
+        self.acks = 0
+        self.nacks = 0
+        self.rtt_ms = Histogram(RTT_BUCKETS_MS)
+        self.files = []
+        self.rolls = []
+        self._open_files = {}
+        self._log_counters = {}    # ONE PER KIND, SO LOCKSTEP COMMAND/REPLY TRAFFIC IS SAMPLED FOR BOTH KINDS
+
+    # ----- SAMPLED LOGGING -----
+
+    def log(self, message, kind="message"):
+        """PRINT message FOR EVERY log_every-TH CALL OF THE SAME kind (E.G. "command", "reply", "debug")"""
+        if self.log_every <= 0:
+            return
+        with self.lock:
+            count = self._log_counters.get(kind, 0)
+            self._log_counters[kind] = count + 1
+            show = count % self.log_every == 0
+        if show:
+            print(message)
+
+    # ----- SERVO LINK -----
+
+    def command_sent(self, num_bytes):
+        """RETURN A TIMESTAMP TO PASS TO ack_received()"""
+        with self.lock:
+            self.bytes_sent += num_bytes
+            self.commands += 1
+        return time.monotonic()
+
+    def line_received(self, num_bytes):
+        with self.lock:
+            self.bytes_received += num_bytes
+
+    def ack_received(self, sent_at, ok=True):
+        rtt = (time.monotonic() - sent_at) * 1000.0
+        with self.lock:
+            self.rtt_ms.add(rtt)
+            if ok:
+                self.acks += 1
+            else:
+                self.nacks += 1
+
+    # ----- FILES AND ROLLS -----
+
+    def file_started(self, name):
+        with self.lock:
+            self._open_files[name] = (time.monotonic(), self.commands, self.bytes_sent)
+
+    def file_finished(self, name, points):
+        with self.lock:
+            if name not in self._open_files:
+                return
+            start, commands, sent = self._open_files.pop(name)
+            self.files.append({
+                "file": name,
+                "points": points,
+                "commands": self.commands - commands,
+                "bytes_sent": self.bytes_sent - sent,
+                "seconds": round(time.monotonic() - start, 3)
+            })
+
+    def roll_finished(self, seconds):
+        with self.lock:
+            self.rolls.append(round(seconds, 3))
+
+    # ----- REPORT -----
+
+    def report(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            wire_seconds = (self.bytes_sent + self.bytes_received) * SERIAL_BITS_PER_BYTE / self.baud_rate
+            return {
+                "elapsed_s": round(elapsed, 3),
+                "baud_rate": self.baud_rate,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "commands": self.commands,
+                "acks": self.acks,
+                "nacks": self.nacks,
+                "bytes_per_s": round(self.bytes_sent / elapsed, 1) if elapsed > 0 else None,
+                # SHARE OF THE RUN DURING WHICH THE 9600-BAUD LINK WAS ACTUALLY BUSY
+                "link_utilisation": round(wire_seconds / elapsed, 4) if elapsed > 0 else None,
+                "ack_rtt_ms": self.rtt_ms.to_dict(),
+                "files": list(self.files),
+                "motor_rolls": {"count": len(self.rolls), "total_s": round(sum(self.rolls), 3), "each_s": list(self.rolls)}
+            }
+
+    def write_report(self, path):
+        report = self.report()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, path)
+        print(f"[TELEMETRY] {report['commands']} COMMANDS, {report['bytes_sent']} BYTES SENT, "
+              f"LINK {100 * (report['link_utilisation'] or 0):.1f}% BUSY, "
+              f"ACK RTT P50 {report['ack_rtt_ms']['p50']} MS, REPORT SAVED TO {path}")
+        return report
@@ -0,0 +1,118 @@
+import argparse
+import math
+
+from record_stream import JsonArrayWriter, iter_records
+
+# ========== RUN-LENGTH ENCODED TIME AXIS ==========
+# liner_to_rhino.py USED TO APPEND ONE {"type": "line", "x": X, "y": 0} RECORD PER frame_interval. THE TICKS ARE NOW
+# STORED AS RUNS, ONE RECORD PER STRETCH OF TICKS BETWEEN TWO CAPTURES:
+#   {"type": "line_run", "start": T0, "interval": DT, "count": N, "x": X0, "speed": DX, "y": 0}
+# TICK i (0 <= i < N) HAPPENED AT T0 + i * DT (SECONDS SINCE CAPTURE START) AT x = X0 + i * DX.
+# CONSUMERS THAT REALLY NEED ONE RECORD PER TICK USE iter_expanded(), WHICH EXPANDS THE RUNS LAZILY.
+#
+# THE CAPTURE LOOP EXTENDS THE LAST RUN IN PLACE, SO A TRAILING line_run IN A SESSION FILE CAN STILL CHANGE.
+# INCREMENTAL READERS (filterV1 --incremental, preview_server.py, send_to_web.BendCache) THEREFORE NEVER
+# CHECKPOINT PAST A TRAILING RUN, SEE iter_settled() / is_provisional().
+
+LINE_TYPE = "line"
+LINE_RUN_TYPE = "line_run"
+X_TOLERANCE = 1e-9
+
+
+def is_provisional(item):
+    """A line_run MAY STILL GROW WHILE IT IS THE LAST RECORD OF THE FILE"""
+    return isinstance(item, dict) and item.get("type") == LINE_RUN_TYPE
+
+
+def append_tick(records, t, x, interval, y=0):
+    """
+    RECORD ONE TICK AT TIME t AND POSITION x: EXTEND THE LAST RECORD IF IT IS A RUN THAT THIS TICK CONTINUES
+    (SAME SPACING IN x), OTHERWISE START A NEW RUN. RETURNS THE RUN THAT HOLDS THE TICK.
+    """
+    last = records[-1] if records else None
+    if is_provisional(last) and last["y"] == y:
+        if last["count"] == 1:
+            last["speed"] = x - last["x"]
+            last["count"] = 2
+            return last
+        if math.isclose(last["x"] + last["speed"] * last["count"], x, abs_tol=X_TOLERANCE):
+            last["count"] += 1
+            return last
+    run = {"type": LINE_RUN_TYPE, "start": round(t, 3), "interval": interval, "count": 1, "x": x, "speed": 0, "y": y}
+    records.append(run)
+    return run
+
+
+def expand_run(run):
+    """YIELD THE {"type": "line"} RECORDS OF ONE RUN, ONE BY ONE"""
+    for i in range(run["count"]):
+        yield {"type": LINE_TYPE, "x": run["x"] + run["speed"] * i, "y": run["y"]}
+
+
+def iter_expanded(records):
+    """ITERATE records WITH EVERY line_run REPLACED BY ITS PER-TICK line RECORDS (NOTHING IS MATERIALISED)"""
+    for item in records:
+        if is_provisional(item):
+            yield from expand_run(item)
+        else:
+            yield item
+
+
+def iter_compacted(records, interval=1.0):
+    """
+    THE INVERSE FOR OLD SESSION FILES: CONSECUTIVE line RECORDS BECOME line_run RECORDS.
+    OLD FILES HAVE NO TIMESTAMPS, SO TICK i IS ASSUMED TO BE AT i * interval.
+    """
+    ticks = 0
+    run = []
+    for item in records:
+        if isinstance(item, dict) and item.get("type") == LINE_TYPE:
+            append_tick(run, ticks * interval, item.get("x", 0), interval, item.get("y", 0))
+            ticks += 1
+            while len(run) > 1:
+                yield run.pop(0)
+            continue
+        if is_provisional(item):
+            ticks += item["count"]
+        yield from run
+        run = []
+        yield item
+    yield from run
+
+
+def iter_settled(records_with_offsets):
+    """
+    WRAP AN iter_records_with_offsets() STREAM FOR INCREMENTAL READERS: YIELD (RECORD, END_OFFSET) AS USUAL, BUT HOLD
+    BACK A line_run UNTIL ANOTHER RECORD FOLLOWS IT. A TRAILING RUN IS NEVER YIELDED, SO THE CALLER'S CHECKPOINT
+    STAYS IN FRONT OF IT AND IT IS READ AGAIN (POSSIBLY LONGER) NEXT TIME.
+    """
+    pending = None
+    for item, end in records_with_offsets:
+        if pending is not None:
+            yield pending
+            pending = None
+        if is_provisional(item):
+            pending = (item, end)
+        else:
+            yield item, end
+
+
+def main():
+    """CONVERT AN OLD SESSION FILE WITH ONE line RECORD PER TICK TO line_run RECORDS (OR BACK WITH --expand)"""
+    parser = argparse.ArgumentParser(description="RUN-LENGTH ENCODE THE TIME AXIS OF A SESSION FILE")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--interval", type=float, default=1.0, help="frame_interval OF THE OLD CAPTURE (SECONDS)")
+    parser.add_argument("--expand", action="store_true", help="WRITE ONE line RECORD PER TICK INSTEAD")
+    args = parser.parse_args()
+
+    records = iter_records(args.input)
+    records = iter_expanded(records) if args.expand else iter_compacted(records, args.interval)
+    with JsonArrayWriter(args.output) as writer:
+        for item in records:
+            writer.write(item)
+    print(f"WROTE {writer.count} RECORDS TO {args.output}")
+
+
+if __name__ == "__main__":
+    main()
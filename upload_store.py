@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+# ========== CONTENT-ADDRESSED UPLOAD STORE ==========
+# EVERY FILE THAT send_to_web.py PUBLISHES IS STORED ONCE UNDER <uploads>/.objects/<2 HEX>/<SHA-256>,
+# THE TIMESTAMPED UPLOAD FOLDERS ONLY CONTAIN LINKS TO THOSE OBJECTS:
+#   1) HARD LINK (SAME VOLUME, NO EXTRA SPACE, THE WEB SERVER SEES A NORMAL FILE)
+#   2) RELATIVE SYMBOLIC LINK (IF HARD LINKS ARE NOT SUPPORTED)
+#   3) PLAIN COPY (E.G. WINDOWS WITHOUT SYMLINK PRIVILEGE)
+# LINKED FILES SHARE THEIR CONTENT, SO THEY MUST NEVER BE EDITED IN PLACE.
+# gc() DELETES OBJECTS THAT NO UPLOAD FOLDER REFERENCES ANY MORE (E.G. AFTER OLD FOLDERS WERE REMOVED), BUT ONLY
+# ONCE THEY ARE GC_GRACE_SECONDS OLD: ANOTHER send_to_web.py MAY BE BETWEEN put_file() AND link() (A REUSED OBJECT
+# IS TOUCHED BY put_file(), SO IT COUNTS AS NEW AGAIN).
+# A PLAIN COPY SHARES NO INODE WITH ITS OBJECT, SO EVERY FOLDER RECORDS ITS COPIES IN COPY_MANIFEST_NAME
+# ({FILE NAME: DIGEST}), WHICH gc() READS AS REFERENCES TOO.
+
+OBJECTS_DIR_NAME = ".objects"
+COPY_MANIFEST_NAME = ".upload_copies.json"
+HASH_CHUNK_SIZE = 1 << 20
+GC_GRACE_SECONDS = 3600.0   # UNREFERENCED OBJECTS AND LEFTOVER .tmp FILES YOUNGER THAN THIS ARE KEPT
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class UploadStore:
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, OBJECTS_DIR_NAME)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.stats = {"written": 0, "reused": 0, "hardlinks": 0, "symlinks": 0, "copies": 0}
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    # ----- WRITING -----
+
+    def put_file(self, src_path, move=False):
+        """
+        STORE THE CONTENT OF src_path, RETURN ITS DIGEST. ALREADY KNOWN CONTENT IS NOT WRITTEN AGAIN.
+        move=True MOVES A FRESHLY GENERATED FILE INTO THE STORE INSTEAD OF COPYING IT.
+        """
+        digest = file_digest(src_path)
+        obj = self.object_path(digest)
+        if os.path.exists(obj):
+            os.utime(obj)   # RESTART THE GC GRACE PERIOD, THE CALLER IS ABOUT TO LINK IT
+            self.stats["reused"] += 1
+            if move:
+                os.remove(src_path)
+            return digest
+
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        if move:
+            try:
+                os.replace(src_path, obj)
+                self.stats["written"] += 1
+                return digest
+            except OSError:
+                pass  # DIFFERENT VOLUME, FALL BACK TO A COPY
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(obj), suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, obj)
+        if move:
+            os.remove(src_path)
+        self.stats["written"] += 1
+        return digest
+
+    def link(self, digest, dst_path):
+        """MAKE dst_path SHOW THE OBJECT digest (HARD LINK -> SYMLINK -> COPY), FileNotFoundError IF IT IS GONE"""
+        obj = self.object_path(digest)
+        if not os.path.isfile(obj):
+            # NO FALLBACK: A SYMLINK TO IT WOULD DANGLE
+            raise FileNotFoundError(f"UPLOAD STORE OBJECT {digest} DOES NOT EXIST (REMOVED BY gc()?)")
+        if os.path.lexists(dst_path):
+            os.remove(dst_path)
+        try:
+            os.link(obj, dst_path)
+            self.stats["hardlinks"] += 1
+            self._record_copy(dst_path, None)
+            return
+        except (OSError, AttributeError, NotImplementedError):
+            pass
+        try:
+            os.symlink(os.path.relpath(obj, os.path.dirname(os.path.abspath(dst_path))), dst_path)
+            self.stats["symlinks"] += 1
+            self._record_copy(dst_path, None)
+            return
+        except (OSError, AttributeError, NotImplementedError):
+            pass
+        shutil.copyfile(obj, dst_path)
+        self.stats["copies"] += 1
+        self._record_copy(dst_path, digest)
+
+    def _record_copy(self, dst_path, digest):
+        """ADD dst_path -> digest TO ITS FOLDER'S COPY MANIFEST (digest=None: dst_path IS NO LONGER A COPY)"""
+        manifest_path = os.path.join(os.path.dirname(os.path.abspath(dst_path)), COPY_MANIFEST_NAME)
+        if digest is None and not os.path.exists(manifest_path):
+            return
+        copies = _read_manifest(manifest_path)
+        name = os.path.basename(dst_path)
+        if digest is None:
+            if copies.pop(name, None) is None:
+                return
+        else:
+            copies[name] = digest
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(copies, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+
+    def add_file(self, src_path, dst_path):
+        """PUBLISH src_path AS dst_path (REPLACES shutil.copy2)"""
+        self.link(self.put_file(src_path), dst_path)
+
+    def ingest(self, path):
+        """MOVE A FILE THAT WAS JUST WRITTEN INTO AN UPLOAD FOLDER INTO THE STORE AND LINK IT BACK"""
+        tmp_path = path + ".ingest"
+        os.replace(path, tmp_path)
+        self.link(self.put_file(tmp_path, move=True), path)
+
+    # ----- GARBAGE COLLECTION -----
+
+    def _referenced(self):
+        """(INODES OF ALL FILES, OBJECT NAMES OF ALL SYMLINKS AND RECORDED COPIES) IN THE UPLOAD FOLDERS"""
+        inodes = set()
+        names = set()
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if os.path.abspath(dirpath) == os.path.abspath(self.root) and OBJECTS_DIR_NAME in dirnames:
+                dirnames.remove(OBJECTS_DIR_NAME)
+            if COPY_MANIFEST_NAME in filenames:
+                for name, digest in _read_manifest(os.path.join(dirpath, COPY_MANIFEST_NAME)).items():
+                    if name in filenames:       # A COPY DELETED BY HAND NO LONGER KEEPS ITS OBJECT
+                        names.add(digest)
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if os.path.islink(path):
+                    names.add(os.path.basename(os.readlink(path)))
+                else:
+                    st = os.stat(path)
+                    inodes.add((st.st_dev, st.st_ino))
+        return inodes, names
+
+    def gc(self, grace=GC_GRACE_SECONDS):
+        """DELETE UNREFERENCED OBJECTS (AND STALE .tmp FILES) OLDER THAN grace SECONDS, RETURN (NUMBER, BYTES) FREED"""
+        inodes, names = self._referenced()
+        cutoff = time.time() - grace
+        freed = freed_bytes = 0
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue    # RENAMED OR COLLECTED BY ANOTHER PROCESS
+                if st.st_mtime > cutoff:
+                    continue
+                if name.endswith(".tmp") or ((st.st_dev, st.st_ino) not in inodes and name not in names):
+                    os.remove(path)
+                    freed += 1
+                    freed_bytes += st.st_size
+        return freed, freed_bytes